@@ -0,0 +1,73 @@
+"""Compare the day-range image deduplication with and without an index.
+
+Simulates the S2/L8 capture loop of the image generation tasks: for every
+capture, check whether an image was already found within `--day-range`
+days of it, and record it as found if not.
+
+    python scripts/benchmark_timestamp_index.py --captures 10000
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from rdwatch.utils.timestamps import TimestampIndex
+
+
+def is_inside_range_scan(timestamps, check_timestamp, days_range) -> bool:
+    # The previous implementation, a scan of every found timestamp
+    for timestamp in timestamps:
+        if abs((check_timestamp - timestamp).days) <= days_range:
+            return True
+    return False
+
+
+def run_scan(captures: list[datetime], day_range: int) -> int:
+    found: dict[datetime, bool] = {}
+    for capture in captures:
+        if not is_inside_range_scan(found.keys(), capture, day_range):
+            found[capture] = True
+    return len(found)
+
+
+def run_index(captures: list[datetime], day_range: int) -> int:
+    found = TimestampIndex()
+    for capture in captures:
+        if not found.is_inside_range(capture, day_range):
+            found.add(capture)
+    return len(found)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--captures', type=int, default=10000)
+    parser.add_argument(
+        '--day-range',
+        type=int,
+        default=0,
+        help='0 keeps every capture on a different day, the worst case',
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    start = datetime(2014, 1, 1)
+    captures = [
+        start + timedelta(days=day, seconds=rng.randrange(24 * 3600))
+        for day in range(args.captures)
+    ]
+    rng.shuffle(captures)
+
+    results = {}
+    for name, run in (('scan', run_scan), ('index', run_index)):
+        started = time.perf_counter()
+        found = run(captures, args.day_range)
+        elapsed = time.perf_counter() - started
+        results[name] = found
+        print(f'{name:>5}: {elapsed:8.3f}s, {found} images kept')
+    assert results['scan'] == results['index']
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,8 @@ from rdwatch.models import (
     SiteEvaluation,
     SiteImage,
     SiteObservation,
+    StacHarvest,
+    StacItem,
     lookups,
 )
 
@@ -120,3 +122,23 @@ class SiteObservationAdmin(admin.ModelAdmin):
     )
     list_filter = ('timestamp',)
     raw_id_fields = ('siteeval', 'label', 'constellation', 'spectrum')
+
+
+@admin.register(StacItem)
+class StacItemAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'stac_id',
+        'collection',
+        'source',
+        'timestamp',
+        'cloudcover',
+    )
+    list_filter = ('source', 'collection', 'timestamp')
+    search_fields = ('stac_id',)
+
+
+@admin.register(StacHarvest)
+class StacHarvestAdmin(admin.ModelAdmin):
+    list_display = ('id', 'source', 'start', 'end', 'timestamp')
+    list_filter = ('source', 'timestamp')
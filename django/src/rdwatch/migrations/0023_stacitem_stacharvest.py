@@ -0,0 +1,143 @@
+# Generated by Django 4.1.9 on 2023-11-06 10:12
+
+import django.contrib.gis.db.models.fields
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('rdwatch', '0022_rename_siteeval_satellitefetching_site'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StacHarvest',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'source',
+                    models.CharField(
+                        help_text='WV, S2, L8 imagery source', max_length=2
+                    ),
+                ),
+                (
+                    'bbox',
+                    django.contrib.gis.db.models.fields.PolygonField(
+                        help_text='Harvested area', srid=4326
+                    ),
+                ),
+                (
+                    'start',
+                    models.DateTimeField(help_text='Start of the harvested time range'),
+                ),
+                (
+                    'end',
+                    models.DateTimeField(help_text='End of the harvested time range'),
+                ),
+                (
+                    'timestamp',
+                    models.DateTimeField(help_text='Time the harvest was run'),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StacItem',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'stac_id',
+                    models.CharField(help_text='The STAC item id', max_length=255),
+                ),
+                (
+                    'collection',
+                    models.CharField(help_text='The STAC collection', max_length=255),
+                ),
+                (
+                    'source',
+                    models.CharField(
+                        help_text='WV, S2, L8 imagery source', max_length=2
+                    ),
+                ),
+                (
+                    'timestamp',
+                    models.DateTimeField(help_text="The capture's timestamp"),
+                ),
+                (
+                    'footprint',
+                    django.contrib.gis.db.models.fields.GeometryField(
+                        help_text="The capture's footprint", srid=4326
+                    ),
+                ),
+                (
+                    'bbox',
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.FloatField(),
+                        help_text="The capture's bbox",
+                        size=4,
+                    ),
+                ),
+                (
+                    'cloudcover',
+                    models.FloatField(
+                        help_text='Cloud Cover associated with the capture',
+                        null=True,
+                    ),
+                ),
+                (
+                    'bits_per_pixel',
+                    models.IntegerField(help_text='NITF bits per pixel', null=True),
+                ),
+                (
+                    'image_representation',
+                    models.CharField(
+                        blank=True,
+                        help_text='NITF image representation',
+                        max_length=255,
+                    ),
+                ),
+                (
+                    'assets',
+                    models.JSONField(help_text='The STAC assets of the capture'),
+                ),
+                (
+                    'pan_uri',
+                    models.CharField(
+                        blank=True,
+                        help_text='Related panchromatic image for WorldView captures',
+                        max_length=2048,
+                    ),
+                ),
+            ],
+            options={
+                'indexes': [
+                    django.contrib.postgres.indexes.GistIndex(
+                        fields=['timestamp'], name='rdwatch_sta_timesta_6edceb_gist'
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stacitem',
+            constraint=models.UniqueConstraint(
+                fields=('collection', 'stac_id'), name='uniq_stac_item'
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.1.9 on 2023-11-13 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('rdwatch', '0023_stacitem_stacharvest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='siteimage',
+            name='image_format',
+            field=models.CharField(
+                default='png',
+                help_text='Format the image is encoded in (png, webp, avif, ...)',
+                max_length=16,
+            ),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.1.9 on 2023-11-15 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('rdwatch', '0024_siteimage_image_format'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteImageStack',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'stack',
+                    models.FileField(
+                        help_text=(
+                            'The encoded images of the site, stored one after another'
+                        ),
+                        upload_to='',
+                    ),
+                ),
+                (
+                    'manifest',
+                    models.JSONField(
+                        help_text=(
+                            'Timestamp, format and position of each image in the stack'
+                        )
+                    ),
+                ),
+                (
+                    'timestamp',
+                    models.DateTimeField(help_text='Time the stack was written'),
+                ),
+                (
+                    'site',
+                    models.OneToOneField(
+                        help_text='The site whose images are stacked',
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to='rdwatch.siteevaluation',
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.1.9 on 2023-11-17 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('rdwatch', '0025_siteimagestack'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='satellitefetching',
+            name='parameters',
+            field=models.JSONField(
+                blank=True, help_text='Arguments of the queued task', null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name='satellitefetching',
+            name='priority',
+            field=models.IntegerField(
+                choices=[(0, 'Model Run'), (10, 'Site')],
+                default=10,
+                help_text='Queued tasks with a higher priority are started first',
+            ),
+        ),
+        migrations.AlterField(
+            model_name='satellitefetching',
+            name='status',
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ('Complete', 'Complete'),
+                    ('Queued', 'Queued'),
+                    ('Running', 'Running'),
+                    ('Error', 'Error'),
+                ],
+                help_text='Fetching Status',
+                max_length=255,
+            ),
+        ),
+    ]
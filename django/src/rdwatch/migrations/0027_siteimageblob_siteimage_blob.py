@@ -0,0 +1,71 @@
+# Generated by Django 4.1.9 on 2023-11-20 10:45
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('rdwatch', '0026_satellitefetching_parameters_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteImageBlob',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'key',
+                    models.CharField(
+                        help_text=(
+                            'Hash of the source URI, bounding box and render '
+                            'parameters'
+                        ),
+                        max_length=64,
+                        unique=True,
+                    ),
+                ),
+                ('image', models.FileField(upload_to='')),
+                (
+                    'image_format',
+                    models.CharField(
+                        help_text='Format the image is encoded in', max_length=16
+                    ),
+                ),
+                (
+                    'percent_black',
+                    models.FloatField(help_text='NoData coverage on image'),
+                ),
+                (
+                    'image_dimensions',
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.IntegerField(), size=2
+                    ),
+                ),
+                (
+                    'created',
+                    models.DateTimeField(help_text='Time the image was stored'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='siteimage',
+            name='blob',
+            field=models.ForeignKey(
+                blank=True,
+                help_text='The stored image, which is shared by all identical images',
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                to='rdwatch.siteimageblob',
+            ),
+        ),
+    ]
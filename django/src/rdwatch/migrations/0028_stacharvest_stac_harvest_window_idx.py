@@ -0,0 +1,18 @@
+# Generated by Django 4.1.9 on 2023-11-22 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('rdwatch', '0027_siteimageblob_siteimage_blob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stacharvest',
+            index=models.Index(
+                fields=['source', 'start', 'end'], name='stac_harvest_window_idx'
+            ),
+        ),
+    ]
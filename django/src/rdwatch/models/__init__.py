@@ -4,8 +4,9 @@ from .model_run import ModelRun
 from .region import Region
 from .satellite_fetching import SatelliteFetching
 from .site_evaluation import SiteEvaluation, SiteEvaluationTracking
-from .site_image import SiteImage
+from .site_image import SiteImage, SiteImageBlob, SiteImageStack
 from .site_observation import SiteObservation, SiteObservationTracking
+from .stac_item import StacHarvest, StacItem
 
 __all__ = [
     'AnnotationExport',
@@ -15,7 +16,11 @@ __all__ = [
     'SiteEvaluation',
     'SiteObservation',
     'SiteImage',
+    'SiteImageBlob',
+    'SiteImageStack',
     'SatelliteFetching',
     'SiteEvaluationTracking',
     'SiteObservationTracking',
+    'StacHarvest',
+    'StacItem',
 ]
@@ -1,11 +1,90 @@
 """Lookup tables
 
 Lookup tables define the controlled vocabulary of RD-WATCH. They are
-small and relatively constant tables.
+small and relatively constant tables, so each process keeps a copy of
+them in memory (see `LookupManager`).
 """
 
+import threading
+import time
+from typing import Any
+
 from django.contrib.postgres.fields import DecimalRangeField
 from django.db import models
+from django.dispatch import receiver
+
+# Number of seconds a process uses its copy of a lookup table before
+# reloading it, to pick up changes made by other processes
+CACHE_TIMEOUT = 60 * 5
+
+
+class LookupManager(models.Manager):
+    """Manager that caches its lookup table in-process, keyed by slug.
+
+    The cache is cleared when a row is saved or deleted in this process,
+    reloaded after `CACHE_TIMEOUT` seconds, and reloaded when a slug is
+    missing from it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._init_cache()
+
+    def __copy__(self):
+        # Django copies the manager for every model using it (for abstract
+        # base classes and in `Options.managers`), and the copies are the
+        # ones queried. Give each its own lock and rows instead of sharing
+        # the ones of the manager it was copied from.
+        manager = self.__class__.__new__(self.__class__)
+        manager.__dict__.update(self.__dict__)
+        manager._init_cache()
+        return manager
+
+    def _init_cache(self) -> None:
+        self._lock = threading.Lock()
+        self._cache: dict[str, Any] | None = None
+        self._loaded_at = 0.0
+
+    def _load(self) -> dict[str, Any]:
+        with self._lock:
+            rows = {row.slug: row for row in self.get_queryset()}
+            self._cache = rows
+            self._loaded_at = time.monotonic()
+        return rows
+
+    def _get_cache(self) -> dict[str, Any]:
+        rows = self._cache
+        if rows is None or time.monotonic() - self._loaded_at > CACHE_TIMEOUT:
+            rows = self._load()
+        return rows
+
+    def clear_cache(self) -> None:
+        self._cache = None
+
+    def all_cached(self) -> list[Any]:
+        return list(self._get_cache().values())
+
+    def get_cached(self, slug: str) -> Any:
+        """Get a row by slug, raising `DoesNotExist` if there isn't one."""
+        rows = self._get_cache()
+        if slug not in rows:
+            # The row may have been created by another process
+            rows = self._load()
+            if slug not in rows:
+                raise self.model.DoesNotExist(
+                    f'{self.model.__name__} matching slug {slug!r} does not exist.'
+                )
+        return rows[slug]
+
+    def get_or_create_cached(
+        self, slug: str, defaults: dict[str, Any] | None = None
+    ) -> tuple[Any, bool]:
+        try:
+            return self.get_cached(slug), False
+        except self.model.DoesNotExist:
+            row, created = self.get_or_create(slug=slug, defaults=defaults)
+            self.clear_cache()
+            return row, created
 
 
 class Lookup(models.Model):
@@ -13,6 +92,8 @@ class Lookup(models.Model):
     slug = models.SlugField(unique=True)
     description = models.TextField()
 
+    objects = LookupManager()
+
     def __str__(self):
         return self.slug
 
@@ -20,6 +101,13 @@ class Lookup(models.Model):
         abstract = True
 
 
+@receiver(models.signals.post_save)
+@receiver(models.signals.post_delete)
+def clear_lookup_cache(sender, **kwargs):
+    if issubclass(sender, Lookup):
+        sender.objects.clear_cache()
+
+
 class CommonBand(Lookup):
     spectrum = DecimalRangeField(
         help_text='The spectrum this band captures (μm)',
@@ -9,6 +9,7 @@ class BaseSatelliteFetching(models.Model):
 
     class Status(models.TextChoices):
         COMPLETE = 'Complete'
+        QUEUED = 'Queued'
         RUNNING = 'Running'
         ERROR = 'Error'
 
@@ -46,3 +47,16 @@ class SatelliteFetching(BaseSatelliteFetching):
         db_index=True,
         related_name='satellite_fetching',
     )
+
+    class Priority(models.IntegerChoices):
+        MODEL_RUN = 0
+        SITE = 10
+
+    priority = models.IntegerField(
+        default=Priority.SITE,
+        choices=Priority.choices,
+        help_text='Queued tasks with a higher priority are started first',
+    )
+    parameters = models.JSONField(
+        null=True, blank=True, help_text='Arguments of the queued task'
+    )
@@ -122,8 +122,8 @@ class SiteEvaluation(models.Model):
             configuration.save()
         with transaction.atomic():
             region = get_or_create_region(site_feature.properties.region_id)[0]
-            label = lookups.ObservationLabel.objects.get(
-                slug=site_feature.properties.status
+            label = lookups.ObservationLabel.objects.get_cached(
+                site_feature.properties.status
             )
             cache_originator_file = None
             cache_timestamp = None
@@ -167,8 +167,11 @@ class SiteEvaluation(models.Model):
         }
         label_set.add('unknown')
 
-        labels_query = lookups.ObservationLabel.objects.filter(slug__in=label_set)
-        label_map = {label.slug: label for label in labels_query}
+        label_map = {
+            label.slug: label
+            for label in lookups.ObservationLabel.objects.all_cached()
+            if label.slug in label_set
+        }
 
         site_evals: list[SiteEvaluation] = []
         with transaction.atomic():
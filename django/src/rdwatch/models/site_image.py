@@ -26,7 +26,14 @@ class BaseSiteImage(models.Model):
     timestamp = models.DateTimeField(
         help_text="The source image's timestamp",
     )
+    # Usually the file of `blob`, which is shared by all images referring to
+    # it and only deleted along with the blob (see `release_blobs`)
     image = models.FileField(null=True, blank=True)
+    image_format = models.CharField(
+        max_length=16,
+        default='png',
+        help_text='Format the image is encoded in (png, webp or webp-lossless)',
+    )
     cloudcover = models.FloatField(
         null=True, help_text='Cloud Cover associated with Image'
     )
@@ -53,12 +60,6 @@ class BaseSiteImage(models.Model):
         return f'{self.site}.{self.source}@{time}'
 
 
-@receiver(models.signals.pre_delete, sender=BaseSiteImage)
-def delete_content(sender, instance, **kwargs):
-    if instance.image:
-        instance.image.delete(save=False)
-
-
 class SiteImage(BaseSiteImage):
     class Meta:
         indexes = [GistIndex(fields=['timestamp'])]
@@ -74,3 +75,58 @@ class SiteImage(BaseSiteImage):
         null=True,
         db_index=True,
     )
+    blob = models.ForeignKey(
+        to='SiteImageBlob',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        help_text='The stored image, which is shared by all identical images',
+    )
+
+
+class SiteImageBlob(models.Model):
+    key = models.CharField(
+        max_length=64,
+        unique=True,
+        help_text='Hash of the source URI, bounding box and render parameters',
+    )
+    image = models.FileField()
+    image_format = models.CharField(
+        max_length=16, help_text='Format the image is encoded in'
+    )
+    percent_black = models.FloatField(help_text='NoData coverage on image')
+    image_dimensions = ArrayField(models.IntegerField(), size=2)
+    created = models.DateTimeField(help_text='Time the image was stored')
+
+    def __str__(self) -> str:
+        return self.key
+
+
+@receiver(models.signals.pre_delete, sender=SiteImageBlob)
+def delete_blob(sender, instance, **kwargs):
+    if instance.image:
+        instance.image.delete(save=False)
+
+
+class SiteImageStack(models.Model):
+    site = models.OneToOneField(
+        to='SiteEvaluation',
+        on_delete=models.CASCADE,
+        help_text='The site whose images are stacked',
+    )
+    stack = models.FileField(
+        help_text='The encoded images of the site, stored one after another'
+    )
+    manifest = models.JSONField(
+        help_text='Timestamp, format and position of each image in the stack'
+    )
+    timestamp = models.DateTimeField(help_text='Time the stack was written')
+
+    def __str__(self) -> str:
+        return f'{self.site} ({len(self.manifest["frames"])} images)'
+
+
+@receiver(models.signals.pre_delete, sender=SiteImageStack)
+def delete_stack(sender, instance, **kwargs):
+    if instance.stack:
+        instance.stack.delete(save=False)
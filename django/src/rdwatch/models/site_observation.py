@@ -72,9 +72,10 @@ class SiteObservation(models.Model):
         if not len(label_set):
             label_set = {'unknown'}
 
-        labels_query = lookups.ObservationLabel.objects.filter(slug__in=label_set)
         label_map = {
-            ' '.join(label.slug.split('_')).title(): label for label in labels_query
+            ' '.join(label.slug.split('_')).title(): label
+            for label in lookups.ObservationLabel.objects.all_cached()
+            if label.slug in label_set
         }
 
         constellation_set: set[str] = {
@@ -83,12 +84,10 @@ class SiteObservation(models.Model):
             if feature.properties.sensor_name
         }
 
-        constellations_query = lookups.Constellation.objects.filter(
-            description__in=constellation_set
-        )
         constellation_map = {
             constellation.description: constellation
-            for constellation in constellations_query
+            for constellation in lookups.Constellation.objects.all_cached()
+            if constellation.description in constellation_set
         }
 
         for feature in site_model.observation_features:
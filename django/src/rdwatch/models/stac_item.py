@@ -0,0 +1,118 @@
+import json
+from datetime import datetime
+from typing import Any
+
+from django.contrib.gis.db.models import GeometryField, PolygonField
+from django.contrib.gis.geos import GEOSGeometry, Polygon
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GistIndex
+from django.db import models
+
+
+class StacItem(models.Model):
+    """A STAC item harvested from the SMART STAC server."""
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['collection', 'stac_id'], name='uniq_stac_item'
+            ),
+        ]
+        indexes = [GistIndex(fields=['timestamp'])]
+
+    stac_id = models.CharField(max_length=255, help_text='The STAC item id')
+    collection = models.CharField(max_length=255, help_text='The STAC collection')
+    source = models.CharField(max_length=2, help_text='WV, S2, L8 imagery source')
+    timestamp = models.DateTimeField(help_text="The capture's timestamp")
+    footprint = GeometryField(
+        help_text="The capture's footprint",
+        srid=4326,
+        spatial_index=True,
+    )
+    bbox = ArrayField(models.FloatField(), size=4, help_text="The capture's bbox")
+    cloudcover = models.FloatField(
+        null=True, help_text='Cloud Cover associated with the capture'
+    )
+    bits_per_pixel = models.IntegerField(null=True, help_text='NITF bits per pixel')
+    image_representation = models.CharField(
+        max_length=255, blank=True, help_text='NITF image representation'
+    )
+    assets = models.JSONField(help_text='The STAC assets of the capture')
+    pan_uri = models.CharField(
+        max_length=2048,
+        blank=True,
+        help_text='Related panchromatic image for WorldView captures',
+    )
+
+    def __str__(self) -> str:
+        return f'{self.collection}/{self.stac_id}'
+
+    @classmethod
+    def from_feature(cls, source: str, feature: dict[str, Any]) -> 'StacItem':
+        """Build an (unsaved) item from a STAC feature.
+
+        Raises KeyError if the feature is missing required fields.
+        """
+        properties = feature['properties']
+        if feature.get('geometry'):
+            footprint = GEOSGeometry(json.dumps(feature['geometry']), srid=4326)
+        else:
+            footprint = Polygon.from_bbox(feature['bbox'])
+            footprint.srid = 4326
+        return cls(
+            stac_id=feature['id'],
+            collection=feature['collection'],
+            source=source,
+            timestamp=datetime.fromisoformat(properties['datetime'].rstrip('Z')),
+            footprint=footprint,
+            bbox=list(feature['bbox']),
+            cloudcover=properties.get('eo:cloud_cover'),
+            bits_per_pixel=properties.get('nitf:bits_per_pixel'),
+            image_representation=properties.get('nitf:image_representation', ''),
+            assets=feature['assets'],
+        )
+
+    def as_feature(self) -> dict[str, Any]:
+        """The subset of the original STAC feature that RD-WATCH uses."""
+        properties: dict[str, Any] = {'datetime': f'{self.timestamp.isoformat()}Z'}
+        if self.cloudcover is not None:
+            properties['eo:cloud_cover'] = self.cloudcover
+        if self.bits_per_pixel is not None:
+            properties['nitf:bits_per_pixel'] = self.bits_per_pixel
+        if self.image_representation:
+            properties['nitf:image_representation'] = self.image_representation
+        return {
+            'id': self.stac_id,
+            'collection': self.collection,
+            'bbox': self.bbox,
+            'properties': properties,
+            'assets': self.assets,
+        }
+
+
+class StacHarvest(models.Model):
+    """An area and time range that has been harvested into the StacItem table.
+
+    Searches that fall entirely within a harvested extent are answered from
+    the local catalogue instead of the STAC server.
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['source', 'start', 'end'], name='stac_harvest_window_idx'
+            ),
+        ]
+
+    source = models.CharField(max_length=2, help_text='WV, S2, L8 imagery source')
+    bbox = PolygonField(
+        help_text='Harvested area',
+        srid=4326,
+        spatial_index=True,
+    )
+    start = models.DateTimeField(help_text='Start of the harvested time range')
+    end = models.DateTimeField(help_text='End of the harvested time range')
+    timestamp = models.DateTimeField(help_text='Time the harvest was run')
+
+    def __str__(self) -> str:
+        return f'{self.source}@{self.start.isoformat()}/{self.end.isoformat()}'
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 
 from configurations import Configuration, values
@@ -125,6 +126,97 @@ class BaseConfiguration(Configuration):
     SMART_STAC_KEY = values.SecretValue(
         environ_required=True, environ_prefix=_ENVIRON_PREFIX
     )
+    # Number of seconds STAC search results are cached for
+    STAC_SEARCH_CACHE_TIMEOUT = values.IntegerValue(
+        60 * 60 * 24, environ_prefix=_ENVIRON_PREFIX
+    )
+    # Number of seconds a harvest into the local STAC catalogue is used
+    # to answer searches for before the area is harvested again
+    STAC_CATALOG_MAX_AGE = values.IntegerValue(
+        60 * 60 * 24 * 7, environ_prefix=_ENVIRON_PREFIX
+    )
+
+    # Number of satellite image captures each image generation task
+    # downloads concurrently (at least 1)
+    IMAGE_FETCH_CONCURRENCY = values.PositiveIntegerValue(
+        4, environ_prefix=_ENVIRON_PREFIX
+    )
+
+    # Number of idle raster datasets each process keeps open to avoid
+    # re-fetching the COG headers of recently read captures, and the number of
+    # MB of raster blocks read from them that each process caches
+    RASTER_DATASET_CACHE_SIZE = values.PositiveIntegerValue(
+        16, environ_prefix=_ENVIRON_PREFIX
+    )
+    RASTER_BLOCK_CACHE_SIZE = values.PositiveIntegerValue(
+        256, environ_prefix=_ENVIRON_PREFIX
+    )
+
+    # Number of seconds the percentiles used by 'bits' scaling are cached
+    # for each raster asset
+    RASTER_STATISTICS_CACHE_TIMEOUT = values.IntegerValue(
+        60 * 60 * 24 * 30, environ_prefix=_ENVIRON_PREFIX
+    )
+
+    # Number of bytes of satellite image tiles each process keeps in memory,
+    # in front of the tiles cached on disk
+    TILE_CACHE_MEMORY_SIZE = values.PositiveIntegerValue(
+        64 * 1024 * 1024, environ_prefix=_ENVIRON_PREFIX
+    )
+    # Directory satellite image tiles are cached in (empty to only cache them
+    # in memory), and the number of bytes it may grow to
+    TILE_CACHE_DIR = values.Value(
+        os.path.join(tempfile.gettempdir(), 'rdwatch-tiles'),
+        environ_prefix=_ENVIRON_PREFIX,
+    )
+    TILE_CACHE_DISK_SIZE = values.PositiveIntegerValue(
+        2 * 1024 * 1024 * 1024, environ_prefix=_ENVIRON_PREFIX
+    )
+
+    # Format generated site images are stored in, unless another one is
+    # requested: png, webp or webp-lossless
+    SITE_IMAGE_FORMAT = values.Value('png', environ_prefix=_ENVIRON_PREFIX)
+    # Quality (0-100) of site images stored in a lossy format
+    SITE_IMAGE_QUALITY = values.PositiveIntegerValue(80, environ_prefix=_ENVIRON_PREFIX)
+    # How generated site images are stored: 'files' stores every image as a
+    # file of its own, 'stack' packs the images of a site into a single file
+    # once they are generated (see `write_site_image_stack`)
+    SITE_IMAGE_STORAGE = values.Value('files', environ_prefix=_ENVIRON_PREFIX)
+
+    # Number of seconds a site's image task runs for before it continues in a
+    # new task, which must be well below the CELERYD_TIME_LIMIT
+    IMAGE_TASK_CHUNK_TIME = values.PositiveIntegerValue(
+        900, environ_prefix=_ENVIRON_PREFIX
+    )
+    # Number of seconds the checkpoint of an unfinished image task is kept
+    # for it to be resumed
+    IMAGE_CHECKPOINT_TIMEOUT = values.PositiveIntegerValue(
+        60 * 60 * 24 * 7, environ_prefix=_ENVIRON_PREFIX
+    )
+
+    # Number of site image tasks that may run at once. Model runs only get
+    # the slots that aren't reserved for sites requested one at a time
+    IMAGE_TASK_CONCURRENCY = values.PositiveIntegerValue(
+        8, environ_prefix=_ENVIRON_PREFIX
+    )
+    IMAGE_TASK_INTERACTIVE_SLOTS = values.PositiveIntegerValue(
+        2, environ_prefix=_ENVIRON_PREFIX
+    )
+    # Number of a model run's sites whose images are generated by scene in
+    # one task, which takes up one of the slots above
+    IMAGE_TASK_SCENE_BATCH_SIZE = values.PositiveIntegerValue(
+        50, environ_prefix=_ENVIRON_PREFIX
+    )
+    # Number of requests per second image and harvest tasks may send to each
+    # STAC / COG host (0 for no limit), with overrides for specific hosts
+    HOST_REQUEST_BUDGET = values.PositiveIntegerValue(
+        20, environ_prefix=_ENVIRON_PREFIX
+    )
+    HOST_REQUEST_BUDGETS = values.DictValue({}, environ_prefix=_ENVIRON_PREFIX)
+
+    # Minimum number of seconds between two progress updates of an image
+    # generation task
+    TASK_PROGRESS_INTERVAL = values.FloatValue(2.0, environ_prefix=_ENVIRON_PREFIX)
 
     # django-celery-results configuration
     CELERY_RESULT_BACKEND = 'django-db'
@@ -148,6 +240,18 @@ class BaseConfiguration(Configuration):
             'task': 'rdwatch.tasks.delete_export_files',
             'schedule': timedelta(hours=1),
         },
+        'delete-unreferenced-site-image-blobs-beat': {
+            'task': 'rdwatch.tasks.delete_unreferenced_site_image_blobs',
+            'schedule': timedelta(hours=1),
+        },
+        'prune-stac-harvests-beat': {
+            'task': 'rdwatch.tasks.prune_stac_harvests',
+            'schedule': timedelta(hours=1),
+        },
+        'schedule-site-images-beat': {
+            'task': 'rdwatch.tasks.schedule_site_images',
+            'schedule': timedelta(minutes=1),
+        },
     }
 
 
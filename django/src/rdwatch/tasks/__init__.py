@@ -1,25 +1,23 @@
-import io
 import json
 import logging
 import os
 import tempfile
 import zipfile
-from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Literal
-from uuid import uuid4
 
-from celery import shared_task
-from celery.result import AsyncResult
-from more_itertools import ichunked
-from PIL import Image
+from celery import chord, shared_task
+from celery.result import AsyncResult, GroupResult
+from more_itertools import chunked, ichunked
 from pydantic import UUID4
 from pyproj import Transformer
 
+from django.conf import settings
 from django.contrib.gis.geos import Polygon
 from django.core.files import File
 from django.db import transaction
-from django.db.models import DateTimeField, ExpressionWrapper, F
+from django.db.models import Count, DateTimeField, ExpressionWrapper, F, Max, Min, Q
 from django.utils import timezone
 
 from rdwatch.celery import app
@@ -32,17 +30,34 @@ from rdwatch.models import (
     SiteObservation,
 )
 from rdwatch.models.lookups import Constellation
+from rdwatch.utils.checkpoints import (
+    ChunkTimeExpired,
+    ImageCheckpoint,
+    clear_image_checkpoints,
+)
+from rdwatch.utils.image_blobs import (
+    delete_unreferenced_blobs,
+    fetch_capture_chip,
+    fetch_capture_chips,
+)
+from rdwatch.utils.image_stack import write_site_image_stack
 from rdwatch.utils.images import (
-    fetch_boundbox_image,
+    ImageFormat,
+    ObservationTimeBuffer,
+    get_closest_capture,
     get_max_bbox,
-    get_percent_black_pixels,
     get_range_captures,
+    prefetch,
     scale_bbox,
 )
-from rdwatch.utils.raster_tile import get_raster_bbox
-from rdwatch.utils.worldview_processed.raster_tile import (
-    get_worldview_processed_visual_bbox,
+from rdwatch.utils.site_images import SiteImageWriter
+from rdwatch.utils.stac_catalog import harvest, prune_harvests
+from rdwatch.utils.task_progress import (
+    TaskProgress,
+    clear_task_progress,
+    get_task_progress,
 )
+from rdwatch.utils.timestamps import TimestampIndex
 from rdwatch.views.site_evaluation import get_site_model_feature_JSON
 
 logger = logging.getLogger(__name__)
@@ -54,52 +69,211 @@ BboxScaleDefault = 1.2
 ToMeters = 111139.0
 # number in meters to add to the center of small polygons for S2/L8
 overrideImageSize = 1000
+# number of sites read from a single scene at once when generating
+# the images of a model run scene by scene
+SceneBatchSize = 50
 
 
-def is_inside_range(
-    timestamps: Iterable[datetime], check_timestamp: datetime, days_range
-):
-    for timestamp in timestamps:
-        time_difference = check_timestamp - timestamp
-        if abs(time_difference.days) <= days_range:
-            logger.warning(
-                f'Skipping Timestamp because difference is: {time_difference.days}'
-            )
-            return True
-    return False
+def get_site_bbox(
+    site_eval: SiteEvaluation,
+    baseConstellation='WV',
+    bboxScale: float = BboxScaleDefault,
+) -> list[float]:
+    """The area (in EPSG:4326) to fetch the images of a site for."""
+    transformer = Transformer.from_crs('EPSG:3857', 'EPSG:4326')
+    mercator: tuple[float, float, float, float] = site_eval.geom.extent
+    tempbox = transformer.transform_bounds(
+        mercator[0], mercator[1], mercator[2], mercator[3]
+    )
+    bbox = [tempbox[1], tempbox[0], tempbox[3], tempbox[2]]
+    # if width | height is too small we pad S2/L8 regions for more context
+    bbox_width = (tempbox[2] - tempbox[0]) * ToMeters
+    bbox_height = (tempbox[3] - tempbox[1]) * ToMeters
+    if baseConstellation != 'WV' and (
+        bbox_width < overrideImageSize or bbox_height < overrideImageSize
+    ):
+        size_diff = (
+            overrideImageSize * 0.5
+        ) / ToMeters  # find how much to add to each lon/lat
+        bbox = [
+            tempbox[1] - size_diff,
+            tempbox[0] - size_diff,
+            tempbox[3] + size_diff,
+            tempbox[2] + size_diff,
+        ]
+    # add the included padding to the updated BBOX
+    return scale_bbox(bbox, bboxScale)
 
 
 @app.task(bind=True)
-def get_siteobservation_images_task(
+def get_constellation_images_task(
     self,
     site_eval_id: UUID4,
-    baseConstellations=['WV'],  # noqa
+    baseConstellation='WV',
     force=False,  # forced downloading found_timestamps again
     dayRange=14,
     no_data_limit=50,
     overrideDates: None | list[datetime, datetime] = None,
     scale: Literal['default', 'bits'] | list[int] = 'default',
     bboxScale: float = BboxScaleDefault,
-) -> None:
-    capture_count = 0
-    for constellation in baseConstellations:
-        capture_count += get_siteobservations_images(
+    imageFormat: ImageFormat | None = None,
+) -> int:
+    try:
+        downloaded_count = get_siteobservations_images(
             self,
             site_eval_id=site_eval_id,
-            baseConstellation=constellation,
+            baseConstellation=baseConstellation,
             force=force,
             dayRange=dayRange,
             no_data_limit=no_data_limit,
             overrideDates=overrideDates,
             scale=scale,
             bboxScale=bboxScale,
+            imageFormat=imageFormat,
         )
+    except ChunkTimeExpired:
+        # The same task continues from the checkpoint, keeping its place
+        # (and id) in the group of constellation tasks
+        raise self.replace(self.s(*self.request.args, **self.request.kwargs))
+    finally:
+        clear_task_progress(self.request.id)
+    clear_image_checkpoints(SiteImage, site_eval_id, [baseConstellation])
+    return downloaded_count
+
+
+@shared_task
+def finish_siteobservation_images_task(
+    capture_counts: list[int], site_eval_id: UUID4
+) -> None:
+    if settings.SITE_IMAGE_STORAGE == 'stack':
+        write_site_image_stack(site_eval_id)
     fetching_task = SatelliteFetching.objects.get(site_id=site_eval_id)
+    if fetching_task.celery_id:
+        clear_images_task_progress(fetching_task.celery_id)
     fetching_task.status = SatelliteFetching.Status.COMPLETE
-    if capture_count == 0:
+    if sum(capture_counts) == 0:
         fetching_task.error = 'No Captures found'
     fetching_task.celery_id = ''
     fetching_task.save()
+    schedule_site_images.delay()
+
+
+@shared_task
+def fail_siteobservation_images_task(
+    request, exc: Exception, traceback, site_eval_id: UUID4
+) -> None:
+    fetching_tasks = SatelliteFetching.objects.filter(site_id=site_eval_id)
+    for celery_id in fetching_tasks.exclude(celery_id='').values_list(
+        'celery_id', flat=True
+    ):
+        clear_images_task_progress(celery_id)
+    fetching_tasks.update(
+        status=SatelliteFetching.Status.ERROR, error=str(exc), celery_id=''
+    )
+    schedule_site_images.delay()
+
+
+def start_siteobservation_images(
+    site_eval_id: UUID4,
+    baseConstellations=['WV'],  # noqa
+    force=False,  # forced downloading found_timestamps again
+    dayRange=14,
+    no_data_limit=50,
+    overrideDates: None | list[datetime, datetime] = None,
+    scale: Literal['default', 'bits'] | list[int] = 'default',
+    bboxScale: float = BboxScaleDefault,
+    imageFormat: ImageFormat | None = None,
+) -> GroupResult:
+    """Start generating the images of a site.
+
+    Each constellation is fetched by its own task, so they run in parallel,
+    and the SatelliteFetching status is updated once all of them are done.
+    Returns the (saved) group of constellation tasks, whose id is stored as
+    the SatelliteFetching's `celery_id`. The tasks are only sent once the
+    current transaction commits, so they always see that `celery_id`.
+    """
+    finish = finish_siteobservation_images_task.s(site_eval_id).on_error(
+        fail_siteobservation_images_task.s(site_eval_id)
+    )
+    images_chord = chord(
+        [
+            get_constellation_images_task.s(
+                site_eval_id,
+                constellation,
+                force,
+                dayRange,
+                no_data_limit,
+                overrideDates,
+                scale,
+                bboxScale,
+                imageFormat,
+            )
+            for constellation in baseConstellations
+        ],
+        finish,
+    )
+    group_result = images_chord.freeze().parent
+    group_result.save()
+    transaction.on_commit(images_chord.apply_async)
+    return group_result
+
+
+def get_images_task_results(celery_id: str) -> list[AsyncResult]:
+    """The results of the task(s) in a SatelliteFetching's `celery_id`.
+
+    That is either a group of per-constellation tasks or, for images
+    generated for a whole model run, a single task.
+    """
+    group_result = GroupResult.restore(celery_id, app=app)
+    if group_result is None:
+        return [AsyncResult(celery_id)]
+    return list(group_result.results)
+
+
+def revoke_images_task(celery_id: str) -> None:
+    for result in get_images_task_results(celery_id):
+        result.revoke(terminate=True)
+        # A terminated task doesn't get to clear its own progress
+        clear_task_progress(result.id)
+
+
+def clear_images_task_progress(celery_id: str) -> None:
+    for result in get_images_task_results(celery_id):
+        clear_task_progress(result.id)
+
+
+def get_images_task_status(celery_id: str) -> dict:
+    """The combined state and progress of a SatelliteFetching's task(s).
+
+    Running tasks publish their progress to the cache (see `TaskProgress`),
+    only the final state of a task is read from the result backend.
+    """
+    states = []
+    progress = []
+    errors = []
+    for result in get_images_task_results(celery_id):
+        info = get_task_progress(result.id)
+        if info is not None:
+            states.append('PROGRESS')
+            progress.append(info)
+            continue
+        states.append(result.state)
+        if isinstance(result.info, Exception):
+            errors.append(str(result.info))
+    # The group is only done once all of its tasks are
+    state = next((s for s in states if s != 'SUCCESS'), 'SUCCESS')
+    if errors:
+        return {'state': state, 'status': state, 'info': errors[0]}
+
+    info = None
+    if progress:
+        info = {
+            **progress[0],
+            'current': sum(p['current'] for p in progress),
+            'total': sum(p['total'] for p in progress),
+            'mode': ', '.join(dict.fromkeys(p['mode'] for p in progress)),
+        }
+    return {'state': state, 'status': state, 'info': info}
 
 
 def get_siteobservations_images(
@@ -112,21 +286,48 @@ def get_siteobservations_images(
     overrideDates: None | list[datetime, datetime] = None,
     scale: Literal['default', 'bits'] | list[int] = 'default',
     bboxScale: float = BboxScaleDefault,
-) -> None:
+    imageFormat: ImageFormat | None = None,
+) -> int:
+    """Generate the images of a site for a constellation.
+
+    Progress is checkpointed (see `ImageCheckpoint`), so a run that was
+    revoked or stopped at the end of a chunk resumes where it left off.
+    Returns the number of images downloaded.
+    """
+    progress = TaskProgress(self.request.id)
+    image_format = imageFormat or settings.SITE_IMAGE_FORMAT
+    checkpoint = ImageCheckpoint(
+        SiteImage,
+        site_eval_id,
+        baseConstellation,
+        {
+            'force': force,
+            'dayRange': dayRange,
+            'no_data_limit': no_data_limit,
+            'overrideDates': overrideDates,
+            'scale': scale,
+            'bboxScale': bboxScale,
+            'imageFormat': image_format,
+        },
+    )
+    if checkpoint.complete:
+        return checkpoint.downloaded_count
+    if checkpoint.resumed:
+        logger.warning(f'Resuming {baseConstellation} images of {site_eval_id}')
     constellationObj = Constellation.objects.filter(slug=baseConstellation).first()
     # Ensure we are using ints for the DayRange and no_data_limit
     dayRange = int(dayRange)
     no_data_limit = int(no_data_limit)
     site_observations = SiteObservation.objects.filter(
         siteeval=site_eval_id
+    ).select_related(
+        'constellation'
     )  # need a full list for min/max times
     site_obs_count = SiteObservation.objects.filter(
         siteeval=site_eval_id, constellation_id=constellationObj.pk
     ).count()
-    transformer = Transformer.from_crs('EPSG:3857', 'EPSG:4326')
-    found_timestamps = {}
+    found_timestamps = checkpoint.found_timestamps
     max_bbox = [float('inf'), float('inf'), float('-inf'), float('-inf')]
-    matchConstellation = ''
     # Use the base SiteEvaluation extents as the max size
     baseSiteEval = SiteEvaluation.objects.get(pk=site_eval_id)
     # use the Eval Start/End date if not null
@@ -137,252 +338,296 @@ def get_siteobservations_images(
     if max_time is None:
         max_time = datetime.now()
 
-    mercator: tuple[float, float, float, float] = baseSiteEval.geom.extent
-    tempbox = transformer.transform_bounds(
-        mercator[0], mercator[1], mercator[2], mercator[3]
-    )
-    bbox = [tempbox[1], tempbox[0], tempbox[3], tempbox[2]]
-    # if width | height is too small we pad S2/L8 regions for more context
-    bbox_width = (tempbox[2] - tempbox[0]) * ToMeters
-    bbox_height = (tempbox[3] - tempbox[1]) * ToMeters
-    if baseConstellation != 'WV' and (
-        bbox_width < overrideImageSize or bbox_height < overrideImageSize
-    ):
-        size_diff = (
-            overrideImageSize * 0.5
-        ) / ToMeters  # find how much to add to each lon/lat
-        bbox = [
-            tempbox[1] - size_diff,
-            tempbox[0] - size_diff,
-            tempbox[3] + size_diff,
-            tempbox[2] + size_diff,
-        ]
-    # add the included padding to the updated BBOX
-    bbox = scale_bbox(bbox, bboxScale)
+    bbox = get_site_bbox(baseSiteEval, baseConstellation, bboxScale)
     # get the updated BBOX if it's bigger
     max_bbox = get_max_bbox(bbox, max_bbox)
+    worldView = baseConstellation == 'WV'
 
-    # First we gather all images that match observations
-    count = 0
-    downloaded_count = 0
-    for observation in site_observations.iterator():
-        self.update_state(
-            state='PROGRESS',
-            meta={
-                'current': count,
-                'total': site_obs_count,
-                'mode': 'Site Observations',
-                'siteEvalId': site_eval_id,
-            },
-        )
-        if observation.timestamp is not None:
-            min_time = min(min_time, observation.timestamp)
-            max_time = max(max_time, observation.timestamp)
-        mercator: tuple[float, float, float, float] = observation.geom.extent
-
-        timestamp = observation.timestamp
-        constellation = observation.constellation
-        # We need to grab the image for this timerange and type
-        logger.warning(timestamp)
-        if str(constellation) == baseConstellation and timestamp is not None:
-            count += 1
-            baseSiteEval = observation.siteeval
-            matchConstellation = constellation
-            found = SiteImage.objects.filter(
-                site=observation.siteeval,
-                observation=observation,
-                timestamp=observation.timestamp,
-                source=baseConstellation,
-            )
-            if (
-                baseConstellation in ('S2', 'L8')
-                and dayRange > -1
-                and is_inside_range(
-                    found_timestamps.keys(), observation.timestamp, dayRange
-                )
-            ):
-                logger.warning(f'Skipping Timestamp: {timestamp}')
-                continue
-            if found.exists() and not force:
-                found_timestamps[observation.timestamp] = True
-                continue
-            results = fetch_boundbox_image(
-                bbox, timestamp, constellation.slug, baseConstellation == 'WV', scale
-            )
-            if results is None:
-                logger.warning(f'COULD NOT FIND ANY IMAGE FOR TIMESTAMP: {timestamp}')
-                continue
-            bytes = results['bytes']
-            percent_black = get_percent_black_pixels(bytes)
-            cloudcover = results['cloudcover']
-            found_timestamp = results['timestamp']
-            if bytes is None:
-                logger.warning(f'COULD NOT FIND ANY IMAGE FOR TIMESTAMP: {timestamp}')
-                continue
-            if dayRange != -1 and percent_black < no_data_limit:
-                found_timestamps[found_timestamp] = True
-            elif dayRange == -1:
-                found_timestamps[found_timestamp] = True
-            # logger.warning(f'Retrieved Image with timestamp: {timestamp}')
-            output = f'tile_image_{observation.id}.png'
-            image = File(io.BytesIO(bytes), name=output)
-            imageObj = Image.open(io.BytesIO(bytes))
-            if image is None:  # No null/None images should be set
-                continue
-            downloaded_count += 1
-            if found.exists():
-                existing = found.first()
-                existing.image.delete()  # remove previous image if new one found
-                existing.cloudcover = cloudcover
-                existing.image = image
-                existing.percent_black = percent_black
-                existing.aws_location = results['uri']
-                existing.image_bbox = Polygon.from_bbox(max_bbox)
-                existing.image_dimensions = [imageObj.width, imageObj.height]
-                existing.save()
-            else:
-                SiteImage.objects.create(
-                    site=observation.siteeval,
-                    observation=observation,
-                    timestamp=observation.timestamp,
-                    image=image,
-                    aws_location=results['uri'],
-                    cloudcover=cloudcover,
-                    source=baseConstellation,
-                    percent_black=percent_black,
-                    image_bbox=Polygon.from_bbox(max_bbox),
-                    image_dimensions=[imageObj.width, imageObj.height],
-                )
-
-    # Now we need to go through and find all other images
-    # that exist in the start/end range of the siteEval
+    observed = site_observations.aggregate(
+        first=Min('timestamp'), last=Max('timestamp')
+    )
+    if observed['first'] is not None:
+        min_time = min(min_time, observed['first'])
+        max_time = max(max_time, observed['last'])
+    # All other images are the ones in the start/end range of the siteEval
     if overrideDates and len(overrideDates) == 2:
         min_time = datetime.strptime(overrideDates[0], '%Y-%m-%d')
         max_time = datetime.strptime(overrideDates[1], '%Y-%m-%d')
 
     timebuffer = ((max_time + timedelta(days=30)) - (min_time - timedelta(days=30))) / 2
     timestamp = (min_time + timedelta(days=30)) + timebuffer
+    range_start = timestamp - timebuffer
+    range_end = timestamp + timebuffer
 
-    # Now we get a list of all the timestamps and captures that fall in this range.
-    worldView = baseConstellation == 'WV'
-    if matchConstellation == '':
-        matchConstellation = Constellation.objects.filter(
-            slug=baseConstellation
-        ).first()
-        logger.warning(
-            f'Utilizing Constellation: {matchConstellation} - {matchConstellation.slug}'
-        )
-
-    captures = get_range_captures(
-        max_bbox, timestamp, matchConstellation.slug, timebuffer, worldView
+    # A single search finds the captures in that range as well as the ones
+    # matching observations, which are then looked up in memory
+    search_start = range_start
+    search_end = range_end
+    matched = site_observations.filter(constellation=constellationObj).aggregate(
+        first=Min('timestamp'), last=Max('timestamp')
     )
-    self.update_state(
-        state='PROGRESS',
-        meta={
+    if matched['first'] is not None:
+        search_start = min(search_start, matched['first'] - ObservationTimeBuffer)
+        search_end = max(search_end, matched['last'] + ObservationTimeBuffer)
+    progress.update(
+        {
             'current': 0,
             'total': 0,
             'mode': 'Searching All Images',
             'siteEvalId': site_eval_id,
-        },
+        }
     )
-    if (
-        baseSiteEval is None
-    ):  # We need to grab the siteEvaluation directly for a reference
-        baseSiteEval = SiteEvaluation.objects.filter(pk=site_eval_id).first()
+    search_buffer = (search_end - search_start) / 2
+    captures = get_range_captures(
+        max_bbox,
+        search_start + search_buffer,
+        baseConstellation,
+        search_buffer,
+        worldView,
+    )
+    captures.sort(key=lambda capture: capture.timestamp)
+
+    # First we gather all images that match observations
+    count = 0
+    dedup = baseConstellation in ('S2', 'L8') and dayRange > -1
+    # Existing images are looked up and new ones written in bulk, the
+    # checkpoint is saved whenever they are
+    writer = SiteImageWriter(
+        SiteImage, [site_eval_id], baseConstellation, on_flush=checkpoint.save
+    )
+
+    def should_fetch_observation(observation: SiteObservation) -> bool:
+        if (
+            str(observation.constellation) != baseConstellation
+            or observation.timestamp is None
+            or str(observation.pk) in checkpoint.observations
+        ):
+            return False
+        if dedup and found_timestamps.is_inside_range(observation.timestamp, dayRange):
+            return False
+        return force or (
+            writer.get_for_observation(
+                observation.siteeval_id, observation.pk, observation.timestamp
+            )
+            is None
+        )
+
+    def fetch_observation_image(observation: SiteObservation):
+        closest_capture = get_closest_capture(captures, observation.timestamp)
+        if closest_capture is None:
+            return None
+        return fetch_capture_chip(closest_capture, bbox, worldView, scale, image_format)
+
+    def should_fetch_capture(capture) -> bool:
+        capture_timestamp = capture.timestamp.replace(microsecond=0)
+        if capture_timestamp in checkpoint.captures:
+            return False
+        if dedup and found_timestamps.is_inside_range(capture_timestamp, dayRange):
+            return False
+        return capture_timestamp not in found_timestamps
+
+    def fetch_range_image(capture):
+        return fetch_capture_chip(capture, max_bbox, worldView, scale, image_format)
+
+    # COG reads are network bound, so they are fetched ahead of time by a
+    # bounded pool of threads while the results are processed here in order.
+    # Every decision that depends on `found_timestamps` is still made in this
+    # loop, a prefetched image that ends up being skipped is simply dropped.
+    fetch_concurrency = max(1, settings.IMAGE_FETCH_CONCURRENCY)
+    with ThreadPoolExecutor(max_workers=fetch_concurrency) as executor:
+        for observation, pending in prefetch(
+            site_observations.iterator(),
+            fetch_observation_image,
+            executor,
+            fetch_concurrency,
+            prefilter=should_fetch_observation,
+        ):
+            progress.update(
+                {
+                    'current': count,
+                    'total': site_obs_count,
+                    'mode': 'Site Observations',
+                    'siteEvalId': site_eval_id,
+                }
+            )
+            timestamp = observation.timestamp
+            constellation = observation.constellation
+            # We need to grab the image for this timerange and type
+            logger.warning(timestamp)
+            if str(constellation) == baseConstellation and timestamp is not None:
+                count += 1
+                if str(observation.pk) in checkpoint.observations:
+                    continue
+                if checkpoint.chunk_expired():
+                    writer.flush()
+                    raise ChunkTimeExpired()
+                checkpoint.observations.add(str(observation.pk))
+                existing = writer.get_for_observation(
+                    observation.siteeval_id, observation.pk, observation.timestamp
+                )
+                if dedup and found_timestamps.is_inside_range(
+                    observation.timestamp, dayRange
+                ):
+                    logger.warning(f'Skipping Timestamp: {timestamp}')
+                    continue
+                if existing is not None and not force:
+                    found_timestamps.add(observation.timestamp)
+                    continue
+                if pending is not None:
+                    results = pending.result()
+                else:
+                    results = fetch_observation_image(observation)
+                if results is None:
+                    logger.warning(
+                        f'COULD NOT FIND ANY IMAGE FOR TIMESTAMP: {timestamp}'
+                    )
+                    continue
+                bytes = results['bytes']
+                if bytes is None and results['blob'] is None:
+                    logger.warning(
+                        f'COULD NOT FIND ANY IMAGE FOR TIMESTAMP: {timestamp}'
+                    )
+                    continue
+                percent_black = results['percent_black']
+                cloudcover = results['cloudcover']
+                found_timestamp = results['timestamp']
+                if dayRange != -1 and percent_black < no_data_limit:
+                    found_timestamps.add(found_timestamp)
+                elif dayRange == -1:
+                    found_timestamps.add(found_timestamp)
+                # logger.warning(f'Retrieved Image with timestamp: {timestamp}')
+                checkpoint.downloaded_count += 1
+                if existing is not None:
+                    # the previous image is removed when the new one is uploaded
+                    writer.update(
+                        existing,
+                        results['key'],
+                        bytes,
+                        image_format=image_format,
+                        cloudcover=cloudcover,
+                        percent_black=percent_black,
+                        aws_location=results['uri'],
+                        image_bbox=Polygon.from_bbox(max_bbox),
+                        image_dimensions=results['image_dimensions'],
+                    )
+                else:
+                    writer.create(
+                        results['key'],
+                        bytes,
+                        image_format=image_format,
+                        site=observation.siteeval,
+                        observation=observation,
+                        timestamp=observation.timestamp,
+                        aws_location=results['uri'],
+                        cloudcover=cloudcover,
+                        source=baseConstellation,
+                        percent_black=percent_black,
+                        image_bbox=Polygon.from_bbox(max_bbox),
+                        image_dimensions=results['image_dimensions'],
+                    )
+    writer.flush()
+
+    # Now we need to go through and find all other images
+    # that exist in the start/end range of the siteEval
+    range_captures = [
+        capture for capture in captures if range_start <= capture.timestamp <= range_end
+    ]
     count = 1
-    num_of_captures = len(captures)
+    num_of_captures = len(range_captures)
     logger.warning(f'Found {num_of_captures} captures')
     if num_of_captures == 0:
-        self.update_state(
-            state='PROGRESS',
-            meta={
+        progress.update(
+            {
                 'current': count,
                 'total': num_of_captures,
                 'mode': 'No Captures',
                 'siteEvalId': site_eval_id,
-            },
+            }
         )
 
     logger.warning(f'Found {num_of_captures} captures')
-    for (
-        capture
-    ) in (
-        captures
-    ):  # Now we go through the list and add in a timestmap if it doesn't exist
-        self.update_state(
-            state='PROGRESS',
-            meta={
-                'current': count,
-                'total': num_of_captures,
-                'mode': 'Image Captures',
-                'siteEvalId': site_eval_id,
-            },
-        )
-        capture_timestamp = capture.timestamp.replace(microsecond=0)
-        if (
-            (baseConstellation == 'S2' or baseConstellation == 'L8')
-            and dayRange > -1
-            and is_inside_range(found_timestamps.keys(), capture_timestamp, dayRange)
+    # Now we go through the list and add in a timestmap if it doesn't exist
+    with ThreadPoolExecutor(max_workers=fetch_concurrency) as executor:
+        for capture, pending in prefetch(
+            range_captures,
+            fetch_range_image,
+            executor,
+            fetch_concurrency,
+            prefilter=should_fetch_capture,
         ):
-            count += 1
-            continue
-
-        if capture_timestamp not in found_timestamps.keys():
-            # we need to add a new image into the structure
-            bytes = None
-            if worldView:
-                bytes = get_worldview_processed_visual_bbox(
-                    capture, max_bbox, 'PNG', scale
-                )
-            else:
-                bytes = get_raster_bbox(capture.uri, max_bbox, 'PNG', scale)
-            if bytes is None:
+            progress.update(
+                {
+                    'current': count,
+                    'total': num_of_captures,
+                    'mode': 'Image Captures',
+                    'siteEvalId': site_eval_id,
+                }
+            )
+            capture_timestamp = capture.timestamp.replace(microsecond=0)
+            if capture_timestamp in checkpoint.captures:
                 count += 1
-                logger.warning(f'COULD NOT FIND ANY IMAGE FOR TIMESTAMP: {timestamp}')
                 continue
-            percent_black = get_percent_black_pixels(bytes)
-            cloudcover = capture.cloudcover
-            count += 1
-            output = f'tile_image_{baseSiteEval.pk}_nonobs_{uuid4()}.png'
-            image = File(io.BytesIO(bytes), name=output)
-            imageObj = Image.open(io.BytesIO(bytes))
-            if image is None:  # No null/None images should be set
+            if checkpoint.chunk_expired():
+                writer.flush()
+                raise ChunkTimeExpired()
+            checkpoint.captures.add(capture_timestamp)
+            if dedup and found_timestamps.is_inside_range(capture_timestamp, dayRange):
                 count += 1
                 continue
-            found = SiteImage.objects.filter(
-                site=baseSiteEval,
-                timestamp=capture_timestamp,
-                source=baseConstellation,
-            )
-            if dayRange != -1 and percent_black < no_data_limit:
-                found_timestamps[capture_timestamp] = True
-            elif dayRange == -1:
-                found_timestamps[capture_timestamp] = True
-            downloaded_count += 1
-            if found.exists():
-                existing = found.first()
-                existing.image.delete()
-                existing.cloudcover = cloudcover
-                existing.image = image
-                existing.aws_location = capture.uri
-                existing.image_bbox = Polygon.from_bbox(max_bbox)
-                existing.image_dimensions = [imageObj.width, imageObj.height]
-                existing.save()
+
+            if capture_timestamp not in found_timestamps:
+                # we need to add a new image into the structure
+                if pending is not None:
+                    results = pending.result()
+                else:
+                    results = fetch_range_image(capture)
+                bytes = results['bytes']
+                if bytes is None and results['blob'] is None:
+                    count += 1
+                    logger.warning(
+                        f'COULD NOT FIND ANY IMAGE FOR TIMESTAMP: {capture_timestamp}'
+                    )
+                    continue
+                percent_black = results['percent_black']
+                cloudcover = capture.cloudcover
+                count += 1
+                existing = writer.get_for_timestamp(baseSiteEval.pk, capture_timestamp)
+                if dayRange != -1 and percent_black < no_data_limit:
+                    found_timestamps.add(capture_timestamp)
+                elif dayRange == -1:
+                    found_timestamps.add(capture_timestamp)
+                checkpoint.downloaded_count += 1
+                if existing is not None:
+                    writer.update(
+                        existing,
+                        results['key'],
+                        bytes,
+                        image_format=image_format,
+                        cloudcover=cloudcover,
+                        percent_black=percent_black,
+                        aws_location=capture.uri,
+                        image_bbox=Polygon.from_bbox(max_bbox),
+                        image_dimensions=results['image_dimensions'],
+                    )
+                else:
+                    writer.create(
+                        results['key'],
+                        bytes,
+                        image_format=image_format,
+                        site=baseSiteEval,
+                        timestamp=capture_timestamp,
+                        aws_location=capture.uri,
+                        cloudcover=cloudcover,
+                        percent_black=percent_black,
+                        source=baseConstellation,
+                        image_bbox=Polygon.from_bbox(max_bbox),
+                        image_dimensions=results['image_dimensions'],
+                    )
             else:
-                SiteImage.objects.create(
-                    site=baseSiteEval,
-                    timestamp=capture_timestamp,
-                    aws_location=capture.uri,
-                    image=image,
-                    cloudcover=cloudcover,
-                    percent_black=percent_black,
-                    source=baseConstellation,
-                    image_bbox=Polygon.from_bbox(max_bbox),
-                    image_dimensions=[imageObj.width, imageObj.height],
-                )
-        else:
-            count += 1
-    return downloaded_count
+                count += 1
+    writer.flush()
+    checkpoint.finish()
+    return checkpoint.downloaded_count
 
 
 @shared_task
@@ -441,6 +686,36 @@ def delete_export_files() -> None:
     exports_to_delete.delete()
 
 
+@shared_task
+def delete_unreferenced_site_image_blobs() -> None:
+    """Delete the stored images whose SiteImages have all been deleted."""
+    delete_unreferenced_blobs()
+
+
+@shared_task
+def harvest_stac_items(
+    source: Literal['S2', 'L8', 'WV'],
+    bbox: tuple[float, float, float, float],
+    start: str,
+    end: str,
+) -> None:
+    """Copy the STAC items in an area and time range into the local catalogue."""
+    count = harvest(
+        source,
+        tuple(bbox),
+        datetime.fromisoformat(start),
+        datetime.fromisoformat(end),
+    )
+    logger.info(f'Harvested {count} {source} STAC items for {bbox} {start}/{end}')
+
+
+@shared_task
+def prune_stac_harvests() -> None:
+    """Delete the harvests of the local STAC catalogue that have expired."""
+    count = prune_harvests()
+    logger.info(f'Pruned {count} STAC harvests')
+
+
 @app.task(bind=True)
 def download_annotations(self, id: UUID4, mode: Literal['all', 'approved', 'rejected']):
     # Needs to go through the siteEvaluations and download one for each file
@@ -494,6 +769,10 @@ def download_annotations(self, id: UUID4, mode: Literal['all', 'approved', 'reje
 @shared_task
 def cancel_generate_images_task(model_run_id: UUID4) -> None:
     site_evaluations = SiteEvaluation.objects.filter(configuration=model_run_id)
+    # Sites that haven't been started yet are simply taken off the queue
+    SatelliteFetching.objects.filter(
+        site__in=site_evaluations, status=SatelliteFetching.Status.QUEUED
+    ).update(status=SatelliteFetching.Status.COMPLETE, parameters=None)
 
     for eval in site_evaluations.iterator():
         with transaction.atomic():
@@ -508,11 +787,189 @@ def cancel_generate_images_task(model_run_id: UUID4) -> None:
             if fetching_task is not None:
                 if fetching_task.status == SatelliteFetching.Status.RUNNING:
                     if fetching_task.celery_id != '':
-                        task = AsyncResult(fetching_task.celery_id)
-                        task.revoke(terminate=True)
+                        revoke_images_task(fetching_task.celery_id)
                     fetching_task.status = SatelliteFetching.Status.COMPLETE
                     fetching_task.celery_id = ''
+                    fetching_task.parameters = None
                     fetching_task.save()
+    schedule_site_images.delay()
+
+
+def queue_site_images(
+    site_eval_ids: list[UUID4],
+    parameters: dict,
+    priority: SatelliteFetching.Priority,
+) -> None:
+    """Queue the image generation of sites, to be started by the scheduler.
+
+    Sites whose images are already being generated are skipped, sites that
+    are already queued keep their place but move up to `priority`.
+    """
+    now = datetime.now()
+    with transaction.atomic():
+        # Use select_for_update here to lock the SatelliteFetching rows
+        # for the duration of this transaction in order to ensure their
+        # status doesn't change out from under us
+        fetching_tasks = {
+            fetching_task.site_id: fetching_task
+            for fetching_task in SatelliteFetching.objects.select_for_update().filter(
+                site__in=site_eval_ids
+            )
+        }
+        created: list[SatelliteFetching] = []
+        updated: list[SatelliteFetching] = []
+        for site_eval_id in site_eval_ids:
+            fetching_task = fetching_tasks.get(site_eval_id)
+            if fetching_task is None:
+                created.append(
+                    SatelliteFetching(
+                        site_id=site_eval_id,
+                        timestamp=now,
+                        status=SatelliteFetching.Status.QUEUED,
+                        priority=priority,
+                        parameters=parameters,
+                    )
+                )
+            elif fetching_task.status == SatelliteFetching.Status.QUEUED:
+                if fetching_task.priority < priority:
+                    fetching_task.priority = priority
+                    fetching_task.parameters = parameters
+                    updated.append(fetching_task)
+            elif fetching_task.status != SatelliteFetching.Status.RUNNING:
+                fetching_task.timestamp = now
+                fetching_task.status = SatelliteFetching.Status.QUEUED
+                fetching_task.priority = priority
+                fetching_task.parameters = parameters
+                fetching_task.celery_id = ''
+                fetching_task.error = ''
+                updated.append(fetching_task)
+        SatelliteFetching.objects.bulk_create(created)
+        SatelliteFetching.objects.bulk_update(
+            updated,
+            ['timestamp', 'status', 'priority', 'parameters', 'celery_id', 'error'],
+        )
+
+
+@shared_task
+def schedule_site_images() -> None:
+    """Start queued image generation within the concurrency budget.
+
+    At most `IMAGE_TASK_CONCURRENCY` image tasks run at once, and model runs
+    leave `IMAGE_TASK_INTERACTIVE_SLOTS` of them to sites requested one at a
+    time. Queued sites are started by priority, then in the order they were
+    queued in. Sites queued by scene are started in batches of up to
+    `IMAGE_TASK_SCENE_BATCH_SIZE` sites of a model run, each of which runs as
+    one task. Runs whenever an image task finishes, and periodically in case
+    one never does.
+    """
+    with transaction.atomic():
+        # The queued rows are locked before the running tasks are counted,
+        # so concurrent schedulers see each other's tasks
+        queued = list(
+            SatelliteFetching.objects.select_for_update()
+            .filter(status=SatelliteFetching.Status.QUEUED)
+            .order_by('-priority', 'timestamp')[: settings.IMAGE_TASK_CONCURRENCY]
+        )
+        if not queued:
+            return
+        # The sites of a batch generated by scene share one task
+        running = (
+            SatelliteFetching.objects.filter(status=SatelliteFetching.Status.RUNNING)
+            .exclude(celery_id='')
+            .values('celery_id')
+            .distinct()
+            .count()
+        )
+        bulk_limit = settings.IMAGE_TASK_CONCURRENCY - min(
+            settings.IMAGE_TASK_INTERACTIVE_SLOTS, settings.IMAGE_TASK_CONCURRENCY
+        )
+        started: set[int] = set()
+        for fetching_task in queued:
+            if fetching_task.pk in started:
+                continue
+            limit = (
+                settings.IMAGE_TASK_CONCURRENCY
+                if fetching_task.priority >= SatelliteFetching.Priority.SITE
+                else bulk_limit
+            )
+            if running >= limit:
+                # The remaining tasks have the same or a lower priority
+                break
+            parameters = dict(fetching_task.parameters)
+            by_scene = parameters.pop('groupByScene', False)
+            if by_scene:
+                # The model run's sites queued along with this one are
+                # started together, in the same order as the queue
+                batch = list(
+                    SatelliteFetching.objects.select_for_update()
+                    .filter(
+                        status=SatelliteFetching.Status.QUEUED,
+                        site__configuration=fetching_task.site.configuration_id,
+                        parameters=fetching_task.parameters,
+                    )
+                    .order_by('-priority', 'timestamp')[
+                        : settings.IMAGE_TASK_SCENE_BATCH_SIZE
+                    ]
+                )
+                celery_id = start_model_run_images_by_scene(
+                    [task.site_id for task in batch], **parameters
+                )
+            else:
+                batch = [fetching_task]
+                celery_id = start_siteobservation_images(
+                    fetching_task.site_id, **parameters
+                ).id
+            now = datetime.now()
+            for task in batch:
+                task.timestamp = now
+                task.status = SatelliteFetching.Status.RUNNING
+                task.celery_id = celery_id
+                # Sites of a batch keep their parameters, so they can be
+                # queued again when another site of the batch is cancelled
+                if not by_scene:
+                    task.parameters = None
+                started.add(task.pk)
+            SatelliteFetching.objects.bulk_update(
+                batch, ['timestamp', 'status', 'celery_id', 'parameters']
+            )
+            running += 1
+
+
+def get_images_queue_depth(model_run_id: UUID4) -> dict[str, int]:
+    """The number of a model run's sites in each state of image generation.
+
+    `ahead` is the number of queued sites of any model run that are started
+    before the first queued site of this one.
+    """
+    counts = dict.fromkeys(SatelliteFetching.Status.values, 0)
+    for row in (
+        SatelliteFetching.objects.filter(site__configuration=model_run_id)
+        .values('status')
+        .annotate(count=Count('pk'))
+        .order_by()
+    ):
+        if row['status'] in counts:
+            counts[row['status']] += row['count']
+
+    queued = SatelliteFetching.objects.filter(status=SatelliteFetching.Status.QUEUED)
+    first = (
+        queued.filter(site__configuration=model_run_id)
+        .order_by('-priority', 'timestamp')
+        .first()
+    )
+    ahead = 0
+    if first is not None:
+        ahead = queued.filter(
+            Q(priority__gt=first.priority)
+            | Q(priority=first.priority, timestamp__lt=first.timestamp)
+        ).count()
+    return {
+        'queued': counts[SatelliteFetching.Status.QUEUED],
+        'running': counts[SatelliteFetching.Status.RUNNING],
+        'complete': counts[SatelliteFetching.Status.COMPLETE],
+        'error': counts[SatelliteFetching.Status.ERROR],
+        'ahead': ahead,
+    }
 
 
 @shared_task
@@ -525,42 +982,24 @@ def generate_site_images(
     overrideDates: None | list[datetime, datetime] = None,
     scale: Literal['default', 'bits'] | list[int] = 'default',
     bboxScale: float = BboxScaleDefault,
+    imageFormat: ImageFormat | None = None,
 ):
-    siteeval = SiteEvaluation.objects.get(pk=evaluation_id)
-    with transaction.atomic():
-        # Use select_for_update here to lock the SatelliteFetching row
-        # for the duration of this transaction in order to ensure its
-        # status doesn't change out from under us
-        fetching_task = (
-            SatelliteFetching.objects.select_for_update().filter(site=siteeval).first()
-        )
-        if fetching_task is not None:
-            # If the task already exists and is running, return a 409 and do not
-            # start another one.
-            if fetching_task.status == SatelliteFetching.Status.RUNNING:
-                return 409, 'Image generation already in progress.'
-            # Otherwise, if the task exists but is *not* running, set the status
-            # to running and kick off the task
-            fetching_task.status = SatelliteFetching.Status.RUNNING
-            fetching_task.save()
-        else:
-            fetching_task = SatelliteFetching.objects.create(
-                site=siteeval,
-                timestamp=datetime.now(),
-                status=SatelliteFetching.Status.RUNNING,
-            )
-        task_id = get_siteobservation_images_task.delay(
-            evaluation_id,
-            constellation,
-            force,
-            dayRange,
-            noData,
-            overrideDates,
-            scale,
-            bboxScale,
-        )
-        fetching_task.celery_id = task_id.id
-        fetching_task.save()
+    queue_site_images(
+        [evaluation_id],
+        {
+            'baseConstellations': constellation,
+            'force': force,
+            'dayRange': dayRange,
+            'no_data_limit': noData,
+            'overrideDates': overrideDates,
+            'scale': scale,
+            'bboxScale': bboxScale,
+            'imageFormat': imageFormat,
+        },
+        SatelliteFetching.Priority.SITE,
+    )
+    # Sites requested one at a time are started right away if there's room
+    schedule_site_images()
 
 
 @shared_task
@@ -573,16 +1012,382 @@ def generate_site_images_for_evaluation_run(
     overrideDates: None | list[datetime, datetime] = None,
     scale: Literal['default', 'bits'] | list[int] = 'default',
     bboxScale: float = BboxScaleDefault,
+    imageFormat: ImageFormat | None = None,
+    groupByScene: bool = False,
 ):
-    sites = SiteEvaluation.objects.filter(configuration=model_run_id)
-    for eval in sites.iterator():
-        generate_site_images.delay(
-            eval.pk,
-            constellation,
-            force,
-            dayRange,
-            noData,
-            overrideDates,
-            scale,
-            bboxScale,
+    """Queue the image generation of all sites in a model run.
+
+    The sites are started by `schedule_site_images` as the concurrency
+    budget allows, after any sites requested one at a time. With
+    `groupByScene`, the sites started together share one task (see
+    `generate_model_run_images_by_scene`).
+    """
+    queue_site_images(
+        list(
+            SiteEvaluation.objects.filter(configuration=model_run_id).values_list(
+                'pk', flat=True
+            )
+        ),
+        {
+            'baseConstellations': constellation,
+            'force': force,
+            'dayRange': dayRange,
+            'no_data_limit': noData,
+            'overrideDates': overrideDates,
+            'scale': scale,
+            'bboxScale': bboxScale,
+            'imageFormat': imageFormat,
+            'groupByScene': groupByScene,
+        },
+        SatelliteFetching.Priority.MODEL_RUN,
+    )
+    schedule_site_images.delay()
+
+
+def save_capture_image(
+    writer: SiteImageWriter,
+    site_eval: SiteEvaluation,
+    capture,
+    capture_timestamp: datetime,
+    results: dict,
+    baseConstellation: str,
+    bbox: list[float],
+    image_format: ImageFormat,
+) -> None:
+    fields = {
+        'image_format': image_format,
+        'cloudcover': capture.cloudcover,
+        'percent_black': results['percent_black'],
+        'aws_location': capture.uri,
+        'image_bbox': Polygon.from_bbox(bbox),
+        'image_dimensions': results['image_dimensions'],
+    }
+    existing = writer.get_for_timestamp(site_eval.pk, capture_timestamp)
+    if existing is not None:
+        writer.update(existing, results['key'], results['bytes'], **fields)
+    else:
+        writer.create(
+            results['key'],
+            results['bytes'],
+            site=site_eval,
+            timestamp=capture_timestamp,
+            source=baseConstellation,
+            **fields,
+        )
+
+
+def get_images_by_scene(
+    self,
+    site_evals: list[SiteEvaluation],
+    baseConstellation='WV',
+    force=False,  # forced downloading found_timestamps again
+    dayRange=14,
+    no_data_limit=50,
+    overrideDates: None | list[datetime, datetime] = None,
+    scale: Literal['default', 'bits'] | list[int] = 'default',
+    bboxScale: float = BboxScaleDefault,
+    imageFormat: ImageFormat | None = None,
+) -> dict[UUID4, int]:
+    """Generate the images of sites for a constellation, one scene at a time.
+
+    The progress of each site is checkpointed (see `ImageCheckpoint`), so a
+    run that was revoked or stopped at the end of a chunk resumes where it
+    left off. Returns the number of images downloaded for each site.
+    """
+    progress = TaskProgress(self.request.id)
+    image_format = imageFormat or settings.SITE_IMAGE_FORMAT
+    worldView = baseConstellation == 'WV'
+    dedup = baseConstellation in ('S2', 'L8') and dayRange > -1
+    checkpoints = {
+        site_eval.pk: ImageCheckpoint(
+            SiteImage,
+            site_eval.pk,
+            baseConstellation,
+            {
+                'groupByScene': True,
+                'force': force,
+                'dayRange': dayRange,
+                'no_data_limit': no_data_limit,
+                'overrideDates': overrideDates,
+                'scale': scale,
+                'bboxScale': bboxScale,
+                'imageFormat': image_format,
+            },
+        )
+        for site_eval in site_evals
+    }
+    downloaded_counts = {
+        pk: checkpoint.downloaded_count for pk, checkpoint in checkpoints.items()
+    }
+    site_evals = [
+        site_eval for site_eval in site_evals if not checkpoints[site_eval.pk].complete
+    ]
+    if not site_evals:
+        return downloaded_counts
+
+    def chunk_expired() -> bool:
+        # All checkpoints were created when the task started
+        return checkpoints[site_evals[0].pk].chunk_expired()
+
+    def save_checkpoints() -> None:
+        for checkpoint in checkpoints.values():
+            checkpoint.save()
+
+    # Find the captures of every site, grouped by the scene they come from
+    bboxes: dict[UUID4, list[float]] = {}
+    found_timestamps: dict[UUID4, TimestampIndex] = {}
+    scenes: dict[str, tuple] = {}
+    for site_eval in site_evals:
+        progress.update(
+            {
+                'current': len(bboxes),
+                'total': len(site_evals),
+                'mode': 'Searching All Images',
+                'modelRunId': site_eval.configuration_id,
+            }
+        )
+        bbox = get_site_bbox(site_eval, baseConstellation, bboxScale)
+        bboxes[site_eval.pk] = bbox
+
+        min_time = site_eval.start_date
+        max_time = site_eval.end_date
+        if min_time is None:
+            min_time = datetime.strptime(BaseTime, '%Y-%m-%d')
+        if max_time is None:
+            max_time = datetime.now()
+        observed = SiteObservation.objects.filter(siteeval=site_eval).aggregate(
+            first=Min('timestamp'), last=Max('timestamp')
+        )
+        if observed['first'] is not None:
+            min_time = min(min_time, observed['first'])
+            max_time = max(max_time, observed['last'])
+        if overrideDates and len(overrideDates) == 2:
+            min_time = datetime.strptime(overrideDates[0], '%Y-%m-%d')
+            max_time = datetime.strptime(overrideDates[1], '%Y-%m-%d')
+        timebuffer = (
+            (max_time + timedelta(days=30)) - (min_time - timedelta(days=30))
+        ) / 2
+        timestamp = (min_time + timedelta(days=30)) + timebuffer
+
+        found_timestamps[site_eval.pk] = checkpoints[site_eval.pk].found_timestamps
+
+        for capture in get_range_captures(
+            bbox, timestamp, baseConstellation, timebuffer, worldView
+        ):
+            scenes.setdefault(capture.uri, (capture, []))[1].append(site_eval)
+
+    # The checkpoints are saved whenever the images are written
+    writer = SiteImageWriter(
+        SiteImage,
+        [site_eval.pk for site_eval in site_evals],
+        baseConstellation,
+        on_flush=save_checkpoints,
+    )
+    if not force:
+        for site_pk, image_timestamp in writer.timestamps():
+            found_timestamps[site_pk].add(image_timestamp)
+
+    def should_fetch(site_eval: SiteEvaluation, capture_timestamp: datetime) -> bool:
+        if capture_timestamp in checkpoints[site_eval.pk].captures:
+            return False
+        found = found_timestamps[site_eval.pk]
+        if dedup and found.is_inside_range(capture_timestamp, dayRange):
+            return False
+        return capture_timestamp not in found
+
+    def pending_chips():
+        # Scenes are processed in time order, so the same images are skipped
+        # for being too close to an earlier one as when sites are processed
+        # one at a time
+        for capture, sites in sorted(scenes.values(), key=lambda s: s[0].timestamp):
+            capture_timestamp = capture.timestamp.replace(microsecond=0)
+            for chunk in chunked(sites, SceneBatchSize):
+                yield (
+                    capture,
+                    len(chunk),
+                    [s for s in chunk if should_fetch(s, capture_timestamp)],
+                )
+
+    def fetch_chips(chips):
+        capture, _, sites = chips
+        return fetch_capture_chips(
+            capture, [bboxes[s.pk] for s in sites], worldView, scale, image_format
+        )
+
+    # Each scene is read once for all of its sites, while the next few
+    # scenes are fetched ahead of time by a bounded pool of threads
+    count = 0
+    total = sum(len(sites) for _, sites in scenes.values())
+    fetch_concurrency = max(1, settings.IMAGE_FETCH_CONCURRENCY)
+    with ThreadPoolExecutor(max_workers=fetch_concurrency) as executor:
+        for (capture, chunk_size, sites), pending in prefetch(
+            pending_chips(),
+            fetch_chips,
+            executor,
+            fetch_concurrency,
+            prefilter=lambda chips: bool(chips[2]),
+        ):
+            progress.update(
+                {
+                    'current': count,
+                    'total': total,
+                    'mode': 'Image Captures',
+                    'modelRunId': site_evals[0].configuration_id,
+                }
+            )
+            count += chunk_size
+            if pending is None:
+                continue
+            if chunk_expired():
+                writer.flush()
+                raise ChunkTimeExpired()
+            capture_timestamp = capture.timestamp.replace(microsecond=0)
+            for site_eval, results in zip(sites, pending.result()):
+                # An earlier chunk may have found an image close to this one
+                if not should_fetch(site_eval, capture_timestamp):
+                    continue
+                checkpoint = checkpoints[site_eval.pk]
+                checkpoint.captures.add(capture_timestamp)
+                if results['bytes'] is None and results['blob'] is None:
+                    logger.warning(
+                        f'COULD NOT FIND ANY IMAGE FOR TIMESTAMP: {capture_timestamp}'
+                    )
+                    continue
+                save_capture_image(
+                    writer,
+                    site_eval,
+                    capture,
+                    capture_timestamp,
+                    results,
+                    baseConstellation,
+                    bboxes[site_eval.pk],
+                    image_format,
+                )
+                if dayRange != -1 and results['percent_black'] < no_data_limit:
+                    found_timestamps[site_eval.pk].add(capture_timestamp)
+                elif dayRange == -1:
+                    found_timestamps[site_eval.pk].add(capture_timestamp)
+                checkpoint.downloaded_count += 1
+    writer.flush()
+    for site_eval in site_evals:
+        checkpoint = checkpoints[site_eval.pk]
+        checkpoint.finish()
+        downloaded_counts[site_eval.pk] = checkpoint.downloaded_count
+    return downloaded_counts
+
+
+def start_model_run_images_by_scene(
+    site_eval_ids: list[UUID4],
+    baseConstellations=['WV'],  # noqa
+    force=False,  # forced downloading found_timestamps again
+    dayRange=14,
+    no_data_limit=50,
+    overrideDates: None | list[datetime, datetime] = None,
+    scale: Literal['default', 'bits'] | list[int] = 'default',
+    bboxScale: float = BboxScaleDefault,
+    imageFormat: ImageFormat | None = None,
+) -> str:
+    """Start generating the images of some of a model run's sites by scene.
+
+    Returns the id of the task, which is stored as the `celery_id` of all of
+    the sites' SatelliteFetching. Like `start_siteobservation_images`, the
+    task is only sent once the current transaction commits.
+    """
+    signature = generate_model_run_images_by_scene.s(
+        site_eval_ids,
+        baseConstellations,
+        force,
+        dayRange,
+        no_data_limit,
+        overrideDates,
+        scale,
+        bboxScale,
+        imageFormat,
+    )
+    result = signature.freeze()
+    transaction.on_commit(signature.apply_async)
+    return result.id
+
+
+@app.task(bind=True)
+def generate_model_run_images_by_scene(
+    self,
+    site_eval_ids: list[UUID4],
+    baseConstellations=['WV'],  # noqa
+    force=False,  # forced downloading found_timestamps again
+    dayRange=14,
+    no_data_limit=50,
+    overrideDates: None | list[datetime, datetime] = None,
+    scale: Literal['default', 'bits'] | list[int] = 'default',
+    bboxScale: float = BboxScaleDefault,
+    imageFormat: ImageFormat | None = None,
+) -> None:
+    """Generate the images of sites of a model run, one scene at a time.
+
+    Rather than reading every capture once per site, the sites are grouped by
+    the captures that cover them and each capture is read once for all of
+    its sites. Only the images in each site's time range are generated, not
+    the ones matching individual site observations. Started by
+    `schedule_site_images` for the sites queued with `groupByScene`, and like
+    `get_constellation_images_task` continued in a new task at the end of
+    each chunk.
+    """
+    dayRange = int(dayRange)
+    no_data_limit = int(no_data_limit)
+
+    # Sites cancelled since the task was started are no longer assigned to it
+    fetching_tasks = SatelliteFetching.objects.filter(
+        site__in=site_eval_ids, celery_id=self.request.id
+    )
+    site_evals = list(
+        SiteEvaluation.objects.filter(
+            pk__in=fetching_tasks.values_list('site_id', flat=True)
+        )
+    )
+    if not site_evals:
+        return
+
+    downloaded_counts = {site_eval.pk: 0 for site_eval in site_evals}
+    try:
+        for constellation in baseConstellations:
+            for site_eval_id, downloaded_count in get_images_by_scene(
+                self,
+                site_evals,
+                baseConstellation=constellation,
+                force=force,
+                dayRange=dayRange,
+                no_data_limit=no_data_limit,
+                overrideDates=overrideDates,
+                scale=scale,
+                bboxScale=bboxScale,
+                imageFormat=imageFormat,
+            ).items():
+                downloaded_counts[site_eval_id] += downloaded_count
+        if settings.SITE_IMAGE_STORAGE == 'stack':
+            for site_eval_id, downloaded_count in downloaded_counts.items():
+                if downloaded_count:
+                    write_site_image_stack(site_eval_id)
+    except ChunkTimeExpired:
+        # The same task continues from the checkpoints, keeping its id and
+        # with it the SatelliteFetching rows of its sites
+        raise self.replace(self.s(*self.request.args, **self.request.kwargs))
+    except Exception as e:
+        fetching_tasks.update(
+            status=SatelliteFetching.Status.ERROR,
+            error=str(e),
+            celery_id='',
+            parameters=None,
+        )
+        raise
+    else:
+        fetching_tasks.filter(
+            site__in=[pk for pk, count in downloaded_counts.items() if count == 0]
+        ).update(error='No Captures found')
+        fetching_tasks.update(
+            status=SatelliteFetching.Status.COMPLETE, celery_id='', parameters=None
         )
+        for site_eval in site_evals:
+            clear_image_checkpoints(SiteImage, site_eval.pk, baseConstellations)
+    finally:
+        clear_task_progress(self.request.id)
+        schedule_site_images.delay()
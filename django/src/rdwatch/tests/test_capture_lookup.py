@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import mercantile
+
+from django.core.cache import cache
+
+from rdwatch.utils import capture_lookup
+from rdwatch.utils.capture_lookup import (
+    LOOKUP_MAX_CAPTURES,
+    LOOKUP_WAIT_TIMEOUT,
+    _get_lookup_key,
+    _lookup_tile_captures,
+)
+
+
+def test_lookup_tile_captures(settings) -> None:
+    settings.CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    }
+    day = datetime(2023, 5, 1)
+    parent = mercantile.tile(-122.45, 37.55, 8)
+    tile = mercantile.Tile(parent.x * 16, parent.y * 16, 12)
+    bounds = mercantile.bounds(tile)
+    far_bounds = mercantile.bounds(mercantile.Tile(tile.x + 2, tile.y, tile.z))
+    captures = [
+        SimpleNamespace(timestamp=day + timedelta(hours=10), bbox=tuple(bounds)),
+        SimpleNamespace(timestamp=day + timedelta(hours=15), bbox=tuple(bounds)),
+        SimpleNamespace(timestamp=day + timedelta(hours=10), bbox=tuple(far_bounds)),
+    ]
+    searches = []
+
+    def search(timestamp, bbox, timebuffer):
+        searches.append((timestamp, bbox, timebuffer))
+        return captures
+
+    def lookup(timestamp, tile):
+        return _lookup_tile_captures('S2', timestamp, tile.z, tile.x, tile.y, search)
+
+    assert lookup(day + timedelta(hours=10, minutes=30), tile) == [captures[0]]
+    assert lookup(day + timedelta(hours=14), tile) == [captures[1]]
+    # Sibling tiles on the same day share the search
+    sibling = mercantile.Tile(tile.x + 2, tile.y, tile.z)
+    assert lookup(day + timedelta(hours=9), sibling) == [captures[2]]
+    assert len(searches) == 1
+    # The search covers the whole day and the parent tile
+    timestamp, bbox, timebuffer = searches[0]
+    assert timestamp - timebuffer <= day - timedelta(hours=1)
+    assert timestamp + timebuffer >= day + timedelta(days=1, hours=1)
+    assert bbox == tuple(mercantile.bounds(parent))
+
+    lookup(day + timedelta(days=1, hours=10), tile)
+    assert len(searches) == 2
+
+
+def test_lookup_tile_captures_wait(settings, monkeypatch) -> None:
+    settings.CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    }
+    day = datetime(2023, 6, 1)
+    parent = mercantile.tile(-122.45, 37.55, 8)
+    tile = mercantile.Tile(parent.x * 16, parent.y * 16, 12)
+    clock = [0.0]
+
+    def sleep(seconds: float) -> None:
+        clock[0] += seconds
+
+    monkeypatch.setattr(capture_lookup.time, 'monotonic', lambda: clock[0])
+    monkeypatch.setattr(capture_lookup.time, 'sleep', sleep)
+    searches = []
+
+    def search(timestamp, bbox, timebuffer):
+        searches.append(bbox)
+        return []
+
+    # The same lookup is running elsewhere, but doesn't finish in time
+    lock_key = f'{_get_lookup_key("S2", day, parent)}|lock'
+    cache.add(lock_key, True)
+    _lookup_tile_captures(
+        'S2', day + timedelta(hours=10), tile.z, tile.x, tile.y, search
+    )
+    assert clock[0] <= LOOKUP_WAIT_TIMEOUT + 0.1
+    # Only the tile itself is searched for
+    assert searches == [tuple(mercantile.bounds(tile))]
+    cache.delete(lock_key)
+
+
+def test_lookup_tile_captures_too_many(settings) -> None:
+    settings.CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    }
+    day = datetime(2023, 7, 1)
+    parent = mercantile.tile(-122.45, 37.55, 8)
+    tile = mercantile.Tile(parent.x * 16, parent.y * 16, 12)
+    tile_bbox = tuple(mercantile.bounds(tile))
+    capture = SimpleNamespace(timestamp=day + timedelta(hours=10), bbox=tile_bbox)
+    searches = []
+
+    def search(timestamp, bbox, timebuffer):
+        searches.append(bbox)
+        if bbox == tile_bbox:
+            return [capture]
+        return [capture] * (LOOKUP_MAX_CAPTURES + 1)
+
+    def lookup(timestamp):
+        return _lookup_tile_captures('S2', timestamp, tile.z, tile.x, tile.y, search)
+
+    # The captures of a crowded area aren't cached, the tile is searched instead
+    assert lookup(day + timedelta(hours=10)) == [capture]
+    assert searches == [tuple(mercantile.bounds(parent)), tile_bbox]
+    # Later lookups of the area go straight to searching their tile
+    assert lookup(day + timedelta(hours=11)) == [capture]
+    assert searches[2:] == [tile_bbox]
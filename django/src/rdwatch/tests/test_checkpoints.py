@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from rdwatch.models import SiteImage
+from rdwatch.utils.checkpoints import ImageCheckpoint, clear_image_checkpoints
+
+SITE_ID = '4bb7ed3b-3e24-4b1c-b4a4-2a5fbb4a1f4e'
+
+
+def test_image_checkpoint(settings) -> None:
+    settings.CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    }
+    params = {'force': True, 'dayRange': 14}
+    checkpoint = ImageCheckpoint(SiteImage, SITE_ID, 'S2', params)
+    assert not checkpoint.resumed
+
+    checkpoint.captures.add(datetime(2020, 1, 1, 10, 30))
+    checkpoint.found_timestamps.add(datetime(2020, 1, 1, 10, 30))
+    checkpoint.downloaded_count += 1
+    checkpoint.save()
+
+    resumed = ImageCheckpoint(SiteImage, SITE_ID, 'S2', params)
+    assert resumed.resumed
+    assert resumed.captures == {datetime(2020, 1, 1, 10, 30)}
+    assert datetime(2020, 1, 1, 10, 30) in resumed.found_timestamps
+    assert resumed.downloaded_count == 1
+
+    # A checkpoint only applies to tasks with the same parameters
+    assert not ImageCheckpoint(
+        SiteImage, SITE_ID, 'S2', {**params, 'force': False}
+    ).resumed
+    assert not ImageCheckpoint(SiteImage, SITE_ID, 'L8', params).resumed
+
+    resumed.finish()
+    assert ImageCheckpoint(SiteImage, SITE_ID, 'S2', params).complete
+    clear_image_checkpoints(SiteImage, SITE_ID, ['S2', 'L8'])
+    assert not ImageCheckpoint(SiteImage, SITE_ID, 'S2', params).resumed
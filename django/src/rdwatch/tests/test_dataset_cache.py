@@ -0,0 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import rasterio  # type: ignore
+
+from rdwatch.utils.dataset_cache import cached_reader, open_dataset
+
+
+def write_raster(path) -> str:
+    with rasterio.open(
+        path, 'w', driver='GTiff', width=4, height=4, count=1, dtype='uint8'
+    ) as dst:
+        dst.write(np.zeros((1, 4, 4), dtype='uint8'))
+    return str(path)
+
+
+def test_open_dataset_reuses_datasets(tmp_path, settings) -> None:
+    settings.RASTER_DATASET_CACHE_SIZE = 2
+    first = write_raster(tmp_path / 'first.tif')
+    second = write_raster(tmp_path / 'second.tif')
+    third = write_raster(tmp_path / 'third.tif')
+
+    with open_dataset(first) as dataset:
+        # A dataset in use isn't handed out again
+        with open_dataset(first) as other:
+            assert other is not dataset
+    with open_dataset(first) as reused:
+        assert reused in (dataset, other)
+
+    # Reading through a Reader leaves the cached dataset open
+    with cached_reader(second) as cog:
+        second_dataset = cog.dataset
+    assert not second_dataset.closed
+
+    # The least recently used datasets are closed once the cache is full
+    with open_dataset(third):
+        pass
+    assert dataset.closed and other.closed
+    assert not second_dataset.closed
+
+
+def test_open_dataset_shared_between_threads(tmp_path, settings) -> None:
+    settings.RASTER_DATASET_CACHE_SIZE = 2
+    path = write_raster(tmp_path / 'shared.tif')
+    with open_dataset(path) as dataset:
+        pass
+
+    def read(_) -> bool:
+        with open_dataset(path) as thread_dataset:
+            return thread_dataset is dataset
+
+    # A new thread reuses the dataset opened by another one
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert list(executor.map(read, [None])) == [True]
+
+
+def test_open_dataset_closes_failed_datasets(tmp_path, settings) -> None:
+    settings.RASTER_DATASET_CACHE_SIZE = 2
+    path = write_raster(tmp_path / 'failed.tif')
+
+    with pytest.raises(RuntimeError):
+        with open_dataset(path) as dataset:
+            raise RuntimeError()
+    assert dataset.closed
+    with open_dataset(path) as reopened:
+        assert reopened is not dataset
@@ -0,0 +1,35 @@
+from rdwatch.utils import host_budget
+from rdwatch.utils.host_budget import get_host_budget, wait_for_host_budget
+
+
+def test_wait_for_host_budget(settings, monkeypatch) -> None:
+    settings.CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    }
+    settings.HOST_REQUEST_BUDGET = 0
+    settings.HOST_REQUEST_BUDGETS = {'cogs.example.com': 2}
+    assert get_host_budget('stac.example.com') == 0
+    assert get_host_budget('cogs.example.com') == 2
+
+    clock = [1000.25]
+    sleeps = []
+
+    def sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(host_budget.time, 'time', lambda: clock[0])
+    monkeypatch.setattr(host_budget.time, 'sleep', sleep)
+
+    # Requests to hosts without a budget are never held back
+    for _ in range(10):
+        wait_for_host_budget('https://stac.example.com/search')
+    assert sleeps == []
+
+    wait_for_host_budget('https://cogs.example.com/a.tif')
+    wait_for_host_budget('https://cogs.example.com/b.tif')
+    assert sleeps == []
+    # The third request waits for the next second
+    wait_for_host_budget('https://cogs.example.com/c.tif')
+    assert sleeps == [0.75]
+    assert clock[0] == 1001
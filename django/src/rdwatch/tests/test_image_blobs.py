@@ -0,0 +1,22 @@
+from rdwatch.utils.image_blobs import get_blob_key
+
+URI = 's3://sentinel-cogs/sentinel-s2-l2a-cogs/T10SEG_20230101_0_L2A/TCI.tif'
+BBOX = (-122.5, 37.5, -122.4, 37.6)
+
+
+def test_get_blob_key(settings) -> None:
+    settings.SITE_IMAGE_QUALITY = 80
+    key = get_blob_key(URI, BBOX, False, 'default', 'png')
+    assert key == get_blob_key(URI, list(BBOX), False, 'default', 'png')
+
+    assert key != get_blob_key(
+        URI, (-122.5, 37.5, -122.4, 37.7), False, 'default', 'png'
+    )
+    assert key != get_blob_key(URI, BBOX, False, 'bits', 'png')
+    assert key != get_blob_key(URI, BBOX, False, 'default', 'webp')
+
+    # The quality only matters to lossy formats
+    webp = get_blob_key(URI, BBOX, False, 'default', 'webp')
+    settings.SITE_IMAGE_QUALITY = 90
+    assert key == get_blob_key(URI, BBOX, False, 'default', 'png')
+    assert webp != get_blob_key(URI, BBOX, False, 'default', 'webp')
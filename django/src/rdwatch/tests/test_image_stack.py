@@ -0,0 +1,14 @@
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from rdwatch.utils.image_stack import read_range
+
+
+def test_read_range(tmp_path, settings) -> None:
+    settings.DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+    settings.MEDIA_ROOT = str(tmp_path)
+    name = default_storage.save('stack.bin', ContentFile(b'firstsecondthird'))
+
+    assert read_range(name, 0, 5) == b'first'
+    assert read_range(name, 5, 6) == b'second'
+    assert read_range(name, 11, 0) == b''
@@ -0,0 +1,73 @@
+import io
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image
+from rio_tiler.models import ImageData
+
+from rdwatch.utils.images import (
+    encode_image,
+    get_closest_capture,
+    get_percent_black_pixels,
+    render_image,
+)
+
+
+def test_percent_black_pixels() -> None:
+    data = np.full((3, 10, 10), 255, dtype='uint8')
+    # 25 of the 100 pixels are black in all bands
+    data[:, :2, :] = 0
+    data[:, 2, :5] = 0
+    # Black in only one band does not count as a black pixel
+    data[0, 9, :] = 0
+
+    assert get_percent_black_pixels(ImageData(data)) == 25.0
+
+
+def test_percent_black_pixels_ignores_alpha() -> None:
+    data = np.zeros((4, 4, 4), dtype='uint8')
+    data[3] = 255
+
+    assert get_percent_black_pixels(ImageData(data)) == 100.0
+
+
+def test_closest_capture() -> None:
+    start = datetime(2020, 1, 1)
+    captures = [
+        SimpleNamespace(timestamp=start + timedelta(days=days))
+        for days in (0, 3, 4, 10)
+    ]
+
+    assert get_closest_capture(captures, start + timedelta(hours=12)) is captures[0]
+    assert get_closest_capture(captures, start + timedelta(days=3.6)) is captures[2]
+    # Captures more than a day away don't match
+    assert get_closest_capture(captures, start + timedelta(days=7)) is None
+    assert get_closest_capture(captures, start + timedelta(days=11)) is captures[3]
+    assert get_closest_capture(captures, start - timedelta(days=2)) is None
+
+
+@pytest.mark.parametrize('image_format', ['png', 'webp', 'webp-lossless'])
+def test_encode_image(image_format, settings) -> None:
+    settings.SITE_IMAGE_QUALITY = 80
+    data = np.random.default_rng(0).integers(0, 256, (3, 16, 24), dtype='uint8')
+
+    encoded = Image.open(io.BytesIO(encode_image(ImageData(data), image_format)))
+
+    assert encoded.format == image_format.split('-')[0].upper()
+    assert encoded.size == (24, 16)
+    if image_format in ('png', 'webp-lossless'):
+        assert (np.asarray(encoded.convert('RGB')) == data.transpose(1, 2, 0)).all()
+
+
+def test_render_image(settings) -> None:
+    settings.SITE_IMAGE_QUALITY = 80
+    data = np.full((3, 16, 24), 255, dtype='uint8')
+    data[:, :4, :] = 0
+
+    rendered = render_image(ImageData(data), 'png')
+
+    assert rendered['image_dimensions'] == [24, 16]
+    assert rendered['percent_black'] == 25.0
+    assert Image.open(io.BytesIO(rendered['bytes'])).size == (24, 16)
@@ -0,0 +1,42 @@
+import copy
+
+import pytest
+
+from rdwatch.models import lookups
+
+
+@pytest.mark.django_db(databases=['default'])
+def test_lookup_cache(django_assert_num_queries) -> None:
+    lookups.ProcessingLevel.objects.clear_cache()
+
+    level, created = lookups.ProcessingLevel.objects.get_or_create_cached(
+        slug='test', defaults={'description': 'test level'}
+    )
+    assert created
+
+    # Subsequent lookups are served from memory
+    with django_assert_num_queries(0):
+        assert lookups.ProcessingLevel.objects.get_cached('test') == level
+        assert level in lookups.ProcessingLevel.objects.all_cached()
+
+    # Changes clear the cache
+    level.description = 'updated'
+    level.save()
+    cached = lookups.ProcessingLevel.objects.get_cached('test')
+    assert cached.description == 'updated'
+
+    level.delete()
+    with pytest.raises(lookups.ProcessingLevel.DoesNotExist):
+        lookups.ProcessingLevel.objects.get_cached('test')
+
+
+def test_lookup_cache_per_model() -> None:
+    manager = lookups.ProcessingLevel.objects
+    assert manager._lock is not lookups.ObservationLabel.objects._lock
+    # Copies of a manager, as Django makes for each model, don't share its cache
+    manager._cache = {}
+    manager_copy = copy.copy(manager)
+    assert manager_copy._lock is not manager._lock
+    assert manager_copy._cache is None
+    assert manager_copy.model is manager.model
+    manager.clear_cache()
@@ -0,0 +1,100 @@
+from datetime import datetime
+
+import pytest
+from ninja.testing import TestClient
+
+from django.contrib.gis.geos import Polygon
+
+from rdwatch import tasks
+from rdwatch.models import ModelRun, SatelliteFetching, SiteEvaluation, lookups
+from rdwatch.models.region import get_or_create_region
+from rdwatch.views import site_observation
+
+PARAMETERS = {
+    'baseConstellations': ['S2'],
+    'force': False,
+    'dayRange': 14,
+    'no_data_limit': 50,
+    'overrideDates': None,
+    'scale': 'default',
+    'bboxScale': 1.2,
+    'imageFormat': None,
+    'groupByScene': True,
+}
+
+
+def create_sites(model_run: ModelRun, count: int) -> list[SiteEvaluation]:
+    region, _ = get_or_create_region('US_R001')
+    return [
+        SiteEvaluation.objects.create(
+            configuration=model_run,
+            region=region,
+            number=number,
+            geom=Polygon.from_bbox((0, 0, 10, 10)),
+            label=lookups.ObservationLabel.objects.first(),
+            score=1.0,
+        )
+        for number in range(count)
+    ]
+
+
+def queue_sites(sites: list[SiteEvaluation], **fields) -> None:
+    SatelliteFetching.objects.bulk_create(
+        SatelliteFetching(
+            site=site,
+            timestamp=datetime(2023, 1, 1, 0, 0, number),
+            status=SatelliteFetching.Status.QUEUED,
+            priority=SatelliteFetching.Priority.MODEL_RUN,
+            parameters=PARAMETERS,
+            **fields,
+        )
+        for number, site in enumerate(sites)
+    )
+
+
+@pytest.mark.django_db
+def test_schedule_by_scene_batches(model_run: ModelRun, settings, monkeypatch) -> None:
+    settings.IMAGE_TASK_CONCURRENCY = 3
+    settings.IMAGE_TASK_INTERACTIVE_SLOTS = 1
+    settings.IMAGE_TASK_SCENE_BATCH_SIZE = 2
+    sites = create_sites(model_run, 5)
+    queue_sites(sites)
+    batches = []
+
+    def start(site_eval_ids, **parameters):
+        batches.append(site_eval_ids)
+        return f'task-{len(batches)}'
+
+    monkeypatch.setattr(tasks, 'start_model_run_images_by_scene', start)
+
+    tasks.schedule_site_images()
+
+    # Each batch of sites takes up one of the two slots left to model runs
+    assert batches == [[sites[0].pk, sites[1].pk], [sites[2].pk, sites[3].pk]]
+    assert SatelliteFetching.objects.get(site=sites[4]).status == (
+        SatelliteFetching.Status.QUEUED
+    )
+
+
+@pytest.mark.django_db
+def test_cancel_by_scene_site(
+    test_client: TestClient, model_run: ModelRun, monkeypatch
+) -> None:
+    sites = create_sites(model_run, 3)
+    queue_sites(sites, celery_id='scene-task')
+    SatelliteFetching.objects.update(status=SatelliteFetching.Status.RUNNING)
+    revoked = []
+    monkeypatch.setattr(site_observation, 'revoke_images_task', revoked.append)
+
+    res = test_client.put(f'/observations/{sites[0].pk}/cancel-generate-images/')
+
+    assert res.status_code == 202
+    assert revoked == ['scene-task']
+    cancelled = SatelliteFetching.objects.get(site=sites[0])
+    assert cancelled.status == SatelliteFetching.Status.COMPLETE
+    # The other sites of the task are started again
+    for site in sites[1:]:
+        fetching_task = SatelliteFetching.objects.get(site=site)
+        assert fetching_task.status == SatelliteFetching.Status.QUEUED
+        assert fetching_task.celery_id == ''
+        assert fetching_task.parameters == PARAMETERS
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from rdwatch.models import StacItem
+
+FEATURE = {
+    'id': 'S2A_MSIL2A_20200101',
+    'collection': 'ta1-s2-acc-3',
+    'bbox': [55.0, 24.0, 56.0, 25.0],
+    'properties': {
+        'datetime': '2020-01-01T06:30:00Z',
+        'eo:cloud_cover': 12.5,
+    },
+    'assets': {
+        'visual': {'href': 's3://bucket/visual.tif'},
+    },
+}
+
+
+def test_stac_item_from_feature() -> None:
+    item = StacItem.from_feature('S2', FEATURE)
+
+    assert item.stac_id == 'S2A_MSIL2A_20200101'
+    assert item.source == 'S2'
+    assert item.timestamp == datetime(2020, 1, 1, 6, 30)
+    assert item.cloudcover == 12.5
+    assert item.bits_per_pixel is None
+    assert item.footprint.extent == (55.0, 24.0, 56.0, 25.0)
+
+
+def test_stac_item_as_feature_round_trip() -> None:
+    feature = StacItem.from_feature('S2', FEATURE).as_feature()
+
+    assert feature == {
+        'id': FEATURE['id'],
+        'collection': FEATURE['collection'],
+        'bbox': FEATURE['bbox'],
+        'properties': FEATURE['properties'],
+        'assets': FEATURE['assets'],
+    }
@@ -0,0 +1,128 @@
+from datetime import datetime
+
+from rdwatch.utils import stac_search
+from rdwatch.utils.stac_search import (
+    _feature_matches,
+    _project_feature,
+    normalize_bbox,
+    normalize_time_range,
+    search_stac,
+)
+
+
+def test_normalize_bbox_snaps_outward() -> None:
+    assert normalize_bbox((55.13, 24.222, 55.901, 24.97)) == (
+        55.1,
+        24.2,
+        56.0,
+        25.0,
+    )
+    # Nearby bounding boxes share the same normalized search
+    assert normalize_bbox((55.11, 24.21, 55.12, 24.22)) == normalize_bbox(
+        (55.15, 24.25, 55.16, 24.26)
+    )
+
+
+def test_normalize_time_range_widens_to_days() -> None:
+    assert normalize_time_range(
+        datetime(2020, 1, 1, 12, 30), datetime(2020, 1, 3, 0, 0, 1)
+    ) == (datetime(2020, 1, 1), datetime(2020, 1, 4))
+    assert normalize_time_range(datetime(2020, 1, 1), datetime(2020, 1, 3)) == (
+        datetime(2020, 1, 1),
+        datetime(2020, 1, 3),
+    )
+
+
+def test_feature_matches() -> None:
+    feature = {
+        'properties': {'datetime': '2020-01-02T10:00:00Z'},
+        'bbox': [55.0, 24.0, 55.5, 24.5],
+    }
+    bbox = (55.4, 24.4, 55.6, 24.6)
+
+    assert _feature_matches(feature, bbox, datetime(2020, 1, 2), datetime(2020, 1, 3))
+    # Outside of the requested time range
+    assert not _feature_matches(
+        feature, bbox, datetime(2020, 1, 2, 11), datetime(2020, 1, 3)
+    )
+    # Outside of the requested area
+    assert not _feature_matches(
+        feature, (55.6, 24.6, 55.7, 24.7), datetime(2020, 1, 2), datetime(2020, 1, 3)
+    )
+
+
+def test_project_feature() -> None:
+    feature = {
+        'id': 'S2A_10SEG_20200102',
+        'collection': 'sentinel-s2-l2a-cogs',
+        'bbox': [55.0, 24.0, 55.5, 24.5],
+        'links': [{'rel': 'self', 'href': 'https://stac.example.com/item'}],
+        'properties': {
+            'datetime': '2020-01-02T10:00:00Z',
+            'eo:cloud_cover': 40,
+            'proj:epsg': 32640,
+        },
+        'assets': {
+            'B02': {
+                'href': 'https://cogs.example.com/B02.tif',
+                'eo:bands': [{'common_name': 'blue'}],
+                'proj:shape': [10980, 10980],
+            },
+        },
+    }
+
+    assert _project_feature(feature) == {
+        'id': 'S2A_10SEG_20200102',
+        'collection': 'sentinel-s2-l2a-cogs',
+        'bbox': [55.0, 24.0, 55.5, 24.5],
+        'properties': {'datetime': '2020-01-02T10:00:00Z', 'eo:cloud_cover': 40},
+        'assets': {
+            'B02': {
+                'href': 'https://cogs.example.com/B02.tif',
+                'eo:bands': [{'common_name': 'blue'}],
+            },
+        },
+    }
+
+
+class FakeClient:
+    def __init__(self, pages: list[dict], events: list[str]) -> None:
+        self.pages = pages
+        self.events = events
+
+    def conforms_to(self, conformance_class) -> bool:
+        return False
+
+    def search(self, **kwargs) -> 'FakeClient':
+        return self
+
+    def pages_as_dicts(self):
+        for page in self.pages:
+            self.events.append('page')
+            yield page
+
+
+def test_search_stac_budget(settings, monkeypatch) -> None:
+    settings.SMART_STAC_URL = 'https://stac.example.com'
+    pages = [
+        {'features': [{'id': 'a'}], 'links': [{'rel': 'next', 'href': 'page2'}]},
+        {'features': [{'id': 'b'}], 'links': []},
+    ]
+    events: list[str] = []
+    monkeypatch.setattr(stac_search, 'get_client', lambda: FakeClient(pages, events))
+    monkeypatch.setattr(stac_search, 'wait_for_host_budget', events.append)
+    collections = ['sentinel-s2-l2a-cogs']
+    bbox = (55.0, 24.0, 56.0, 25.0)
+    time_range = (datetime(2020, 1, 1), datetime(2020, 1, 2))
+
+    features = search_stac(collections, bbox, time_range)
+    assert [feature['id'] for feature in features] == ['a', 'b']
+    # Searches for map tiles never wait for the budget
+    assert events == ['page', 'page']
+
+    events.clear()
+    features = search_stac(collections, bbox, time_range, budget=True)
+    assert [feature['id'] for feature in features] == ['a', 'b']
+    # Every page is only requested once the budget allows it
+    url = 'https://stac.example.com'
+    assert events == [url, 'page', url, 'page']
@@ -0,0 +1,76 @@
+import os
+
+from rdwatch.utils import tile_cache
+from rdwatch.utils.tile_cache import (
+    get_or_render_tile,
+    get_tile_cache_stats,
+    get_tile_key,
+)
+
+
+def test_tile_key() -> None:
+    key = get_tile_key('raster', 's3://bucket/a.tif', 10, 1, 2, format='WEBP')
+    assert key == get_tile_key('raster', 's3://bucket/a.tif', 10, 1, 2, format='WEBP')
+    assert key != get_tile_key('raster', 's3://bucket/b.tif', 10, 1, 2, format='WEBP')
+    assert key != get_tile_key('raster', 's3://bucket/a.tif', 10, 2, 1, format='WEBP')
+    assert key != get_tile_key('raster', 's3://bucket/a.tif', 10, 1, 2, format='PNG')
+
+
+def test_get_or_render_tile(settings, tmp_path) -> None:
+    settings.TILE_CACHE_MEMORY_SIZE = 10
+    settings.TILE_CACHE_DIR = str(tmp_path)
+    settings.TILE_CACHE_DISK_SIZE = 1000
+    renders = []
+
+    def render(tile: bytes):
+        def render_tile() -> bytes:
+            renders.append(tile)
+            return tile
+
+        return render_tile
+
+    start = get_tile_cache_stats()
+    key_a = get_tile_key('raster', 'a.tif', 1, 0, 0)
+    key_b = get_tile_key('raster', 'b.tif', 1, 0, 0)
+    assert get_or_render_tile(key_a, render(b'aaaaaa')) == (b'aaaaaa', 'miss')
+    assert get_or_render_tile(key_a, render(b'aaaaaa')) == (b'aaaaaa', 'memory')
+    # Caching the second tile evicts the first from memory, but not from disk
+    assert get_or_render_tile(key_b, render(b'bbbbbb')) == (b'bbbbbb', 'miss')
+    assert get_or_render_tile(key_a, render(b'aaaaaa')) == (b'aaaaaa', 'disk')
+    assert renders == [b'aaaaaa', b'bbbbbb']
+
+    stats = get_tile_cache_stats()
+    assert stats['memory_hits'] - start['memory_hits'] == 1
+    assert stats['disk_hits'] - start['disk_hits'] == 1
+    assert stats['misses'] - start['misses'] == 2
+
+
+def _wait_for_trim() -> None:
+    if tile_cache._trim_thread is not None:
+        tile_cache._trim_thread.join()
+
+
+def test_tile_cache_disk_eviction(settings, tmp_path) -> None:
+    settings.TILE_CACHE_MEMORY_SIZE = 1
+    settings.TILE_CACHE_DIR = str(tmp_path)
+    settings.TILE_CACHE_DISK_SIZE = 250
+    # A tile being written by another process
+    in_flight = tmp_path / 'ab' / 'ab.0.tmp'
+    in_flight.parent.mkdir()
+    in_flight.write_bytes(b'x' * 100)
+
+    for i in range(5):
+        get_or_render_tile(
+            get_tile_key('raster', f'{i}.tif', 1, 0, 0), lambda: b'x' * 100
+        )
+        # The disk tier is trimmed in the background
+        _wait_for_trim()
+
+    assert in_flight.exists()
+    sizes = [
+        os.path.getsize(os.path.join(directory, name))
+        for directory, _, names in os.walk(tmp_path)
+        for name in names
+        if not name.endswith('.tmp')
+    ]
+    assert 0 < sum(sizes) <= 250
@@ -0,0 +1,57 @@
+import random
+from datetime import date, datetime, timedelta
+
+from rdwatch.utils.timestamps import TimestampIndex
+
+
+def is_inside_range_scan(timestamps, check_timestamp, days_range) -> bool:
+    return any(
+        abs((check_timestamp - timestamp).days) <= days_range
+        for timestamp in timestamps
+    )
+
+
+def test_is_inside_range_bounds() -> None:
+    found = TimestampIndex([datetime(2020, 1, 10)])
+
+    assert found.is_inside_range(datetime(2020, 1, 10), 0)
+    # Only whole days of difference count, rounding towards the past
+    assert found.is_inside_range(datetime(2020, 1, 10, 23), 0)
+    assert not found.is_inside_range(datetime(2020, 1, 9, 23), 0)
+    assert found.is_inside_range(datetime(2020, 1, 24, 23, 59), 14)
+    assert not found.is_inside_range(datetime(2020, 1, 25), 14)
+    assert found.is_inside_range(datetime(2019, 12, 27), 14)
+    assert not found.is_inside_range(datetime(2019, 12, 26, 23, 59), 14)
+    assert not TimestampIndex().is_inside_range(datetime(2020, 1, 10), 14)
+
+
+def test_is_inside_range_matches_scan() -> None:
+    rng = random.Random(0)
+    start = datetime(2020, 1, 1)
+    found = TimestampIndex()
+    timestamps = []
+    for _ in range(200):
+        timestamp = start + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        found.add(timestamp)
+        timestamps.append(timestamp)
+
+    for _ in range(1000):
+        check = start + timedelta(seconds=rng.randrange(-30, 395) * 24 * 3600)
+        check += timedelta(seconds=rng.randrange(24 * 3600))
+        for days_range in (0, 3, 14):
+            assert found.is_inside_range(check, days_range) == is_inside_range_scan(
+                timestamps, check, days_range
+            )
+
+
+def test_dates_and_membership() -> None:
+    found = TimestampIndex()
+    found.add(date(2020, 1, 10))
+    found.add(datetime(2020, 1, 1, 12))
+    found.add(datetime(2020, 1, 1, 12))
+
+    assert len(found) == 2
+    assert list(found) == [datetime(2020, 1, 1, 12), datetime(2020, 1, 10)]
+    assert datetime(2020, 1, 10) in found
+    assert datetime(2020, 1, 1) not in found
+    assert found.is_inside_range(date(2020, 1, 12), 2)
@@ -0,0 +1,143 @@
+import time
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from typing import Literal, TypeVar
+
+import mercantile
+
+from django.conf import settings
+from django.core.cache import cache
+
+from rdwatch.utils.satellite_bands import Band, get_bands
+from rdwatch.utils.stac_search import SEARCH_CACHE_MAX_FEATURES
+from rdwatch.utils.worldview_processed.satellite_captures import (
+    WorldViewProcessedCapture,
+    get_captures,
+)
+
+C = TypeVar('C', Band, WorldViewProcessedCapture)
+
+# Tiles are looked up by their parent tile at this zoom level, so all tiles
+# of a map view share the lookup
+LOOKUP_ZOOM = 8
+# Captures within this time of the requested timestamp match a tile, like
+# the default time buffer of `get_bands` / `get_captures`
+TILE_TIMEBUFFER = timedelta(hours=1)
+# Number of seconds a lookup waits for the same lookup running elsewhere
+# before searching for the captures of its own tile. Lookups are made while
+# serving tile requests, so they only wait briefly.
+LOOKUP_WAIT_TIMEOUT = 1
+# Number of seconds after which a lookup that never finished, e.g. because
+# its process died, stops blocking others from running it
+LOOKUP_LOCK_TIMEOUT = 30
+# Areas with more captures than this in a day aren't cached as a whole, like
+# the STAC searches that return too many features; their tiles are searched
+# for on their own instead
+LOOKUP_MAX_CAPTURES = SEARCH_CACHE_MAX_FEATURES
+
+
+def _get_lookup_key(source: str, day: datetime, parent: mercantile.Tile) -> str:
+    return '|'.join(
+        [
+            'capture-lookup',
+            source,
+            day.isoformat(),
+            str(parent.z),
+            str(parent.x),
+            str(parent.y),
+        ]
+    )
+
+
+def _intersects(
+    a: tuple[float, float, float, float], b: tuple[float, float, float, float]
+) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def _lookup_tile_captures(
+    source: str,
+    timestamp: datetime,
+    z: int,
+    x: int,
+    y: int,
+    search: Callable[[datetime, tuple[float, float, float, float], timedelta], list[C]],
+) -> list[C]:
+    """Find the captures of a tile through the lookup of its quantized area.
+
+    The captures are searched for once for the day of the timestamp and the
+    parent tile at `LOOKUP_ZOOM` of the tile, and cached. The tiles of a map
+    view then only filter that list down to the captures within
+    `TILE_TIMEBUFFER` of the timestamp whose bounding box overlaps them.
+    Concurrent lookups of the same area wait up to `LOOKUP_WAIT_TIMEOUT` for
+    the first one, instead of all searching the whole area at once. Areas
+    with more than `LOOKUP_MAX_CAPTURES` captures are only marked as such in
+    the cache, and each of their tiles is searched for by itself.
+    """
+    tile = mercantile.Tile(x, y, z)
+    parent = mercantile.parent(tile, zoom=LOOKUP_ZOOM) if z > LOOKUP_ZOOM else tile
+    day = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    key = _get_lookup_key(source, day, parent)
+
+    captures: list[C] | Literal[False] | None = cache.get(key)
+    if captures is None:
+        lock_key = f'{key}|lock'
+        if cache.add(lock_key, True, timeout=LOOKUP_LOCK_TIMEOUT):
+            try:
+                bounds = mercantile.bounds(parent)
+                # The day's window is widened by the time buffer so that it
+                # covers the buffer of every timestamp within the day
+                captures = search(
+                    day + timedelta(hours=12),
+                    (bounds.west, bounds.south, bounds.east, bounds.north),
+                    timedelta(hours=12) + TILE_TIMEBUFFER,
+                )
+                if len(captures) > LOOKUP_MAX_CAPTURES:
+                    captures = False
+                cache.set(key, captures, settings.STAC_SEARCH_CACHE_TIMEOUT)
+            finally:
+                cache.delete(lock_key)
+        else:
+            deadline = time.monotonic() + LOOKUP_WAIT_TIMEOUT
+            while captures is None and time.monotonic() < deadline:
+                time.sleep(0.1)
+                captures = cache.get(key)
+    if not isinstance(captures, list):
+        bounds = mercantile.bounds(tile)
+        captures = search(
+            timestamp,
+            (bounds.west, bounds.south, bounds.east, bounds.north),
+            TILE_TIMEBUFFER,
+        )
+
+    bounds = mercantile.bounds(tile)
+    bbox = (bounds.west, bounds.south, bounds.east, bounds.north)
+    return [
+        capture
+        for capture in captures
+        if abs(capture.timestamp - timestamp) <= TILE_TIMEBUFFER
+        and _intersects(capture.bbox, bbox)
+    ]
+
+
+def get_tile_bands(
+    constellation: str, timestamp: datetime, z: int, x: int, y: int
+) -> list[Band]:
+    """The bands of a constellation for a tile, like `get_bands`."""
+    return _lookup_tile_captures(
+        constellation,
+        timestamp,
+        z,
+        x,
+        y,
+        lambda timestamp, bbox, timebuffer: list(
+            get_bands(constellation, timestamp, bbox, timebuffer)
+        ),
+    )
+
+
+def get_tile_captures(
+    timestamp: datetime, z: int, x: int, y: int
+) -> list[WorldViewProcessedCapture]:
+    """The WorldView captures for a tile, like `get_captures`."""
+    return _lookup_tile_captures('WV', timestamp, z, x, y, get_captures)
@@ -0,0 +1,101 @@
+import time
+from collections.abc import Iterable
+from datetime import datetime
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Model
+
+from rdwatch.utils.timestamps import TimestampIndex
+
+
+class ChunkTimeExpired(Exception):
+    """Raised once an image task has used up the time of a chunk.
+
+    The checkpoint is saved beforehand, so the task can be queued again to
+    continue where it stopped.
+    """
+
+
+def _get_checkpoint_key(model: type[Model], site_id: Any, constellation: str) -> str:
+    return '|'.join(
+        ['image-checkpoint', model._meta.label_lower, str(site_id), constellation]
+    )
+
+
+class ImageCheckpoint:
+    """The progress of generating the images of a site for a constellation.
+
+    Records the observations and captures that are done, the timestamps of
+    the images found so far and the number of images downloaded, so a task
+    that was revoked or ran out of time resumes where it stopped instead of
+    starting over. A checkpoint only applies to a task with the same
+    parameters, and must only be saved once everything it records as done
+    has been written, e.g. right after the `SiteImageWriter` is flushed.
+    """
+
+    def __init__(
+        self,
+        model: type[Model],
+        site_id: Any,
+        constellation: str,
+        params: dict[str, Any],
+    ):
+        self.key = _get_checkpoint_key(model, site_id, constellation)
+        self.params = params
+        self.observations: set[str] = set()
+        self.captures: set[datetime] = set()
+        self.found_timestamps = TimestampIndex()
+        self.downloaded_count = 0
+        self.complete = False
+        self._started = time.monotonic()
+
+        data = cache.get(self.key)
+        if data is not None and data['params'] == params:
+            self.observations = data['observations']
+            self.captures = data['captures']
+            self.found_timestamps = TimestampIndex(data['found_timestamps'])
+            self.downloaded_count = data['downloaded_count']
+            self.complete = data['complete']
+
+    @property
+    def resumed(self) -> bool:
+        return bool(self.observations or self.captures or self.complete)
+
+    def chunk_expired(self) -> bool:
+        """Whether the task has run for longer than a chunk may."""
+        return time.monotonic() - self._started > settings.IMAGE_TASK_CHUNK_TIME
+
+    def save(self) -> None:
+        cache.set(
+            self.key,
+            {
+                'params': self.params,
+                'observations': self.observations,
+                'captures': self.captures,
+                'found_timestamps': list(self.found_timestamps),
+                'downloaded_count': self.downloaded_count,
+                'complete': self.complete,
+            },
+            settings.IMAGE_CHECKPOINT_TIMEOUT,
+        )
+
+    def finish(self) -> None:
+        """Record that all images are done, until the checkpoint is cleared."""
+        self.complete = True
+        self.save()
+
+    def clear(self) -> None:
+        cache.delete(self.key)
+
+
+def clear_image_checkpoints(
+    model: type[Model], site_id: Any, constellations: Iterable[str]
+) -> None:
+    cache.delete_many(
+        [
+            _get_checkpoint_key(model, site_id, constellation)
+            for constellation in constellations
+        ]
+    )
@@ -0,0 +1,99 @@
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import rasterio  # type: ignore
+from rasterio.io import DatasetReader  # type: ignore
+from rio_tiler.io.rasterio import Reader
+
+from django.conf import settings
+
+# The blocks read from open datasets are kept in GDAL's block cache, which is
+# shared by the whole process. Its size (in MB) is read from the environment
+# once, when GDAL first uses it, so it is set before any dataset is opened.
+os.environ.setdefault('GDAL_CACHEMAX', str(settings.RASTER_BLOCK_CACHE_SIZE))
+
+# Idle datasets by URI, least recently used first. A rasterio dataset must
+# only be used by one thread at a time, so datasets are checked out of the
+# cache while they are read from and returned to it afterwards.
+_lock = threading.Lock()
+_idle: OrderedDict[str, list[DatasetReader]] = OrderedDict()
+_idle_count = 0
+
+
+def _reset_after_fork() -> None:
+    # Open datasets hold HTTP connections that must not be shared with
+    # child processes, e.g. Celery's prefork pool
+    global _lock, _idle, _idle_count
+    _lock = threading.Lock()
+    _idle = OrderedDict()
+    _idle_count = 0
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _checkout(uri: str) -> DatasetReader | None:
+    global _idle_count
+    with _lock:
+        datasets = _idle.get(uri)
+        if not datasets:
+            return None
+        dataset = datasets.pop()
+        _idle_count -= 1
+        if not datasets:
+            del _idle[uri]
+        return dataset
+
+
+def _release(uri: str, dataset: DatasetReader) -> None:
+    global _idle_count
+    evicted = []
+    with _lock:
+        _idle.setdefault(uri, []).append(dataset)
+        _idle.move_to_end(uri)
+        _idle_count += 1
+        while _idle_count > settings.RASTER_DATASET_CACHE_SIZE:
+            lru_uri, datasets = next(iter(_idle.items()))
+            evicted.append(datasets.pop(0))
+            _idle_count -= 1
+            if not datasets:
+                del _idle[lru_uri]
+    for dataset in evicted:
+        dataset.close()
+
+
+@contextmanager
+def open_dataset(uri: str) -> Iterator[DatasetReader]:
+    """Open a raster dataset, reusing an idle one if possible.
+
+    Opening a COG fetches its header and IFDs, so reusing open datasets saves
+    those round-trips for later reads of the same capture. The cache is
+    shared by all threads of a process: the tile requests served by a web
+    process and the fetch threads of the image tasks run by a Celery worker
+    process, whose thread pools are short-lived, all reuse the same
+    datasets. At most `RASTER_DATASET_CACHE_SIZE` idle datasets are kept
+    open, and the blocks read from them are bounded by GDAL's block cache
+    (`RASTER_BLOCK_CACHE_SIZE`).
+
+    Must be used within the `rasterio.Env` the dataset is read in. A dataset
+    that fails to be read from is closed rather than returned to the cache.
+    """
+    dataset = _checkout(uri)
+    if dataset is None or dataset.closed:
+        dataset = rasterio.open(uri)
+    try:
+        yield dataset
+    except BaseException:
+        dataset.close()
+        raise
+    _release(uri, dataset)
+
+
+@contextmanager
+def cached_reader(uri: str) -> Iterator[Reader]:
+    """A rio-tiler `Reader` for a cached dataset (see `open_dataset`)."""
+    with open_dataset(uri) as dataset, Reader(input=uri, dataset=dataset) as cog:
+        yield cog
@@ -0,0 +1,40 @@
+import time
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _get_budget_key(host: str, window: int) -> str:
+    return '|'.join(['host-requests', host, str(window)])
+
+
+def get_host_budget(host: str) -> int:
+    """The number of requests per second that may be sent to a host."""
+    return settings.HOST_REQUEST_BUDGETS.get(host, settings.HOST_REQUEST_BUDGET)
+
+
+def wait_for_host_budget(url: str) -> None:
+    """Block until a request to the host of `url` fits in its budget.
+
+    The budget is shared by all processes through the cache: requests are
+    counted per host and second, and once a second's budget is used up the
+    request waits for the next one. A budget of 0 means no limit.
+
+    Only the requests of Celery tasks wait for the budget, the requests made
+    while serving web requests are never held back.
+    """
+    host = urlparse(url).netloc
+    budget = get_host_budget(host)
+    if not budget:
+        return
+    while True:
+        now = time.time()
+        window = int(now)
+        key = _get_budget_key(host, window)
+        # The counter outlives its second by a bit, so it can't expire
+        # between being added and incremented
+        cache.add(key, 0, timeout=5)
+        if cache.incr(key) <= budget:
+            return
+        time.sleep(window + 1 - now)
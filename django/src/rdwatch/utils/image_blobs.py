@@ -0,0 +1,185 @@
+import hashlib
+import json
+from collections.abc import Iterable, Sequence
+from datetime import datetime, timedelta
+from typing import Any, Literal
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from rdwatch.models import SiteImageBlob
+from rdwatch.utils.images import (
+    IMAGE_FORMAT_EXTENSIONS,
+    ImageFormat,
+    get_capture_images,
+)
+from rdwatch.utils.satellite_bands import Band
+from rdwatch.utils.worldview_processed.satellite_captures import (
+    WorldViewProcessedCapture,
+)
+
+# Unreferenced blobs younger than this may be about to be used by the task
+# that stored them, so they aren't deleted yet
+UNREFERENCED_BLOB_AGE = timedelta(days=1)
+
+
+def get_blob_key(
+    uri: str,
+    bbox: Sequence[float],
+    worldView: bool,
+    scale: Literal['default', 'bits'] | list[int],
+    image_format: ImageFormat,
+) -> str:
+    """The key of the image rendered from a capture with these parameters.
+
+    Identical chips, e.g. of overlapping sites of a model run, have the same
+    key so they are only fetched and stored once.
+    """
+    params = [uri, list(bbox), worldView, scale, image_format]
+    if image_format == 'webp':
+        params.append(settings.SITE_IMAGE_QUALITY)
+    return hashlib.sha256(json.dumps(params).encode()).hexdigest()
+
+
+def fetch_capture_chips(
+    capture: Band | WorldViewProcessedCapture,
+    bboxes: Sequence[tuple[float, float, float, float]],
+    worldView=False,
+    scale: Literal['default', 'bits'] | list[int] = 'default',
+    image_format: ImageFormat = 'png',
+) -> list[dict[str, Any]]:
+    """Like `get_capture_images`, but reusing the stored identical images.
+
+    Only the bounding boxes without a stored image are rendered, and each
+    distinct one only once. Each result has the `key` and dimensions of its
+    image and either the rendered `bytes` or the stored `blob`.
+    """
+    keys = [
+        get_blob_key(capture.uri, bbox, worldView, scale, image_format)
+        for bbox in bboxes
+    ]
+    blobs = get_blobs(keys)
+    bboxes_to_render = {
+        key: bbox for key, bbox in zip(keys, bboxes) if key not in blobs
+    }
+    rendered = {}
+    if bboxes_to_render:
+        images = get_capture_images(
+            capture, list(bboxes_to_render.values()), worldView, scale, image_format
+        )
+        rendered = dict(zip(bboxes_to_render, images))
+
+    results = []
+    for key in keys:
+        blob = blobs.get(key)
+        if blob is None:
+            results.append({**rendered[key], 'key': key, 'blob': None})
+        else:
+            results.append(
+                {
+                    'bytes': None,
+                    'percent_black': blob.percent_black,
+                    'image_dimensions': blob.image_dimensions,
+                    'key': key,
+                    'blob': blob,
+                }
+            )
+    return results
+
+
+def fetch_capture_chip(
+    capture: Band | WorldViewProcessedCapture,
+    bbox: tuple[float, float, float, float],
+    worldView=False,
+    scale: Literal['default', 'bits'] | list[int] = 'default',
+    image_format: ImageFormat = 'png',
+) -> dict[str, Any]:
+    """Like `fetch_capture_image`, but reusing a stored identical image."""
+    chip = fetch_capture_chips(capture, [bbox], worldView, scale, image_format)[0]
+    return {
+        **chip,
+        'cloudcover': capture.cloudcover,
+        'timestamp': capture.timestamp,
+        'uri': capture.uri,
+    }
+
+
+def get_blobs(keys: Iterable[str]) -> dict[str, SiteImageBlob]:
+    return {blob.key: blob for blob in SiteImageBlob.objects.filter(key__in=keys)}
+
+
+def upload_blob(
+    key: str,
+    content: bytes,
+    image_format: ImageFormat,
+    percent_black: float,
+    image_dimensions: list[int],
+) -> SiteImageBlob:
+    """Upload the file of a new blob, which still needs to be saved."""
+    extension = IMAGE_FORMAT_EXTENSIONS[image_format]
+    blob = SiteImageBlob(
+        key=key,
+        image_format=image_format,
+        percent_black=percent_black,
+        image_dimensions=image_dimensions,
+        created=datetime.now(),
+    )
+    # The file is uploaded straight from the encoded bytes, which the buffer
+    # of the ContentFile shares rather than copies
+    blob.image.save(f'chip_{key}.{extension}', ContentFile(content), save=False)
+    return blob
+
+
+def save_blobs(blobs: list[SiteImageBlob]) -> dict[str, SiteImageBlob]:
+    """Save uploaded blobs, returning the stored blob of each key.
+
+    Another task may have stored some of the same images in the meantime,
+    in which case theirs are kept and the files uploaded here are deleted.
+    """
+    SiteImageBlob.objects.bulk_create(blobs, ignore_conflicts=True)
+    stored = get_blobs([blob.key for blob in blobs])
+    for blob in blobs:
+        if stored[blob.key].image.name != blob.image.name:
+            blob.image.delete(save=False)
+    return stored
+
+
+def lock_blobs(blob_ids: Iterable[int]) -> set[int]:
+    """Lock blobs until the end of the transaction, returning the ids left.
+
+    Images about to refer to blobs lock them first, so the blobs can't be
+    released before the images are written (see `release_blobs`). Blobs
+    released since they were looked up are missing from the result.
+    """
+    return set(
+        SiteImageBlob.objects.select_for_update(no_key=True)
+        .filter(pk__in=set(blob_ids))
+        .values_list('pk', flat=True)
+    )
+
+
+def release_blobs(blob_ids: Iterable[int]) -> None:
+    """Delete the blobs no image refers to anymore, along with their files.
+
+    The blobs are locked before checking whether any image refers to them,
+    so an image that locked its blob (see `lock_blobs`) is always written
+    either before the check or after the blob is gone.
+    """
+    with transaction.atomic():
+        locked = list(
+            SiteImageBlob.objects.select_for_update()
+            .filter(pk__in=set(blob_ids))
+            .values_list('pk', flat=True)
+        )
+        SiteImageBlob.objects.filter(pk__in=locked, siteimage__isnull=True).delete()
+
+
+def delete_unreferenced_blobs() -> None:
+    """Release the blobs of images that were deleted along with their site."""
+    release_blobs(
+        SiteImageBlob.objects.filter(
+            siteimage__isnull=True,
+            created__lt=datetime.now() - UNREFERENCED_BLOB_AGE,
+        ).values_list('pk', flat=True)
+    )
@@ -0,0 +1,173 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any
+
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.urls import reverse
+
+from rdwatch.models import SiteImage, SiteImageStack
+from rdwatch.utils.image_blobs import release_blobs
+from rdwatch.utils.images import IMAGE_FORMAT_EXTENSIONS
+
+# Version of the manifest format, bumped whenever its frames change shape
+MANIFEST_VERSION = 1
+
+
+def get_frame_content_type(frame: dict[str, Any]) -> str:
+    return f'image/{IMAGE_FORMAT_EXTENSIONS[frame["image_format"]]}'
+
+
+def get_frame_url(site_id: Any, image_id: int) -> str:
+    """The API URL a stacked image is served from."""
+    # Imported here as the API imports the views, which import this module
+    from rdwatch.api import api
+
+    return reverse(
+        f'{api.urls_namespace}:site_image_stack_frame',
+        kwargs={'id': site_id, 'image_id': image_id},
+    )
+
+
+def _is_minio_storage(storage: Any) -> bool:
+    try:
+        from minio_storage.storage import MinioStorage
+    except ImportError:
+        # MinIO is only used in development, where it's installed
+        return False
+    return isinstance(storage, MinioStorage)
+
+
+def read_range(name: str, offset: int, length: int) -> bytes:
+    """Read `length` bytes at `offset` of a file in the default storage.
+
+    Reading a file of the S3 / MinIO storages downloads all of it, so the
+    range is requested from the object store directly instead.
+    """
+    if length == 0:
+        return b''
+    if _is_minio_storage(default_storage):
+        response = default_storage.client.get_object(
+            default_storage.bucket_name, name, offset=offset, length=length
+        )
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+    with default_storage.open(name, 'rb') as file:
+        if isinstance(default_storage, S3Boto3Storage):
+            # The file's S3 object is only downloaded once the file is read
+            response = file.obj.get(Range=f'bytes={offset}-{offset + length - 1}')
+            return response['Body'].read()
+        file.seek(offset)
+        return file.read(length)
+
+
+def read_frame(image_stack: SiteImageStack, frame: dict[str, Any]) -> bytes:
+    return read_range(image_stack.stack.name, frame['offset'], frame['length'])
+
+
+def write_site_image_stack(
+    site_id: Any, read_concurrency: int = 4
+) -> SiteImageStack | None:
+    """Pack all images of a site into its image stack.
+
+    The stack is a single file holding the encoded images of the site one
+    after another, ordered by timestamp, and a manifest recording where each
+    of them is. Images that are stored as files of their own are moved into
+    the stack, so a site ends up as one object in the storage rather than
+    one per image. Images already in a previous stack of the site are
+    carried over, and images that no longer exist are dropped.
+    """
+    site_images = list(
+        SiteImage.objects.filter(site_id=site_id).order_by('timestamp', 'pk')
+    )
+    previous = SiteImageStack.objects.filter(site_id=site_id).first()
+    previous_frames: dict[int, dict[str, Any]] = {}
+    previous_content = b''
+    if previous is not None:
+        previous_frames = {frame['id']: frame for frame in previous.manifest['frames']}
+        if any(
+            not site_image.image and site_image.pk in previous_frames
+            for site_image in site_images
+        ):
+            # A single read of the previous stack beats one per image
+            with previous.stack.open('rb') as file:
+                previous_content = file.read()
+
+    def read_image(site_image: SiteImage) -> bytes | None:
+        if site_image.image:
+            with site_image.image.open('rb') as file:
+                return file.read()
+        frame = previous_frames.get(site_image.pk)
+        if frame is None:
+            return None
+        return previous_content[frame['offset'] : frame['offset'] + frame['length']]
+
+    content = io.BytesIO()
+    frames: list[dict[str, Any]] = []
+    with ThreadPoolExecutor(max_workers=read_concurrency) as executor:
+        for site_image, image in zip(
+            site_images, executor.map(read_image, site_images)
+        ):
+            if image is None:
+                continue
+            frames.append(
+                {
+                    'id': site_image.pk,
+                    'timestamp': site_image.timestamp.isoformat(),
+                    'source': site_image.source,
+                    'observation_id': (
+                        str(site_image.observation_id)
+                        if site_image.observation_id
+                        else None
+                    ),
+                    'image_format': site_image.image_format,
+                    'image_dimensions': site_image.image_dimensions,
+                    'offset': content.tell(),
+                    'length': len(image),
+                }
+            )
+            content.write(image)
+
+    if not frames:
+        if previous is not None:
+            previous.delete()
+        return None
+
+    image_stack = previous or SiteImageStack(site_id=site_id)
+    previous_name = image_stack.stack.name if previous is not None else None
+    image_stack.manifest = {'version': MANIFEST_VERSION, 'frames': frames}
+    image_stack.timestamp = datetime.now()
+    image_stack.stack.save(
+        f'site_image_stack_{site_id}.bin', ContentFile(content.getvalue()), save=False
+    )
+    packed = [site_image for site_image in site_images if site_image.image]
+    with transaction.atomic():
+        image_stack.save()
+        SiteImage.objects.filter(
+            pk__in=[site_image.pk for site_image in packed]
+        ).update(image=None, blob=None)
+
+    # The images are only removed once nothing refers to them anymore, blobs
+    # may still be used by the images of other sites
+    release_blobs(site_image.blob_id for site_image in packed if site_image.blob_id)
+
+    def delete_image(site_image: SiteImage) -> None:
+        site_image.image.delete(save=False)
+
+    with ThreadPoolExecutor(max_workers=read_concurrency) as executor:
+        for _ in executor.map(
+            delete_image,
+            [site_image for site_image in packed if not site_image.blob_id],
+        ):
+            pass
+    # Storages that overwrite files reuse the name of the previous stack
+    if previous_name and previous_name != image_stack.stack.name:
+        default_storage.delete(previous_name)
+    return image_stack
@@ -1,15 +1,25 @@
-import io
 import logging
+from bisect import bisect_left, bisect_right
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import Executor, Future
 from datetime import datetime, timedelta
-from typing import Literal
+from typing import Literal, TypeVar
 from urllib.error import URLError
 
-from PIL import Image
+from rio_tiler.models import ImageData
 
-from rdwatch.utils.raster_tile import get_raster_bbox
-from rdwatch.utils.satellite_bands import get_bands
+from django.conf import settings
+from django.db import connections
+
+from rdwatch.utils.host_budget import wait_for_host_budget
+from rdwatch.utils.raster_tile import get_raster_bbox_images
+from rdwatch.utils.satellite_bands import Band, get_bands
 from rdwatch.utils.worldview_processed.raster_tile import (
-    get_worldview_processed_visual_bbox,
+    get_worldview_processed_visual_bbox_images,
+)
+from rdwatch.utils.worldview_processed.satellite_captures import (
+    WorldViewProcessedCapture,
 )
 from rdwatch.utils.worldview_processed.satellite_captures import (
     get_captures as get_worldview_captures,
@@ -17,6 +27,20 @@ from rdwatch.utils.worldview_processed.satellite_captures import (
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar('T')
+R = TypeVar('R')
+
+# Captures within this time of an observation are considered to match it
+ObservationTimeBuffer = timedelta(days=1)
+
+# Formats the generated site images can be stored in
+ImageFormat = Literal['png', 'webp', 'webp-lossless']
+IMAGE_FORMAT_EXTENSIONS: dict[str, str] = {
+    'png': 'png',
+    'webp': 'webp',
+    'webp-lossless': 'webp',
+}
+
 
 def scale_bbox(bbox: tuple[float, float, float, float], scale_factor: float):
     xmin, ymin, xmax, ymax = bbox
@@ -44,24 +68,65 @@ def get_max_bbox(
     return newbbox
 
 
-def get_percent_black_pixels(bytes: bytes):
-    img = Image.open(io.BytesIO(bytes))
-    # determine the size of the image
-    width, height = img.size
+def get_percent_black_pixels(img: ImageData) -> float:
+    """Percentage of the pixels in `img` that are black in every band."""
+    black_pixels = ~img.data[:3].any(axis=0)
+    return float(black_pixels.mean()) * 100
 
-    # get the pixel data of the image
-    pixels = img.load()
 
-    # count the number of black pixels in the image
-    num_black_pixels = 0
-    for x in range(width):
-        for y in range(height):
-            if pixels[x, y] == (0, 0, 0):
-                num_black_pixels += 1
+def encode_image(img: ImageData, image_format: ImageFormat = 'png') -> bytes:
+    """Encode a (rescaled) image in one of the site image formats."""
+    lossless = image_format.endswith('-lossless')
+    extension = IMAGE_FORMAT_EXTENSIONS[image_format]
+    if extension == 'png':
+        return img.render(img_format='PNG')
+    if lossless:
+        return img.render(img_format='WEBP', LOSSLESS='TRUE')
+    return img.render(img_format='WEBP', QUALITY=settings.SITE_IMAGE_QUALITY)
 
-    # calculate the percentage of black pixels in the image
-    percent_black_pixels = (num_black_pixels / (width * height)) * 100
-    return percent_black_pixels
+
+def render_image(img: ImageData, image_format: ImageFormat = 'png') -> dict:
+    """Encode an image along with the properties stored with it.
+
+    The dimensions and NoData coverage are taken from the array before it is
+    encoded, so the rendered image never has to be decoded again.
+    """
+    return {
+        'bytes': encode_image(img, image_format),
+        'percent_black': get_percent_black_pixels(img),
+        'image_dimensions': [img.width, img.height],
+    }
+
+
+def get_capture_images(
+    capture: Band | WorldViewProcessedCapture,
+    bboxes: Sequence[tuple[float, float, float, float]],
+    worldView=False,
+    scale: Literal['default', 'bits'] | list[int] = 'default',
+    image_format: ImageFormat = 'png',
+):
+    """Render several bounding boxes of one capture, reading it only once.
+
+    Only used by the image tasks, so the reads wait for the host budget.
+    """
+    wait_for_host_budget(capture.uri)
+    if isinstance(capture, WorldViewProcessedCapture) and capture.panuri:
+        wait_for_host_budget(capture.panuri)
+    if worldView:
+        imgs = get_worldview_processed_visual_bbox_images(capture, bboxes, scale)
+    else:
+        imgs = get_raster_bbox_images(capture.uri, bboxes, scale)
+    return [render_image(img, image_format) for img in imgs]
+
+
+def get_capture_image(
+    capture: Band | WorldViewProcessedCapture,
+    bbox: tuple[float, float, float, float],
+    worldView=False,
+    scale: Literal['default', 'bits'] | list[int] = 'default',
+    image_format: ImageFormat = 'png',
+):
+    return get_capture_images(capture, [bbox], worldView, scale, image_format)[0]
 
 
 def get_range_captures(
@@ -71,10 +136,24 @@ def get_range_captures(
     timebuffer: timedelta,
     worldView=False,
 ):
+    # Only image tasks search for captures this way, so areas that aren't in
+    # the local catalogue yet are harvested for the next search, and searches
+    # of the STAC server wait for its host budget
     if worldView:
-        captures = get_worldview_captures(timestamp, bbox, timebuffer)
+        captures = get_worldview_captures(
+            timestamp, bbox, timebuffer, harvest_on_miss=True, budget=True
+        )
     else:
-        captures = list(get_bands(constellation, timestamp, bbox, timebuffer))
+        captures = list(
+            get_bands(
+                constellation,
+                timestamp,
+                bbox,
+                timebuffer,
+                harvest_on_miss=True,
+                budget=True,
+            )
+        )
 
         # Filter bands by requested processing level and spectrum
         tempCaptures = []
@@ -86,33 +165,107 @@ def get_range_captures(
     return captures
 
 
+def get_closest_capture(
+    captures: Sequence[Band | WorldViewProcessedCapture],
+    timestamp: datetime,
+    timebuffer: timedelta = ObservationTimeBuffer,
+) -> Band | WorldViewProcessedCapture | None:
+    """Find the capture closest to `timestamp`, within `timebuffer` of it.
+
+    `captures` must be sorted by timestamp.
+    """
+    start = bisect_left(
+        captures, timestamp - timebuffer, key=lambda capture: capture.timestamp
+    )
+    end = bisect_right(
+        captures, timestamp + timebuffer, key=lambda capture: capture.timestamp
+    )
+    if start == end:
+        return None
+    return min(
+        captures[start:end], key=lambda capture: abs(capture.timestamp - timestamp)
+    )
+
+
+def fetch_capture_image(
+    capture: Band | WorldViewProcessedCapture,
+    bbox: tuple[float, float, float, float],
+    worldView=False,
+    scale: Literal['default', 'bits'] | list[int] = 'default',
+    image_format: ImageFormat = 'png',
+):
+    image = get_capture_image(capture, bbox, worldView, scale, image_format)
+    return {
+        **image,
+        'cloudcover': capture.cloudcover,
+        'timestamp': capture.timestamp,
+        'uri': capture.uri,
+    }
+
+
 def fetch_boundbox_image(
     bbox: tuple[float, float, float, float],
     timestamp: datetime,
     constellation: str,
     worldView=False,
     scale: Literal['default', 'bits'] | list[int] = 'default',
+    image_format: ImageFormat = 'png',
 ):
-    timebuffer = timedelta(days=1)
     try:
         captures = get_range_captures(
-            bbox, timestamp, constellation, timebuffer, worldView
+            bbox, timestamp, constellation, ObservationTimeBuffer, worldView
         )
     except URLError as e:
         logger.warning('Failed to get range capture because of URLError')
         logger.warning(e)
         return None
 
-    if len(captures) == 0:
+    captures.sort(key=lambda capture: capture.timestamp)
+    closest_capture = get_closest_capture(captures, timestamp)
+    if closest_capture is None:
         return None
-    closest_capture = min(captures, key=lambda band: abs(band.timestamp - timestamp))
-    if worldView:
-        bytes = get_worldview_processed_visual_bbox(closest_capture, bbox, 'PNG', scale)
-    else:
-        bytes = get_raster_bbox(closest_capture.uri, bbox, 'PNG', scale)
-    return {
-        'bytes': bytes,
-        'cloudcover': closest_capture.cloudcover,
-        'timestamp': closest_capture.timestamp,
-        'uri': closest_capture.uri,
-    }
+    return fetch_capture_image(closest_capture, bbox, worldView, scale, image_format)
+
+
+def _fetch_in_thread(fetch: Callable[[T], R], item: T) -> R:
+    try:
+        return fetch(item)
+    finally:
+        # Each worker thread gets its own database connection, make sure
+        # it doesn't outlive the fetch that opened it.
+        connections.close_all()
+
+
+def prefetch(
+    items: Iterable[T],
+    fetch: Callable[[T], R],
+    executor: Executor,
+    window: int,
+    prefilter: Callable[[T], bool] | None = None,
+) -> Iterator[tuple[T, Future[R] | None]]:
+    """Yield `items` in order, each paired with a future running `fetch` on it.
+
+    Up to `window` fetches are kept in flight ahead of the consumer, so the
+    network bound work for later items overlaps with whatever the consumer
+    does with the current one. Items rejected by `prefilter` at scheduling
+    time are paired with `None` instead of a future. `prefilter` may only
+    reject items that the consumer would reject as well, the consumer remains
+    responsible for the final decision and simply drops the futures of items
+    it skips.
+    """
+    pending: deque[tuple[T, Future[R] | None]] = deque()
+    iterator = iter(items)
+    try:
+        for item in iterator:
+            future = None
+            if prefilter is None or prefilter(item):
+                future = executor.submit(_fetch_in_thread, fetch, item)
+            pending.append((item, future))
+            if len(pending) >= window:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+    finally:
+        for _, future in pending:
+            if future is not None:
+                future.cancel()
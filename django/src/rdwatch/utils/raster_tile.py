@@ -1,8 +1,15 @@
 import logging
+from collections.abc import Sequence
 from typing import Literal
 
 import rasterio  # type: ignore
 from rio_tiler.io.rasterio import Reader
+from rio_tiler.models import ImageData
+
+from django.conf import settings
+from django.core.cache import cache
+
+from rdwatch.utils.dataset_cache import cached_reader
 
 logger = logging.getLogger(__name__)
 
@@ -13,55 +20,80 @@ def get_raster_tile(uri: str, z: int, x: int, y: int) -> bytes:
         if uri.startswith('https://sentinel-cogs.s3.us-west-2.amazonaws.com'):
             with rasterio.Env(AWS_NO_SIGN_REQUEST='YES'):
                 s3_uri = 's3://sentinel-cogs/' + uri[49:]
-                with Reader(input=s3_uri) as cog:
+                with cached_reader(s3_uri) as cog:
                     img = cog.tile(x, y, z, tilesize=512)
                     img.rescale(in_range=((0, 10000),))
                     return img.render(img_format='WEBP')
-        with Reader(input=uri) as cog:
+        with cached_reader(uri) as cog:
             img = cog.tile(x, y, z, tilesize=512)
             img.rescale(in_range=((0, 10000),))
             return img.render(img_format='WEBP')
 
 
+def get_percentile_range(cog: Reader, uri: str) -> tuple[float, float]:
+    """The 2nd and 98th percentiles of the first band of a COG.
+
+    These are computed from a decimated read (i.e. from the overviews) of the
+    whole asset, and cached by URI as they're the same for every chip read
+    from the asset.
+    """
+    cache_key = f'raster-percentiles|{uri}'
+    in_range: tuple[float, float] | None = cache.get(cache_key)
+    if in_range is None:
+        stats = cog.statistics()
+        low = 0
+        high = 10000
+        if 'b1' in stats.keys():
+            stats_json = stats['b1']
+            low = stats_json['percentile_2']
+            high = stats_json['percentile_98']
+        in_range = (float(low), float(high))
+        cache.set(cache_key, in_range, settings.RASTER_STATISTICS_CACHE_TIMEOUT)
+    return in_range
+
+
+def get_raster_bbox_images(
+    uri: str,
+    bboxes: Sequence[tuple[float, float, float, float]],
+    scale: Literal['default', 'bits'] | list[int] = 'default',
+) -> list[ImageData]:
+    """Read several bounding boxes from one COG, opening it only once."""
+    env_options = {}
+    if uri.startswith('https://sentinel-cogs.s3.us-west-2.amazonaws.com'):
+        env_options['AWS_NO_SIGN_REQUEST'] = 'YES'
+        uri = 's3://sentinel-cogs/' + uri[49:]
+    with rasterio.Env(GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR', **env_options):
+        with cached_reader(uri) as cog:
+            in_range: tuple[float, float] | None = None
+            if scale == 'default':
+                in_range = (0, 10000)
+            elif scale == 'bits':
+                in_range = get_percentile_range(cog, uri)
+            elif isinstance(scale, list) and len(scale) == 2:
+                in_range = (scale[0], scale[1])
+
+            images = []
+            for bbox in bboxes:
+                img = cog.part(bbox)
+                if in_range is not None:
+                    img.rescale(in_range=(in_range,))
+                images.append(img)
+            return images
+
+
+def get_raster_bbox_image(
+    uri: str,
+    bbox: tuple[float, float, float, float],
+    scale: Literal['default', 'bits'] | list[int] = 'default',
+) -> ImageData:
+    return get_raster_bbox_images(uri, [bbox], scale)[0]
+
+
 def get_raster_bbox(
     uri: str,
     bbox: tuple[float, float, float, float],
     format='PNG',
     scale: Literal['default', 'bits'] | list[int] = 'default',
 ) -> bytes:
-    with rasterio.Env(GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR'):
-        if uri.startswith('https://sentinel-cogs.s3.us-west-2.amazonaws.com'):
-            with rasterio.Env(AWS_NO_SIGN_REQUEST='YES'):
-                s3_uri = 's3://sentinel-cogs/' + uri[49:]
-                with Reader(input=s3_uri) as cog:
-                    img = cog.part(bbox)
-                    if scale == 'default':
-                        img.rescale(in_range=((0, 10000),))
-                    elif scale == 'bits':
-                        stats = cog.statistics()
-                        low = 0
-                        high = 10000
-                        if 'b1' in stats.keys():
-                            stats_json = stats['b1']
-                            low = stats_json['percentile_2']
-                            high = stats_json['percentile_98']
-                        img.rescale(in_range=((low, high),))
-                    elif isinstance(scale, list) and len(scale) == 2:
-                        img.rescale(in_range=((scale[0], scale[1]),))
-                    return img.render(img_format=format)
-        with Reader(input=uri) as cog:
-            img = cog.part(bbox)
-            if scale == 'default':
-                img.rescale(in_range=((0, 10000),))
-            elif scale == 'bits':
-                stats = cog.statistics()
-                low = 0
-                high = 10000
-                if 'b1' in stats.keys():
-                    stats_json = stats['b1']
-                    low = stats_json['percentile_2']
-                    high = stats_json['percentile_98']
-                img.rescale(in_range=((low, high),))
-            elif isinstance(scale, list) and len(scale) == 2:
-                img.rescale(in_range=((scale[0], scale[1]),))
-            return img.render(img_format=format)
+    img = get_raster_bbox_image(uri, bbox, scale)
+    return img.render(img_format=format)
@@ -1,11 +1,12 @@
 import logging
-from collections.abc import Iterator
+from collections.abc import Iterable, Iterator
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import cast
 
 from rdwatch.models.lookups import CommonBand, ProcessingLevel
-from rdwatch.utils.stac_search import stac_search
+from rdwatch.utils.stac_catalog import search_catalog
+from rdwatch.utils.stac_search import Feature, stac_search
 
 logger = logging.getLogger(__name__)
 
@@ -27,21 +28,26 @@ def get_bands(
     timestamp: datetime,
     bbox: tuple[float, float, float, float],
     timebuffer: timedelta | None = None,
+    harvest_on_miss: bool = False,
+    budget: bool = False,
 ) -> Iterator[Band]:
     if constellation != 'S2' and constellation != 'L8':
         raise ValueError(f'Unsupported constellation {constellation}')
 
-    results = stac_search(
-        constellation,
-        timestamp,
-        bbox,
-        timebuffer=timebuffer or timedelta(hours=1),
-    )
-    if 'features' not in results:
-        logger.warning("Malformed STAC response: no 'features'")
-        return
+    timebuffer = timebuffer or timedelta(hours=1)
 
-    for feature in results['features']:
+    # Prefer the local STAC catalogue, falling back to the STAC server if the
+    # search hasn't been harvested yet
+    items = search_catalog(constellation, timestamp, bbox, timebuffer, harvest_on_miss)
+    features: Iterable[Feature]
+    if items is not None:
+        features = (cast(Feature, item.as_feature()) for item in items.iterator())
+    else:
+        features = stac_search(
+            constellation, timestamp, bbox, timebuffer=timebuffer, budget=budget
+        )
+
+    for feature in features:
         if 'assets' not in feature:
             logger.warning("Malformed STAC response: no 'assets'")
             continue
@@ -63,7 +69,7 @@ def get_bands(
         cloudcover = 0
         match feature:
             case {'collection': 'landsat-c2l1' | 'sentinel-s2-l1c'}:
-                level, _ = ProcessingLevel.objects.get_or_create(
+                level, _ = ProcessingLevel.objects.get_or_create_cached(
                     slug='1C',
                     defaults={'description': 'top of atmosphere radiance'},
                 )
@@ -78,7 +84,7 @@ def get_bands(
                     or collection.startswith('ta1-s2-acc-')
                     or collection.startswith('ta1-ls-acc-')
                 ):
-                    level, _ = ProcessingLevel.objects.get_or_create(
+                    level, _ = ProcessingLevel.objects.get_or_create_cached(
                         slug='2A',
                         defaults={'description': 'surface reflectance'},
                     )
@@ -96,11 +102,11 @@ def get_bands(
 
         for name, asset in feature['assets'].items():
             if name == 'visual':
-                spectrum = CommonBand.objects.get(slug='visual')
+                spectrum = CommonBand.objects.get_cached('visual')
             else:
                 match asset:
                     case {'eo:bands': [{'common_name': common_name}]}:
-                        spectrum = CommonBand.objects.get(slug=common_name)
+                        spectrum = CommonBand.objects.get_cached(common_name)
                     case _:
                         continue
 
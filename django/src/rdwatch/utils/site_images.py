@@ -0,0 +1,209 @@
+import logging
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from rdwatch.models.site_image import BaseSiteImage, SiteImageBlob
+from rdwatch.utils.image_blobs import (
+    get_blobs,
+    lock_blobs,
+    release_blobs,
+    save_blobs,
+    upload_blob,
+)
+
+logger = logging.getLogger(__name__)
+
+# Fields of a SiteImage that are changed when its image is replaced
+UPDATE_FIELDS = [
+    'image',
+    'blob',
+    'image_format',
+    'cloudcover',
+    'percent_black',
+    'aws_location',
+    'image_bbox',
+    'image_dimensions',
+]
+
+
+class SiteImageWriter:
+    """Buffers the SiteImages generated for sites and writes them in bulk.
+
+    All existing SiteImages of the sites are loaded up front, so looking
+    them up doesn't need a query. Every `batch_size` images (and when
+    `flush` is called) the buffered images are stored and the rows are
+    written with `bulk_create` / `bulk_update`, after which `on_flush` is
+    called.
+
+    Images are stored as blobs (see `get_blob_key`), which are shared by all
+    identical images, so each distinct image is only uploaded once. An image
+    given without content reuses the stored blob of its key.
+    """
+
+    def __init__(
+        self,
+        model: type[BaseSiteImage],
+        sites: Iterable[Any],
+        source: str,
+        batch_size: int = 50,
+        upload_concurrency: int = 4,
+        on_flush: Callable[[], None] | None = None,
+    ):
+        self.model = model
+        self.batch_size = batch_size
+        self.upload_concurrency = upload_concurrency
+        self.on_flush = on_flush
+        self._site = model._meta.get_field('site').attname
+        self._observation = model._meta.get_field('observation').attname
+        self._by_observation: dict[tuple[Any, Any, datetime], BaseSiteImage] = {}
+        self._by_timestamp: dict[tuple[Any, datetime], BaseSiteImage] = {}
+        self._created: list[BaseSiteImage] = []
+        self._updated: dict[Any, BaseSiteImage] = {}
+        # Pending images by SiteImage, with their key and content
+        self._uploads: dict[int, tuple[BaseSiteImage, str, bytes | None]] = {}
+        # Blobs and files of replaced images, released once they are written
+        self._released_blobs: list[int] = []
+        self._replaced_files: list[str] = []
+
+        for site_image in model.objects.filter(
+            **{f'{self._site}__in': list(sites)}, source=source
+        ).order_by('pk'):
+            self._add(site_image)
+
+    def _add(self, site_image: BaseSiteImage) -> None:
+        site = getattr(site_image, self._site)
+        observation = getattr(site_image, self._observation)
+        self._by_observation.setdefault(
+            (site, observation, site_image.timestamp), site_image
+        )
+        self._by_timestamp.setdefault((site, site_image.timestamp), site_image)
+
+    def get_for_observation(
+        self, site: Any, observation: Any, timestamp: datetime
+    ) -> BaseSiteImage | None:
+        return self._by_observation.get((site, observation, timestamp))
+
+    def get_for_timestamp(self, site: Any, timestamp: datetime) -> BaseSiteImage | None:
+        return self._by_timestamp.get((site, timestamp))
+
+    def timestamps(self) -> list[tuple[Any, datetime]]:
+        """The site and timestamp of every image."""
+        return list(self._by_timestamp)
+
+    def create(self, key: str, content: bytes | None, **fields) -> BaseSiteImage:
+        site_image = self.model(**fields)
+        self._uploads[id(site_image)] = (site_image, key, content)
+        self._created.append(site_image)
+        self._add(site_image)
+        self._flush_if_full()
+        return site_image
+
+    def update(
+        self, site_image: BaseSiteImage, key: str, content: bytes | None, **fields
+    ) -> None:
+        # An image that hasn't been written yet has nothing to replace
+        if id(site_image) not in self._uploads and site_image.pk is not None:
+            if site_image.blob_id is not None:
+                self._released_blobs.append(site_image.blob_id)
+            elif site_image.image:
+                self._replaced_files.append(site_image.image.name)
+        for field, value in fields.items():
+            setattr(site_image, field, value)
+        self._uploads[id(site_image)] = (site_image, key, content)
+        if site_image.pk is not None:
+            self._updated[site_image.pk] = site_image
+        self._flush_if_full()
+
+    def _flush_if_full(self) -> None:
+        if len(self._uploads) >= self.batch_size:
+            self.flush()
+
+    def _store_blobs(
+        self,
+        pending: list[tuple[BaseSiteImage, str, bytes | None]],
+        blobs: dict[str, SiteImageBlob],
+    ) -> dict[str, SiteImageBlob]:
+        """Upload the images of the pending keys without a stored blob."""
+        new_blobs: dict[str, tuple[bytes, BaseSiteImage]] = {}
+        for site_image, key, content in pending:
+            if key not in blobs and content is not None:
+                new_blobs.setdefault(key, (content, site_image))
+
+        def upload(item: tuple[str, tuple[bytes, BaseSiteImage]]) -> SiteImageBlob:
+            key, (content, site_image) = item
+            return upload_blob(
+                key,
+                content,
+                site_image.image_format,
+                site_image.percent_black,
+                site_image.image_dimensions,
+            )
+
+        with ThreadPoolExecutor(max_workers=self.upload_concurrency) as executor:
+            uploaded = list(executor.map(upload, new_blobs.items()))
+        if not uploaded:
+            return {}
+        return save_blobs(uploaded)
+
+    def flush(self) -> None:
+        """Store the buffered images and write the buffered rows."""
+        pending = list(self._uploads.values())
+        self._uploads = {}
+        blobs = get_blobs({key for _, key, _ in pending})
+        blobs.update(self._store_blobs(pending, blobs))
+
+        with transaction.atomic():
+            # Blobs may have been released by another task since they were
+            # looked up. Those are stored again, and all of them are locked
+            # until the images referring to them are written.
+            while True:
+                locked = lock_blobs(blob.pk for blob in blobs.values())
+                released = [key for key, blob in blobs.items() if blob.pk not in locked]
+                if not released:
+                    break
+                for key in released:
+                    del blobs[key]
+                blobs.update(self._store_blobs(pending, blobs))
+
+            dropped: set[int] = set()
+            for site_image, key, _ in pending:
+                blob = blobs.get(key)
+                if blob is None:
+                    # Reused a released blob, without the content to store it
+                    # again. It's generated again by the next task instead.
+                    logger.warning(f'Dropping {site_image}, its image was deleted')
+                    dropped.add(id(site_image))
+                    continue
+                site_image.blob = blob
+                site_image.image = blob.image.name
+
+            created = [
+                site_image
+                for site_image in self._created
+                if id(site_image) not in dropped
+            ]
+            if created:
+                self.model.objects.bulk_create(created)
+            self._created = []
+            updated = [
+                site_image
+                for site_image in self._updated.values()
+                if id(site_image) not in dropped
+            ]
+            if updated:
+                self.model.objects.bulk_update(updated, UPDATE_FIELDS)
+            self._updated = {}
+
+        release_blobs(self._released_blobs)
+        self._released_blobs = []
+        with ThreadPoolExecutor(max_workers=self.upload_concurrency) as executor:
+            for _ in executor.map(default_storage.delete, self._replaced_files):
+                pass
+        self._replaced_files = []
+        if self.on_flush is not None:
+            self.on_flush()
@@ -0,0 +1,191 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Literal
+
+from django.conf import settings
+from django.contrib.gis.db.models import Union
+from django.contrib.gis.geos import Polygon
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import QuerySet
+
+from rdwatch.models import StacHarvest, StacItem
+from rdwatch.utils.stac_search import (
+    COLLECTIONS,
+    normalize_bbox,
+    normalize_time_range,
+    search_stac,
+)
+from rdwatch.utils.worldview_processed.stac_search import (
+    COLLECTIONS as WORLDVIEW_COLLECTIONS,
+)
+
+logger = logging.getLogger(__name__)
+
+Source = Literal['S2', 'L8', 'WV']
+
+# Number of seconds a pending harvest blocks identical harvests from
+# being scheduled
+HARVEST_LOCK_TIMEOUT = 60 * 30
+
+
+def _get_collections(source: Source) -> list[str]:
+    if source == 'WV':
+        return WORLDVIEW_COLLECTIONS
+    return COLLECTIONS[source]
+
+
+def _get_harvest_lock_key(
+    source: Source,
+    bbox: tuple[float, float, float, float],
+    time_range: tuple[datetime, datetime],
+) -> str:
+    return '|'.join(
+        [
+            'stac-harvest',
+            source,
+            ','.join(str(coord) for coord in bbox),
+            '/'.join(time.isoformat() for time in time_range),
+        ]
+    )
+
+
+def search_catalog(
+    source: Source,
+    timestamp: datetime,
+    bbox: tuple[float, float, float, float],
+    timebuffer: timedelta | None = None,
+    harvest_on_miss: bool = False,
+) -> QuerySet[StacItem] | None:
+    """Search the local STAC catalogue.
+
+    Returns None if the search is not covered by previous harvests, in which
+    case the caller should search the STAC server instead. Only image tasks
+    pass `harvest_on_miss` to schedule a harvest of the area then, so map
+    requests don't queue a harvest for every tile they miss.
+    """
+    if timebuffer is not None:
+        min_time = timestamp - timebuffer
+        max_time = timestamp + timebuffer
+    else:
+        min_time = max_time = timestamp
+
+    now = datetime.now()
+    area = Polygon.from_bbox(bbox)
+    area.srid = 4326
+    # Adjacent harvests of the time range together cover the area
+    harvested = StacHarvest.objects.filter(
+        source=source,
+        bbox__intersects=area,
+        start__lte=min_time,
+        end__gte=min(max_time, now),
+        timestamp__gte=now - timedelta(seconds=settings.STAC_CATALOG_MAX_AGE),
+    ).aggregate(area=Union('bbox'))['area']
+    if harvested is None or not harvested.contains(area):
+        if harvest_on_miss:
+            schedule_harvest(source, bbox, min_time, max_time)
+        return None
+
+    return StacItem.objects.filter(
+        source=source,
+        collection__in=_get_collections(source),
+        footprint__intersects=area,
+        timestamp__gte=min_time,
+        timestamp__lte=max_time,
+    ).order_by('timestamp')
+
+
+def schedule_harvest(
+    source: Source,
+    bbox: tuple[float, float, float, float],
+    min_time: datetime,
+    max_time: datetime,
+) -> None:
+    """Schedule a harvest of the area around a search, unless one is pending."""
+    from rdwatch.tasks import harvest_stac_items
+
+    harvest_bbox = normalize_bbox(bbox)
+    harvest_time_range = normalize_time_range(min_time, max_time)
+    lock_key = _get_harvest_lock_key(source, harvest_bbox, harvest_time_range)
+    if cache.add(lock_key, True, HARVEST_LOCK_TIMEOUT):
+        harvest_stac_items.delay(
+            source,
+            harvest_bbox,
+            *(time.isoformat() for time in harvest_time_range),
+        )
+
+
+def harvest(
+    source: Source,
+    bbox: tuple[float, float, float, float],
+    min_time: datetime,
+    max_time: datetime,
+) -> int:
+    """Copy the STAC items in an area and time range into the local catalogue.
+
+    Returns the number of items harvested.
+    """
+    harvested_at = datetime.now()
+    features = search_stac(
+        _get_collections(source), bbox, (min_time, max_time), budget=True
+    )
+
+    items: dict[tuple[str, str], StacItem] = {}
+    for feature in features:
+        try:
+            item = StacItem.from_feature(source, feature)
+        except KeyError:
+            logger.warning(f"Skipping malformed STAC item {feature.get('id')}")
+            continue
+        items[(item.collection, item.stac_id)] = item
+
+    if source == 'WV':
+        # find each vis-multi image's related panchromatic image
+        pan_uris: dict[datetime, str] = {}
+        for item in items.values():
+            if 'B01' in item.assets and item.image_representation == 'MONO':
+                pan_uris.setdefault(item.timestamp, item.assets['B01']['href'])
+        for item in items.values():
+            if 'visual' in item.assets:
+                item.pan_uri = pan_uris.get(item.timestamp, '')
+
+    with transaction.atomic():
+        StacItem.objects.bulk_create(
+            items.values(),
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['collection', 'stac_id'],
+            update_fields=[
+                'source',
+                'timestamp',
+                'footprint',
+                'bbox',
+                'cloudcover',
+                'bits_per_pixel',
+                'image_representation',
+                'assets',
+                'pan_uri',
+            ],
+        )
+        harvest_area = Polygon.from_bbox(bbox)
+        harvest_area.srid = 4326
+        StacHarvest.objects.create(
+            source=source,
+            bbox=harvest_area,
+            start=min_time,
+            end=min(max_time, harvested_at),
+            timestamp=harvested_at,
+        )
+
+    return len(items)
+
+
+def prune_harvests() -> int:
+    """Delete the harvests that are too old to answer searches anymore.
+
+    Returns the number of harvests deleted.
+    """
+    deleted, _ = StacHarvest.objects.filter(
+        timestamp__lt=datetime.now() - timedelta(seconds=settings.STAC_CATALOG_MAX_AGE)
+    ).delete()
+    return deleted
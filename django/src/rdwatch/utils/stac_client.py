@@ -0,0 +1,64 @@
+import os
+import threading
+
+from pystac_client import Client
+from pystac_client.stac_api_io import StacApiIO
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from django.conf import settings
+
+# Maximum number of keep-alive connections to each STAC server. Set to the
+# number of threads allowed by NGINX Unit in `applications.django.threads`
+# (in /docker/nginx.json), so concurrent requests don't discard connections.
+POOL_MAXSIZE = 25
+
+_clients: dict[str, Client] = {}
+_lock = threading.Lock()
+
+
+def _reset_after_fork() -> None:
+    # HTTP connections (and a lock that may have been held while forking)
+    # must not be shared with child processes, e.g. Celery's prefork pool.
+    global _lock
+    _clients.clear()
+    _lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _open_client(url: str) -> Client:
+    stac_io = StacApiIO(max_retries=None)
+    adapter = HTTPAdapter(
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=Retry(total=5, backoff_factor=0.5),
+    )
+    stac_io.session.mount('http://', adapter)
+    stac_io.session.mount('https://', adapter)
+    return Client.open(
+        url,
+        headers={'x-api-key': settings.SMART_STAC_KEY},
+        stac_io=stac_io,
+    )
+
+
+def get_client(url: str | None = None) -> Client:
+    """Get the shared STAC client for a STAC server.
+
+    Clients are opened once per process and reuse a keep-alive HTTP session
+    for every search, so the root catalog is only fetched once. They are
+    safe to share between threads.
+    """
+    if url is None:
+        # Use SMART program server instead of public server
+        # (https://earth-search.aws.element84.com/v0/search)
+        url = settings.SMART_STAC_URL
+
+    client = _clients.get(url)
+    if client is None:
+        with _lock:
+            client = _clients.get(url)
+            if client is None:
+                client = _clients[url] = _open_client(url)
+    return client
@@ -1,10 +1,18 @@
+import json
 import logging
+import math
+from collections.abc import Iterable, Iterator
 from datetime import datetime, timedelta
-from typing import Literal, TypedDict, cast
+from typing import Any, Literal, TypedDict, cast
 
-from pystac_client import Client
+from pystac_client.conformance import ConformanceClasses
 
 from django.conf import settings
+from django.contrib.gis.geos import GEOSGeometry, Polygon
+from django.core.cache import cache
+
+from rdwatch.utils.host_budget import wait_for_host_budget
+from rdwatch.utils.stac_client import get_client
 
 logger = logging.getLogger(__name__)
 
@@ -60,35 +68,216 @@ if settings.ACCENTURE_VERSION is not None:
     COLLECTIONS['L8'].append(f'ta1-ls-acc-{settings.ACCENTURE_VERSION}')
 
 
-def stac_search(
-    source: Literal['S2', 'L8'],
+# Size (in degrees) of the grid that search bounding boxes are snapped to
+# before they are sent to the STAC server. Searches for nearby or overlapping
+# areas (e.g. neighbouring map tiles) then share a single cached result.
+BBOX_GRID_SIZE = 0.1
+
+# The parts of each STAC item RD-WATCH uses. Catalogs that support the
+# fields extension only send these, which keeps responses small.
+SEARCH_FIELDS = [
+    'id',
+    'collection',
+    'bbox',
+    'geometry',
+    'assets',
+    'properties.datetime',
+    'properties.eo:cloud_cover',
+    'properties.nitf:bits_per_pixel',
+    'properties.nitf:image_representation',
+    '-links',
+]
+
+# The properties and asset fields of a feature that are cached
+CACHED_PROPERTIES = [
+    'datetime',
+    'eo:cloud_cover',
+    'nitf:bits_per_pixel',
+    'nitf:image_representation',
+]
+CACHED_ASSET_FIELDS = ['href', 'alternate', 'eo:bands']
+
+# Searches that return more features than this aren't cached, so a single
+# large search can't evict the rest of the cache
+SEARCH_CACHE_MAX_FEATURES = 500
+
+
+def normalize_bbox(
+    bbox: tuple[float, float, float, float]
+) -> tuple[float, float, float, float]:
+    def snap(value: float, rounding) -> float:
+        return round(rounding(value / BBOX_GRID_SIZE) * BBOX_GRID_SIZE, 6)
+
+    return (
+        snap(bbox[0], math.floor),
+        snap(bbox[1], math.floor),
+        snap(bbox[2], math.ceil),
+        snap(bbox[3], math.ceil),
+    )
+
+
+def normalize_time_range(
+    min_time: datetime, max_time: datetime
+) -> tuple[datetime, datetime]:
+    """Widen a time range to whole days."""
+    start = min_time.replace(hour=0, minute=0, second=0, microsecond=0)
+    end = max_time.replace(hour=0, minute=0, second=0, microsecond=0)
+    if end < max_time:
+        end += timedelta(days=1)
+    return start, end
+
+
+def _project_feature(feature: dict[str, Any]) -> dict[str, Any]:
+    """The parts of a feature RD-WATCH uses, which are all that is cached.
+
+    Catalogs without the fields extension send whole items, so this keeps
+    the cached searches small either way.
+    """
+    projected = {
+        key: feature[key]
+        for key in ('id', 'collection', 'bbox', 'geometry')
+        if key in feature
+    }
+    if 'properties' in feature:
+        projected['properties'] = {
+            key: feature['properties'][key]
+            for key in CACHED_PROPERTIES
+            if key in feature['properties']
+        }
+    if 'assets' in feature:
+        projected['assets'] = {
+            name: {key: asset[key] for key in CACHED_ASSET_FIELDS if key in asset}
+            for name, asset in feature['assets'].items()
+        }
+    return projected
+
+
+def _get_search_cache_key(
+    collections: list[str],
+    bbox: tuple[float, float, float, float],
+    time_range: tuple[datetime, datetime],
+) -> str:
+    return '|'.join(
+        [
+            'stac-search',
+            ','.join(sorted(collections)),
+            ','.join(str(coord) for coord in bbox),
+            '/'.join(_fmt_time(time) for time in time_range),
+        ]
+    )
+
+
+def _feature_matches(
+    feature: dict[str, Any],
+    bbox: tuple[float, float, float, float],
+    min_time: datetime,
+    max_time: datetime,
+) -> bool:
+    """Whether a feature from a normalized search matches the original one."""
+    match feature:
+        case {'properties': {'datetime': timestr}}:
+            timestamp = datetime.fromisoformat(timestr.rstrip('Z'))
+            if not min_time <= timestamp.replace(tzinfo=None) <= max_time:
+                return False
+    match feature:
+        case {'geometry': dict() as geometry}:
+            footprint = GEOSGeometry(json.dumps(geometry))
+        case {'bbox': [xmin, ymin, xmax, ymax]}:
+            footprint = Polygon.from_bbox((xmin, ymin, xmax, ymax))
+        case _:
+            return True
+    return footprint.intersects(Polygon.from_bbox(bbox))
+
+
+def search_stac(
+    collections: list[str],
+    bbox: tuple[float, float, float, float],
+    time_range: tuple[datetime, datetime],
+    budget: bool = False,
+) -> Iterator[dict[str, Any]]:
+    """Search the SMART STAC server directly, without any caching.
+
+    Features are yielded as each page of results is fetched. Where the
+    catalog supports the fields extension, only the parts of each item
+    that are needed are fetched. With `budget`, every page waits for the
+    STAC server's host budget first.
+    """
+    client = get_client()
+    extensions: dict[str, Any] = {}
+    if client.conforms_to(ConformanceClasses.FIELDS):
+        extensions['fields'] = SEARCH_FIELDS
+
+    results = client.search(
+        method='GET',
+        bbox=bbox,
+        datetime='/'.join(_fmt_time(time) for time in time_range),
+        collections=collections,
+        limit=100,
+        **extensions,
+    )
+    if budget:
+        wait_for_host_budget(settings.SMART_STAC_URL)
+    for page in results.pages_as_dicts():
+        if 'features' not in page:
+            logger.warning("Malformed STAC response: no 'features'")
+        else:
+            yield from page['features']
+        # The next page is only requested if this one links to it
+        if budget and any(link.get('rel') == 'next' for link in page.get('links', [])):
+            wait_for_host_budget(settings.SMART_STAC_URL)
+
+
+def search_features(
+    collections: list[str],
     timestamp: datetime,
     bbox: tuple[float, float, float, float],
     timebuffer: timedelta | None = None,
-) -> Results:
-    stac_catalog = Client.open(
-        # Use SMART program server instead of public server
-        # (https://earth-search.aws.element84.com/v0/search)
-        settings.SMART_STAC_URL,
-        headers={'x-api-key': settings.SMART_STAC_KEY},
-    )
+    budget: bool = False,
+) -> Iterator[dict[str, Any]]:
+    """Search the SMART STAC server, caching results in the default cache.
 
+    The bounding box and time range are widened to a coarse grid before the
+    search is run and cached, and the resulting features are then filtered
+    down to the ones that match the requested area and time range.
+
+    Features are streamed from the STAC server, and a search is only cached
+    once it has been read to the end.
+    """
     if timebuffer is not None:
         min_time = timestamp - timebuffer
         max_time = timestamp + timebuffer
-        time_str = f'{_fmt_time(min_time)}/{_fmt_time(max_time)}'
     else:
-        time_str = f'{_fmt_time(timestamp)}Z'
+        min_time = max_time = timestamp
 
-    results = stac_catalog.search(
-        method='GET',
-        bbox=bbox,
-        datetime=time_str,
-        collections=COLLECTIONS[source],
-        limit=100,
-    )
+    search_bbox = normalize_bbox(bbox)
+    search_time_range = normalize_time_range(min_time, max_time)
+    cache_key = _get_search_cache_key(collections, search_bbox, search_time_range)
+
+    cached: list[dict[str, Any]] | None = cache.get(cache_key)
+    if cached is not None:
+        features: Iterable[dict[str, Any]] = cached
+    else:
+        features = search_stac(collections, search_bbox, search_time_range, budget)
+
+    to_cache: list[dict[str, Any]] | None = None if cached is not None else []
+    for feature in features:
+        if to_cache is not None:
+            to_cache.append(_project_feature(feature))
+            if len(to_cache) > SEARCH_CACHE_MAX_FEATURES:
+                to_cache = None
+        if _feature_matches(feature, bbox, min_time, max_time):
+            yield feature
+
+    if to_cache is not None:
+        cache.set(cache_key, to_cache, settings.STAC_SEARCH_CACHE_TIMEOUT)
 
-    # TODO: return `results` directly instead of converting to a dict.
-    # Before that can happen, the callers need to be updated to handle
-    # an `ItemSearch` object.
-    return cast(Results, results.item_collection_as_dict())
+
+def stac_search(
+    source: Literal['S2', 'L8'],
+    timestamp: datetime,
+    bbox: tuple[float, float, float, float],
+    timebuffer: timedelta | None = None,
+    budget: bool = False,
+) -> Iterator[Feature]:
+    features = search_features(COLLECTIONS[source], timestamp, bbox, timebuffer, budget)
+    yield from cast(Iterator[Feature], features)
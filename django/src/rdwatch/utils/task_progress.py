@@ -0,0 +1,61 @@
+import time
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Number of `TASK_PROGRESS_INTERVAL`s the progress of a task is kept for
+# after its last update. Progress is cleared when a task ends or is revoked,
+# this only covers tasks whose worker died.
+PROGRESS_TIMEOUT_INTERVALS = 5
+
+
+def _get_progress_key(task_id: str) -> str:
+    return '|'.join(['task-progress', task_id])
+
+
+class TaskProgress:
+    """Publishes the progress of a Celery task to the cache.
+
+    `Task.update_state` writes to the result backend, which is the database,
+    so the image tasks publish their progress here instead and only their
+    final state ends up in the database. Updates are throttled to one every
+    `TASK_PROGRESS_INTERVAL` seconds, except for the first update of each
+    mode and the last step of a mode, which are always published.
+    """
+
+    def __init__(self, task_id: str | None):
+        # Tasks that are called directly rather than run by a worker
+        # have no id, and nothing to report progress to
+        self.task_id = task_id
+        self._mode: str | None = None
+        self._published_at = 0.0
+
+    def update(self, meta: dict[str, Any], force: bool = False) -> None:
+        if self.task_id is None:
+            return
+        now = time.monotonic()
+        if (
+            not force
+            and meta.get('mode') == self._mode
+            and meta.get('current') != meta.get('total')
+            and now - self._published_at < settings.TASK_PROGRESS_INTERVAL
+        ):
+            return
+        self._mode = meta.get('mode')
+        self._published_at = now
+        cache.set(
+            _get_progress_key(self.task_id),
+            meta,
+            settings.TASK_PROGRESS_INTERVAL * PROGRESS_TIMEOUT_INTERVALS,
+        )
+
+
+def get_task_progress(task_id: str) -> dict[str, Any] | None:
+    """The last progress published for a task, or None if it isn't running."""
+    return cache.get(_get_progress_key(task_id))
+
+
+def clear_task_progress(task_id: str | None) -> None:
+    if task_id is not None:
+        cache.delete(_get_progress_key(task_id))
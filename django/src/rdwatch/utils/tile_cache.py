@@ -0,0 +1,216 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from collections.abc import Callable
+from typing import Any, Literal
+from uuid import uuid4
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the tiles are rendered differently, so tiles cached before
+# aren't served anymore
+TILE_RENDER_VERSION = 1
+
+# The disk tier is trimmed down to this fraction of its size once it's full,
+# so it isn't scanned again on every write
+DISK_TRIM_RATIO = 0.9
+# Temporary files older than this (in seconds) are left over from a write
+# that never finished, rather than being written by another process
+STALE_TEMP_FILE_AGE = 60 * 60
+
+TileCacheOutcome = Literal['memory', 'disk', 'miss']
+
+_lock = threading.Lock()
+_memory: OrderedDict[str, bytes] = OrderedDict()
+_memory_size = 0
+# Size of the disk tier as of the last scan, plus what was written since
+_disk_size: int | None = None
+# The thread scanning and trimming the disk tier, if any
+_trim_thread: threading.Thread | None = None
+_stats: Counter[str] = Counter()
+
+
+def _reset_after_fork() -> None:
+    # Each process counts its own hits, and a forked lock may be held
+    global _lock, _memory, _memory_size, _disk_size, _trim_thread, _stats
+    _lock = threading.Lock()
+    _memory = OrderedDict()
+    _memory_size = 0
+    _disk_size = None
+    _trim_thread = None
+    _stats = Counter()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_tile_key(
+    source: str, capture_id: str, z: int, x: int, y: int, **params: Any
+) -> str:
+    """The key of a tile rendered from a capture with these parameters."""
+    return hashlib.sha256(
+        json.dumps(
+            [TILE_RENDER_VERSION, source, capture_id, z, x, y, params],
+            sort_keys=True,
+        ).encode()
+    ).hexdigest()
+
+
+def get_tile_cache_stats() -> dict[str, int]:
+    """Hits of each tier and misses of the tile cache in this process."""
+    with _lock:
+        return {
+            'memory_hits': _stats['memory'],
+            'disk_hits': _stats['disk'],
+            'misses': _stats['miss'],
+            'memory_size': _memory_size,
+        }
+
+
+def _get_memory(key: str) -> bytes | None:
+    with _lock:
+        tile = _memory.get(key)
+        if tile is not None:
+            _memory.move_to_end(key)
+        return tile
+
+
+def _put_memory(key: str, tile: bytes) -> None:
+    global _memory_size
+    if len(tile) > settings.TILE_CACHE_MEMORY_SIZE:
+        return
+    with _lock:
+        previous = _memory.pop(key, None)
+        if previous is not None:
+            _memory_size -= len(previous)
+        _memory[key] = tile
+        _memory_size += len(tile)
+        while _memory_size > settings.TILE_CACHE_MEMORY_SIZE:
+            _, evicted = _memory.popitem(last=False)
+            _memory_size -= len(evicted)
+
+
+def _get_disk_path(key: str) -> str:
+    return os.path.join(settings.TILE_CACHE_DIR, key[:2], key)
+
+
+def _get_disk(key: str) -> bytes | None:
+    if not settings.TILE_CACHE_DIR:
+        return None
+    path = _get_disk_path(key)
+    try:
+        with open(path, 'rb') as file:
+            tile = file.read()
+        # The modification time orders the tiles for eviction
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return tile
+
+
+def _trim_disk() -> None:
+    """Delete the least recently used tiles until the disk tier fits."""
+    global _disk_size
+    files = []
+    now = time.time()
+    for directory, _, names in os.walk(settings.TILE_CACHE_DIR):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+                # Tiles being written by other processes aren't counted
+                if name.endswith('.tmp'):
+                    if now - stat.st_mtime > STALE_TEMP_FILE_AGE:
+                        os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+    size = sum(file_size for _, file_size, _ in files)
+    limit = settings.TILE_CACHE_DISK_SIZE * DISK_TRIM_RATIO
+    if size > settings.TILE_CACHE_DISK_SIZE:
+        files.sort()
+        for _, file_size, path in files:
+            if size <= limit:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= file_size
+    with _lock:
+        _disk_size = size
+
+
+def _start_trim_disk() -> None:
+    """Trim the disk tier in the background, unless that's already running.
+
+    Scanning the directory takes a while once it holds many tiles, so it is
+    never done on the thread serving the request.
+    """
+    global _trim_thread
+    with _lock:
+        if _trim_thread is not None and _trim_thread.is_alive():
+            return
+        _trim_thread = threading.Thread(
+            target=_trim_disk, name='tile-cache-trim', daemon=True
+        )
+        _trim_thread.start()
+
+
+def _put_disk(key: str, tile: bytes) -> None:
+    global _disk_size
+    if not settings.TILE_CACHE_DIR:
+        return
+    path = _get_disk_path(key)
+    # Other processes share the directory, so the tile only appears under its
+    # name once it's complete
+    temp_path = f'{path}.{uuid4().hex}.tmp'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, 'wb') as file:
+            file.write(tile)
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.warning(f'Failed to write tile to the cache: {e}')
+        return
+    with _lock:
+        if _disk_size is not None:
+            _disk_size += len(tile)
+        full = _disk_size is None or _disk_size > settings.TILE_CACHE_DISK_SIZE
+    if full:
+        _start_trim_disk()
+
+
+def get_or_render_tile(
+    key: str, render: Callable[[], bytes]
+) -> tuple[bytes, TileCacheOutcome]:
+    """Get a tile from the cache, rendering and caching it if it isn't.
+
+    Tiles are kept in a bounded in-process LRU in front of a directory shared
+    by the processes of a host, which is trimmed by the least recently used
+    tiles once it grows over `TILE_CACHE_DISK_SIZE`. Returns the tile along
+    with the tier it was found in, or 'miss' if it was rendered.
+    """
+    outcome: TileCacheOutcome
+    tile = _get_memory(key)
+    if tile is not None:
+        outcome = 'memory'
+    else:
+        tile = _get_disk(key)
+        if tile is not None:
+            outcome = 'disk'
+        else:
+            outcome = 'miss'
+            tile = render()
+            _put_disk(key, tile)
+        _put_memory(key, tile)
+    with _lock:
+        _stats[outcome] += 1
+    return tile, outcome
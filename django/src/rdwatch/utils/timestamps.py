@@ -0,0 +1,58 @@
+from bisect import bisect_right, insort
+from collections.abc import Iterable, Iterator
+from datetime import date, datetime, time, timedelta
+
+
+def _as_datetime(timestamp: date) -> datetime:
+    # Observation dates of the scoring database are plain dates
+    if isinstance(timestamp, datetime):
+        return timestamp
+    return datetime.combine(timestamp, time())
+
+
+class TimestampIndex:
+    """A sorted set of the timestamps images have been found for.
+
+    Used to skip captures that are within a number of days of an image that
+    was already found, with a binary search for the closest timestamps
+    instead of a scan of all of them.
+    """
+
+    def __init__(self, timestamps: Iterable[date] = ()):
+        self._timestamps: list[datetime] = sorted(
+            {_as_datetime(timestamp) for timestamp in timestamps}
+        )
+        self._members = set(self._timestamps)
+
+    def __contains__(self, timestamp: date) -> bool:
+        return _as_datetime(timestamp) in self._members
+
+    def __iter__(self) -> Iterator[datetime]:
+        return iter(self._timestamps)
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    def add(self, timestamp: date) -> None:
+        timestamp = _as_datetime(timestamp)
+        if timestamp not in self._members:
+            self._members.add(timestamp)
+            insort(self._timestamps, timestamp)
+
+    def is_inside_range(self, check_timestamp: date, days_range: int) -> bool:
+        """Whether a timestamp is within `days_range` days of this set.
+
+        A timestamp counts as within range if `(check_timestamp - timestamp)`
+        is between `-days_range` and `days_range` whole days, i.e. it lies
+        in `(check_timestamp - (days_range + 1) days,
+        check_timestamp + days_range days]`.
+        """
+        check_timestamp = _as_datetime(check_timestamp)
+        # The first timestamp after the start of the range is the only one
+        # that needs to be checked against its end
+        index = bisect_right(
+            self._timestamps, check_timestamp - timedelta(days=days_range + 1)
+        )
+        return index < len(self._timestamps) and self._timestamps[
+            index
+        ] <= check_timestamp + timedelta(days=days_range)
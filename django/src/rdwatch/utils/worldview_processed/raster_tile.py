@@ -1,104 +1,184 @@
 import logging
-import time
-from typing import Literal
+import os
+from collections.abc import Callable, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+from typing import Literal, TypeVar
 
 import rasterio  # type: ignore
+from rasterio import windows  # type: ignore
+from rasterio.io import DatasetReader  # type: ignore
+from rio_tiler.constants import WGS84_CRS
 from rio_tiler.io.rasterio import Reader
-from rio_tiler.utils import pansharpening_brovey
+from rio_tiler.models import ImageData
+from rio_tiler.utils import get_vrt_transform, pansharpening_brovey
 
+from rdwatch.utils.dataset_cache import cached_reader
 from rdwatch.utils.worldview_processed.satellite_captures import (
     WorldViewProcessedCapture,
 )
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar('T')
+
+ENV_OPTIONS = {
+    'GDAL_DISABLE_READDIR_ON_OPEN': 'EMPTY_DIR',
+    'GDAL_HTTP_MERGE_CONSECUTIVE_RANGES': 'YES',
+    'CPL_VSIL_CURL_CACHE_SIZE': 20000000,
+    'GDAL_BAND_BLOCK_CACHE': 'HASHSET',
+    'GDAL_HTTP_MULTIPLEX': 'YES',
+    'GDAL_HTTP_VERSION': 2,
+    'VSI_CACHE': 'TRUE',
+    'VSI_CACHE_SIZE': 5000000,
+}
+
+# Number of panchromatic reads that run alongside the RGB reads of the
+# calling threads
+PAN_READ_CONCURRENCY = 8
+
+_pan_executor = ThreadPoolExecutor(max_workers=PAN_READ_CONCURRENCY)
+
+
+def _reset_after_fork() -> None:
+    # The threads of the executor don't exist in child processes
+    global _pan_executor
+    _pan_executor = ThreadPoolExecutor(max_workers=PAN_READ_CONCURRENCY)
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _read_pan(panuri: str, read: Callable[[Reader], T]) -> T:
+    # GDAL configuration is per thread, so the options are set again here
+    with rasterio.Env(**ENV_OPTIONS), cached_reader(panuri) as img:
+        return read(img)
+
+
+def read_pan(panuri: str, read: Callable[[Reader], T]) -> Future[T]:
+    """Read from the panchromatic asset of a capture in the background.
+
+    The panchromatic and RGB assets are separate objects, so reading them
+    concurrently halves the time spent waiting for the network before
+    pansharpening.
+    """
+    return _pan_executor.submit(_read_pan, panuri, read)
+
+
+def _cancel(futures: list[Future]) -> None:
+    for future in futures:
+        future.cancel()
+
+
+def get_part_size(
+    dataset: DatasetReader, bbox: tuple[float, float, float, float]
+) -> tuple[int, int]:
+    """The (width, height) `Reader.part` reads a WGS84 bbox of a dataset at.
+
+    This only depends on the dataset's metadata, so the size can be known
+    before the part is read.
+    """
+    if dataset.crs != WGS84_CRS:
+        _, width, height = get_vrt_transform(dataset, bbox, dst_crs=WGS84_CRS)
+        return width, height
+    window = windows.from_bounds(*bbox, transform=dataset.transform)
+    return round(window.width), round(window.height)
+
 
 def get_worldview_processed_visual_tile(
     capture: WorldViewProcessedCapture, z: int, x: int, y: int
 ) -> bytes:
-    with rasterio.Env(
-        GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR',
-        GDAL_HTTP_MERGE_CONSECUTIVE_RANGES='YES',
-        GDAL_CACHEMAX=200,
-        CPL_VSIL_CURL_CACHE_SIZE=20000000,
-        GDAL_BAND_BLOCK_CACHE='HASHSET',
-        GDAL_HTTP_MULTIPLEX='YES',
-        GDAL_HTTP_VERSION=2,
-        VSI_CACHE='TRUE',
-        VSI_CACHE_SIZE=5000000,
-    ):
+    with rasterio.Env(**ENV_OPTIONS):
         if not capture.panuri:
-            with Reader(input=capture.uri) as img:
+            with cached_reader(capture.uri) as img:
                 rgb = img.tile(x, y, z, tilesize=512)
         if capture.panuri:
-            logger.warning(f'PAN URI: {capture.panuri}')
-            with Reader(input=capture.panuri) as img:
-                pan = img.tile(
-                    x,
-                    y,
-                    z,
-                    tilesize=512,
-                )
-                with Reader(input=capture.uri) as rgbimg:
-                    rgb = rgbimg.tile(x, y, z, tilesize=512)
-                    rgb = rgb.from_array(
-                        pansharpening_brovey(rgb.data, pan.data, 0.2, 'uint16')
-                    )
+            logger.debug(f'PAN URI: {capture.panuri}')
+            pending_pan = read_pan(
+                capture.panuri, lambda img: img.tile(x, y, z, tilesize=512)
+            )
+            with cached_reader(capture.uri) as rgbimg:
+                rgb = rgbimg.tile(x, y, z, tilesize=512)
+            pan = pending_pan.result()
+            rgb = rgb.from_array(
+                pansharpening_brovey(rgb.data, pan.data, 0.2, 'uint16')
+            )
             rgb.rescale(in_range=((0, 10000),))
         return rgb.render(img_format='WEBP')
 
 
 def get_cog_image(uri, bbox):
-    with Reader(input=uri) as img:
+    with cached_reader(uri) as img:
         return img.part(bbox)
 
 
+def get_worldview_processed_visual_bbox_images(
+    capture: WorldViewProcessedCapture,
+    bboxes: Sequence[tuple[float, float, float, float]],
+    scale: Literal['default', 'bits'] = 'default',
+) -> list[ImageData]:
+    """Read several bounding boxes from one capture, opening it only once."""
+    with rasterio.Env(**ENV_OPTIONS), ExitStack() as stack:
+        logger.debug(f'Image URI: {capture.uri}')
+        pending_sizes: Future[list[tuple[int, int]]] | None = None
+        pending_pans: list[Future[ImageData]] = []
+        if capture.panuri:
+            logger.debug(f'Pan URI: {capture.panuri}')
+            # The RGB parts are resampled to the size of the panchromatic
+            # parts. Those sizes only need the panchromatic asset's metadata,
+            # so they are known before the parts are read in the background.
+            pending_sizes = read_pan(
+                capture.panuri,
+                lambda img: [get_part_size(img.dataset, bbox) for bbox in bboxes],
+            )
+            pending_pans = [
+                read_pan(capture.panuri, partial(Reader.part, bbox=bbox))
+                for bbox in bboxes
+            ]
+            # Reads that haven't started are dropped if reading fails here
+            stack.callback(_cancel, [pending_sizes, *pending_pans])
+        rgbimg = stack.enter_context(cached_reader(capture.uri))
+
+        images = []
+        for index, bbox in enumerate(bboxes):
+            if pending_sizes is None:
+                rgb = rgbimg.part(bbox)
+            else:
+                width, height = pending_sizes.result()[index]
+                rgb = rgbimg.part(bbox, width=width, height=height)
+                pan = pending_pans[index].result()
+                rgb = rgb.from_array(
+                    pansharpening_brovey(rgb.data, pan.data, 0.2, 'uint16')
+                )
+
+            if scale == 'default':
+                rgb.rescale(in_range=((0, 10000),))
+            elif scale == 'bits':
+                if capture.bits_per_pixel != 8:
+                    max_bits = 2**capture.bits_per_pixel - 1
+                    rgb.rescale(in_range=((0, max_bits),))
+            elif isinstance(scale, list) and len(scale) == 2:
+                # scale is an integeter range
+                rgb.rescale(in_range=((scale[0], scale[1]),))
+            images.append(rgb)
+
+        return images
+
+
+def get_worldview_processed_visual_bbox_image(
+    capture: WorldViewProcessedCapture,
+    bbox: tuple[float, float, float, float],
+    scale: Literal['default', 'bits'] = 'default',
+) -> ImageData:
+    return get_worldview_processed_visual_bbox_images(capture, [bbox], scale)[0]
+
+
 def get_worldview_processed_visual_bbox(
     capture: WorldViewProcessedCapture,
     bbox: tuple[float, float, float, float],
     format='PNG',
     scale: Literal['default', 'bits'] = 'default',
 ) -> bytes:
-    with rasterio.Env(
-        GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR',
-        GDAL_HTTP_MERGE_CONSECUTIVE_RANGES='YES',
-        GDAL_CACHEMAX=200,
-        CPL_VSIL_CURL_CACHE_SIZE=20000000,
-        GDAL_BAND_BLOCK_CACHE='HASHSET',
-        GDAL_HTTP_MULTIPLEX='YES',
-        GDAL_HTTP_VERSION=2,
-        VSI_CACHE='TRUE',
-        VSI_CACHE_SIZE=5000000,
-    ):
-        startTime = time.time()
-        if not capture.panuri:
-            with Reader(input=capture.uri) as img:
-                logger.warning(f'Image URI: {capture.uri}')
-                logger.warning(f'Base Info Time: {time.time() - startTime}')
-                rgb = img.part(bbox)
-                logger.warning(f'RGB Download Time: {time.time() - startTime}')
-
-        if capture.panuri:
-            logger.warning(f'Pan URI: {capture.panuri}')
-            with Reader(input=capture.panuri) as img:
-                pan = img.part(bbox)
-                logger.warning(f'Pan Download Time: {time.time() - startTime}')
-                with Reader(input=capture.uri) as rgbimg:
-                    rgb = rgbimg.part(bbox, width=pan.width, height=pan.height)
-                    logger.warning(f'RGB Download Time: {time.time() - startTime}')
-                    logger.warning(f'PanSharpening: {capture.panuri}')
-                    rgb = rgb.from_array(
-                        pansharpening_brovey(rgb.data, pan.data, 0.2, 'uint16')
-                    )
-                    logger.warning(f'Pan Sharpening Time: {time.time() - startTime}')
-
-        if scale == 'default':
-            rgb.rescale(in_range=((0, 10000),))
-        elif scale == 'bits':
-            if capture.bits_per_pixel != 8:
-                max_bits = 2**capture.bits_per_pixel - 1
-                rgb.rescale(in_range=((0, max_bits),))
-        elif isinstance(scale, list) and len(scale) == 2:  # scale is an integeter range
-            rgb.rescale(in_range=((scale[0], scale[1]),))
-
-        return rgb.render(img_format=format)
+    rgb = get_worldview_processed_visual_bbox_image(capture, bbox, scale)
+    return rgb.render(img_format=format)
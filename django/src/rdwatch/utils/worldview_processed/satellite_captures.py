@@ -2,6 +2,7 @@ from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import cast
 
+from rdwatch.utils.stac_catalog import search_catalog
 from rdwatch.utils.worldview_processed.stac_search import worldview_search
 
 
@@ -20,32 +21,51 @@ def get_features(
     timestamp: datetime,
     bbox: tuple[float, float, float, float],
     timebuffer: timedelta,
+    budget: bool = False,
 ):
-    results = worldview_search(timestamp, bbox, timebuffer=timebuffer)
-    yield from results['features']
+    yield from worldview_search(timestamp, bbox, timebuffer=timebuffer, budget=budget)
 
 
 def get_captures(
     timestamp: datetime,
     bbox: tuple[float, float, float, float],
     timebuffer: timedelta | None = None,
+    harvest_on_miss: bool = False,
+    budget: bool = False,
 ) -> list[WorldViewProcessedCapture]:
     if timebuffer is None:
         timebuffer = timedelta(hours=1)
 
-    features = [f for f in get_features(timestamp, bbox, timebuffer=timebuffer)]
+    # Prefer the local STAC catalogue, falling back to the STAC server if the
+    # search hasn't been harvested yet
+    items = search_catalog('WV', timestamp, bbox, timebuffer, harvest_on_miss)
+    if items is not None:
+        return [
+            WorldViewProcessedCapture(
+                timestamp=item.timestamp,
+                bbox=cast(tuple[float, float, float, float], tuple(item.bbox)),
+                uri=item.assets['visual']['href'],
+                bits_per_pixel=cast(int, item.bits_per_pixel),
+                panuri=item.pan_uri or None,
+                cloudcover=item.cloudcover or 0,
+                collection=item.collection,
+            )
+            for item in items.filter(assets__has_key='visual')
+        ]
 
     captures = []
-    for feature in features:
+    pan_uris: dict[datetime, str] = {}
+    for feature in get_features(timestamp, bbox, timebuffer=timebuffer, budget=budget):
+        feature_timestamp = datetime.fromisoformat(
+            feature['properties']['datetime'].rstrip('Z')
+        )
         if 'visual' in feature['assets']:
             cloudcover = 0
             if 'properties' in feature:
                 if 'eo:cloud_cover' in feature['properties']:
                     cloudcover = feature['properties']['eo:cloud_cover']
             capture = WorldViewProcessedCapture(
-                timestamp=datetime.fromisoformat(
-                    feature['properties']['datetime'].rstrip('Z')
-                ),
+                timestamp=feature_timestamp,
                 bbox=cast(tuple[float, float, float, float], tuple(feature['bbox'])),
                 uri=feature['assets']['visual']['href'],
                 bits_per_pixel=feature['properties']['nitf:bits_per_pixel'],
@@ -54,20 +74,14 @@ def get_captures(
                 collection=feature['collection'],
             )
             captures.append(capture)
+        if (
+            'B01' in feature['assets']
+            and feature['properties'].get('nitf:image_representation', False) == 'MONO'
+        ):
+            pan_uris.setdefault(feature_timestamp, feature['assets']['B01']['href'])
 
     # find each vis-multi image's related panchromatic image
     for cap in captures:
-        try:
-            pan_feature = next(
-                feat
-                for feat in features
-                if 'B01' in feat['assets']
-                and feat['properties'].get('nitf:image_representation', False) == 'MONO'
-                and datetime.fromisoformat(feat['properties']['datetime'].rstrip('Z'))
-                == cap.timestamp
-            )
-            cap.panuri = pan_feature['assets']['B01']['href']
-        except StopIteration:
-            continue
+        cap.panuri = pan_uris.get(cap.timestamp)
 
     return captures
@@ -43,6 +43,7 @@ from rdwatch.tasks import (
     cancel_generate_images_task,
     download_annotations,
     generate_site_images_for_evaluation_run,
+    get_images_queue_depth,
 )
 from rdwatch.views.performer import PerformerSchema
 from rdwatch.views.site_observation import GenerateImagesSchema
@@ -85,7 +86,7 @@ class ModelRunWriteSchema(Schema):
     @validator('performer')
     def validate_performer(cls, v: str) -> lookups.Performer:
         try:
-            return lookups.Performer.objects.get(slug=v.upper())
+            return lookups.Performer.objects.get_cached(v.upper())
         except lookups.Performer.DoesNotExist:
             raise ValueError(f"Invalid performer '{v}'")
 
@@ -206,7 +207,10 @@ def get_queryset():
                 Subquery(
                     SatelliteFetching.objects.filter(
                         site__configuration_id=OuterRef('evaluation_configuration'),
-                        status=SatelliteFetching.Status.RUNNING,
+                        status__in=[
+                            SatelliteFetching.Status.RUNNING,
+                            SatelliteFetching.Status.QUEUED,
+                        ],
                     )
                     .annotate(count=Func(F('id'), function='Count'))
                     .values('count')
@@ -369,11 +373,16 @@ def post_region_model(
     return 201, [eval.id for eval in site_evaluations]
 
 
+class ModelRunGenerateImagesSchema(GenerateImagesSchema):
+    # Read each capture once for all sites instead of once per site
+    groupByScene: bool = False
+
+
 @router.post('/{model_run_id}/generate-images/', response={202: bool})
 def generate_images(
     request: HttpRequest,
     model_run_id: UUID4,
-    params: GenerateImagesSchema = Query(...),  # noqa: B008
+    params: ModelRunGenerateImagesSchema = Query(...),  # noqa: B008
 ):
     scalVal = params.scale
     if params.scale == 'custom':
@@ -387,6 +396,8 @@ def generate_images(
         params.overrideDates,
         scalVal,
         params.bboxScale,
+        params.imageFormat,
+        params.groupByScene,
     )
     return 202, True
 
@@ -405,6 +416,21 @@ def cancel_generate_images(request: HttpRequest, model_run_id: UUID4):
     return 202, True
 
 
+class ImagesQueueDepthSchema(Schema):
+    queued: int
+    running: int
+    complete: int
+    error: int
+    ahead: int
+
+
+@router.get('/{model_run_id}/images-queue/', response={200: ImagesQueueDepthSchema})
+def get_images_queue(request: HttpRequest, model_run_id: UUID4):
+    get_object_or_404(ModelRun, id=model_run_id)  # existence check
+
+    return get_images_queue_depth(model_run_id)
+
+
 def get_region(model_run_id: UUID4):
     return (
         ModelRun.objects.select_related('evaluations')
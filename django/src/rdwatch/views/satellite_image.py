@@ -13,18 +13,29 @@ from django.http import (
     JsonResponse,
 )
 from django.urls import reverse
+from django.utils.cache import patch_response_headers
 from django.views.decorators.cache import cache_page
 
 from rdwatch.models.lookups import Constellation
+from rdwatch.utils.capture_lookup import get_tile_bands, get_tile_captures
 from rdwatch.utils.raster_tile import get_raster_bbox, get_raster_tile
 from rdwatch.utils.satellite_bands import get_bands
+from rdwatch.utils.tile_cache import TileCacheOutcome, get_or_render_tile, get_tile_key
 from rdwatch.utils.worldview_processed.raster_tile import (
     get_worldview_processed_visual_bbox,
     get_worldview_processed_visual_tile,
 )
 from rdwatch.utils.worldview_processed.satellite_captures import get_captures
 
-# @cache_page(60 * 60 * 24 * 7)  # Cache endpoint response for 1 week
+# Number of seconds browsers may cache a satellite image tile for
+TILE_BROWSER_CACHE_TIMEOUT = 60 * 60 * 24 * 365
+
+
+def tile_response(tile: bytes, format: str, outcome: TileCacheOutcome) -> HttpResponse:
+    response = HttpResponse(tile, content_type=f'image/{format}', status=200)
+    # Which tier of the tile cache the tile came from, if any
+    response['X-Tile-Cache'] = outcome
+    return response
 
 
 def get_satelliteimage_raster(
@@ -69,8 +80,13 @@ def get_satelliteimage_raster(
     level = request.GET['level']
     spectrum = request.GET['spectrum']
 
-    # Convert generator to list so we can iterate over it multiple times
-    bands = list(get_bands(constellation.slug, timestamp, bbox))
+    if request_type == 'bbox':
+        # Convert generator to list so we can iterate over it multiple times
+        bands = list(get_bands(constellation.slug, timestamp, bbox))
+    else:
+        # Sibling tiles share the lookup of their area rather than each
+        # searching for their own
+        bands = get_tile_bands(constellation.slug, timestamp, z, x, y)
 
     # Filter bands by requested processing level and spectrum
     bands = [
@@ -97,13 +113,16 @@ def get_satelliteimage_raster(
     if precise_timestamp == timestamp:
         if request_type == 'bbox':
             tile = get_raster_bbox(bands[0].uri, bbox, format)
-        else:
-            tile = get_raster_tile(bands[0].uri, z, x, y)
-        return HttpResponse(
-            tile,
-            content_type=f'image/{format}',
-            status=200,
+            return HttpResponse(
+                tile,
+                content_type=f'image/{format}',
+                status=200,
+            )
+        key = get_tile_key('raster', bands[0].uri, z, x, y, format=format)
+        tile, outcome = get_or_render_tile(
+            key, lambda: get_raster_tile(bands[0].uri, z, x, y)
         )
+        return tile_response(tile, format, outcome)
 
     query_params = {
         **request.GET.dict(),
@@ -126,7 +145,6 @@ def satelliteimage_raster_bbox(
     return get_satelliteimage_raster(request)
 
 
-@cache_page(60 * 60 * 24 * 365)
 def satelliteimage_raster_tile(
     request: HttpRequest,
     z: int | None = None,
@@ -135,7 +153,12 @@ def satelliteimage_raster_tile(
 ):
     if z is None or x is None or y is None:
         raise ValueError()
-    return get_satelliteimage_raster(request, z, x, y)
+    # The tiles are cached by the capture they're rendered from rather than
+    # as responses, see `get_or_render_tile`
+    response = get_satelliteimage_raster(request, z, x, y)
+    if response.status_code == 200:
+        patch_response_headers(response, TILE_BROWSER_CACHE_TIMEOUT)
+    return response
 
 
 def get_satelliteimage_visual(
@@ -170,7 +193,10 @@ def get_satelliteimage_visual(
         format = 'WEBP'
         bbox = (bounds.west, bounds.south, bounds.east, bounds.north)
     timestamp = datetime.fromisoformat(str(request.GET['timestamp']))
-    captures = get_captures(timestamp, bbox)
+    if request_type == 'bbox':
+        captures = get_captures(timestamp, bbox)
+    else:
+        captures = get_tile_captures(timestamp, z, x, y)
     if not captures:
         return HttpResponseNotFound()
 
@@ -184,13 +210,24 @@ def get_satelliteimage_visual(
     if closest_capture.timestamp == timestamp:
         if request_type == 'bbox':
             tile = get_worldview_processed_visual_bbox(closest_capture, bbox, format)
-        else:
-            tile = get_worldview_processed_visual_tile(closest_capture, z, x, y)
-        return HttpResponse(
-            tile,
-            content_type=f'image/{format}',
-            status=200,
+            return HttpResponse(
+                tile,
+                content_type=f'image/{format}',
+                status=200,
+            )
+        key = get_tile_key(
+            'worldview',
+            closest_capture.uri,
+            z,
+            x,
+            y,
+            panuri=closest_capture.panuri,
+            format=format,
         )
+        tile, outcome = get_or_render_tile(
+            key, lambda: get_worldview_processed_visual_tile(closest_capture, z, x, y)
+        )
+        return tile_response(tile, format, outcome)
 
     query_params = {
         **request.GET.dict(),
@@ -214,7 +251,6 @@ def satelliteimage_visual_bbox(
     return get_satelliteimage_visual(request)
 
 
-@cache_page(60 * 60 * 24 * 365)
 def satelliteimage_visual_tile(
     request: HttpRequest,
     z: int | None = None,
@@ -223,7 +259,10 @@ def satelliteimage_visual_tile(
 ):
     if z is None or x is None or y is None:
         raise ValueError()
-    return get_satelliteimage_visual(request, z, x, y)
+    response = get_satelliteimage_visual(request, z, x, y)
+    if response.status_code == 200:
+        patch_response_headers(response, TILE_BROWSER_CACHE_TIMEOUT)
+    return response
 
 
 @cache_page(60 * 60 * 24 * 365)
@@ -175,8 +175,8 @@ def patch_site_evaluation(request: HttpRequest, id: UUID4, data: SiteEvaluationR
         )
 
         if data.label:
-            site_evaluation.label = lookups.ObservationLabel.objects.get(
-                slug=data.label
+            site_evaluation.label = lookups.ObservationLabel.objects.get_cached(
+                data.label
             )
 
         # Use `exclude_unset` here because an explicitly `null` start/end date
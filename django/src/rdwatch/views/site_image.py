@@ -6,11 +6,14 @@ from django.contrib.postgres.aggregates import JSONBAgg
 from django.core.files.storage import default_storage
 from django.db.models import Count, F
 from django.db.models.functions import JSONObject  # type: ignore
-from django.http import Http404, HttpRequest
+from django.http import Http404, HttpRequest, HttpResponse, HttpResponseRedirect
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
 
 from rdwatch.db.functions import BoundingBox, ExtractEpoch
-from rdwatch.models import SiteEvaluation, SiteImage, SiteObservation
+from rdwatch.models import SiteEvaluation, SiteImage, SiteImageStack, SiteObservation
 from rdwatch.schemas.common import BoundingBoxSchema, TimeRangeSchema
+from rdwatch.utils.image_stack import get_frame_content_type, get_frame_url, read_frame
 
 router = Router()
 
@@ -135,7 +138,11 @@ def site_images(request: HttpRequest, id: UUID4):
     output = {}
     # lets get the presigned URL for each image
     for image in image_queryset['results']:
-        image['image'] = default_storage.url(image['image'])
+        if image['image']:
+            image['image'] = default_storage.url(image['image'])
+        else:
+            # The image is stored in the site's image stack
+            image['image'] = get_frame_url(id, image['id'])
     output['images'] = image_queryset
     output['geoJSON'] = geom_queryset['results']
     output['label'] = site_eval_data['json']['label']
@@ -146,3 +153,59 @@ def site_images(request: HttpRequest, id: UUID4):
     output['evaluationGeoJSON'] = site_eval_data['json']['evaluationGeoJSON']
     output['evaluationBBox'] = site_eval_data['json']['evaluationBBox']
     return output
+
+
+class SiteImageStackFrameSchema(Schema):
+    id: int
+    timestamp: str
+    source: str
+    observation_id: str | None
+    image_format: str
+    image_dimensions: list[int] | None
+    offset: int
+    length: int
+
+
+class SiteImageStackSchema(Schema):
+    version: int
+    timestamp: str
+    stack: str
+    frames: list[SiteImageStackFrameSchema]
+
+
+@router.get('/{id}/stack/', response=SiteImageStackSchema)
+def site_image_stack(request: HttpRequest, id: UUID4):
+    """The manifest of a site's image stack.
+
+    Single images are served by `frames/{image_id}/`, while `data/` serves
+    the whole stack, which holds each image at the offset given here.
+    """
+    image_stack = get_object_or_404(SiteImageStack, site_id=id)
+    return {
+        **image_stack.manifest,
+        'timestamp': image_stack.timestamp.isoformat(),
+        'stack': default_storage.url(image_stack.stack.name),
+    }
+
+
+@router.get('/{id}/stack/data/')
+def site_image_stack_data(request: HttpRequest, id: UUID4):
+    image_stack = get_object_or_404(SiteImageStack, site_id=id)
+    return HttpResponseRedirect(default_storage.url(image_stack.stack.name))
+
+
+@router.get('/{id}/stack/frames/{image_id}/', url_name='site_image_stack_frame')
+def site_image_stack_frame(request: HttpRequest, id: UUID4, image_id: int):
+    image_stack = get_object_or_404(SiteImageStack, site_id=id)
+    frame = next(
+        (frame for frame in image_stack.manifest['frames'] if frame['id'] == image_id),
+        None,
+    )
+    if frame is None:
+        raise Http404()
+    response = HttpResponse(
+        read_frame(image_stack, frame), content_type=get_frame_content_type(frame)
+    )
+    # Images can be regenerated in place, so they are only cached for a while
+    patch_cache_control(response, private=True, max_age=60 * 60)
+    return response
@@ -2,7 +2,6 @@ import logging
 from datetime import datetime
 from typing import Literal
 
-from celery.result import AsyncResult
 from ninja import Query, Router, Schema
 from pydantic import UUID4
 
@@ -27,7 +26,14 @@ from rdwatch.models import (
 )
 from rdwatch.schemas import SiteObservationRequest
 from rdwatch.schemas.common import BoundingBoxSchema, TimeRangeSchema
-from rdwatch.tasks import generate_site_images
+from rdwatch.tasks import (
+    generate_site_images,
+    get_images_task_status,
+    revoke_images_task,
+    schedule_site_images,
+)
+from rdwatch.utils.image_stack import get_frame_url
+from rdwatch.utils.images import ImageFormat
 
 logger = logging.getLogger(__name__)
 
@@ -140,7 +146,11 @@ def site_observations(request: HttpRequest, evaluation_id: UUID4):
     )
 
     for image in image_queryset['results']:
-        image['image'] = default_storage.url(image['image'])
+        if image['image']:
+            image['image'] = default_storage.url(image['image'])
+        else:
+            # The image is stored in the site's image stack
+            image['image'] = get_frame_url(evaluation_id, image['id'])
     queryset['images'] = image_queryset
     queryset['timerange'] = site_eval_data['timerange']
     replace_bbox = False
@@ -154,12 +164,7 @@ def site_observations(request: HttpRequest, evaluation_id: UUID4):
         retrieved = SatelliteFetching.objects.filter(site=evaluation_id).first()
         celery_data = {}
         if retrieved.celery_id:
-            task = AsyncResult(retrieved.celery_id)
-            celery_data['state'] = task.state
-            celery_data['status'] = task.status
-            celery_data['info'] = (
-                str(task.info) if isinstance(task.info, RuntimeError) else task.info
-            )
+            celery_data = get_images_task_status(retrieved.celery_id)
 
         queryset['job'] = {
             'status': retrieved.status,
@@ -179,6 +184,8 @@ class GenerateImagesSchema(Schema):
     scale: Literal['default', 'bits', 'custom'] = 'default'
     scaleNum: None | list[int] = None
     bboxScale: None | float = 1.2
+    # Defaults to the SITE_IMAGE_FORMAT setting
+    imageFormat: None | ImageFormat = None
 
 
 @router.post('/{evaluation_id}/generate-images/', response={202: bool, 409: str})
@@ -199,6 +206,7 @@ def get_site_observation_images(
         params.overrideDates,
         scalVal,
         params.bboxScale,
+        params.imageFormat,
     )
     return 202, True
 
@@ -217,12 +225,29 @@ def cancel_site_observation_images(request: HttpRequest, evaluation_id: UUID4):
             SatelliteFetching.objects.select_for_update().filter(site=siteeval).first()
         )
         if fetching_task is not None:
-            if fetching_task.status == SatelliteFetching.Status.RUNNING:
+            if fetching_task.status in (
+                SatelliteFetching.Status.RUNNING,
+                SatelliteFetching.Status.QUEUED,
+            ):
                 if fetching_task.celery_id != '':
-                    task = AsyncResult(fetching_task.celery_id)
-                    task.revoke(terminate=True)
+                    # Sites generated by scene share the task with other sites
+                    # of their model run, which are queued again and resume
+                    # from their checkpoints
+                    siblings = SatelliteFetching.objects.filter(
+                        celery_id=fetching_task.celery_id
+                    ).exclude(pk=fetching_task.pk)
+                    requeued = siblings.filter(parameters__isnull=False).update(
+                        status=SatelliteFetching.Status.QUEUED, celery_id=''
+                    )
+                    siblings.update(
+                        status=SatelliteFetching.Status.COMPLETE, celery_id=''
+                    )
+                    revoke_images_task(fetching_task.celery_id)
+                    if requeued:
+                        transaction.on_commit(schedule_site_images.delay)
                 fetching_task.status = SatelliteFetching.Status.COMPLETE
                 fetching_task.celery_id = ''
+                fetching_task.parameters = None
                 fetching_task.save()
             else:
                 return (
@@ -259,8 +284,8 @@ def update_site_observation(
         )
 
         if data.label:
-            site_observation.label = lookups.ObservationLabel.objects.get(
-                slug=data.label
+            site_observation.label = lookups.ObservationLabel.objects.get_cached(
+                data.label
             )
         if data.notes:
             site_observation.notes = data.notes
@@ -268,8 +293,8 @@ def update_site_observation(
         if data.spectrum:
             site_observation.spectrum = data.spectrum
         if data.constellation:
-            site_observation.constellation = lookups.Constellation.objects.get(
-                slug=data.label
+            site_observation.constellation = lookups.Constellation.objects.get_cached(
+                data.constellation
             )
 
         site_observation.save()
@@ -284,10 +309,10 @@ def add_site_observation(
     site_evaluation = get_object_or_404(SiteEvaluation, pk=evaluation_id)
 
     if data.label:
-        label = lookups.ObservationLabel.objects.get(slug=data.label)
+        label = lookups.ObservationLabel.objects.get_cached(data.label)
 
     if data.constellation:
-        constellation = lookups.Constellation.objects.get(slug=data.label)
+        constellation = lookups.Constellation.objects.get_cached(data.constellation)
 
     new_site_observation = SiteObservation.objects.create(
         siteeval=site_evaluation,
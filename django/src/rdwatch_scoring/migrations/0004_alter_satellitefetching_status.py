@@ -0,0 +1,27 @@
+# Generated by Django 4.1.9 on 2023-11-17 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('rdwatch_scoring', '0003_siteimage_image_format'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='satellitefetching',
+            name='status',
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ('Complete', 'Complete'),
+                    ('Queued', 'Queued'),
+                    ('Running', 'Running'),
+                    ('Error', 'Error'),
+                ],
+                help_text='Fetching Status',
+                max_length=255,
+            ),
+        ),
+    ]
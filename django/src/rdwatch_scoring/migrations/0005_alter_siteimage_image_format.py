@@ -0,0 +1,21 @@
+# Generated by Django 4.1.9 on 2023-11-22 09:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('rdwatch_scoring', '0004_alter_satellitefetching_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='siteimage',
+            name='image_format',
+            field=models.CharField(
+                default='png',
+                help_text='Format the image is encoded in (png, webp or webp-lossless)',
+                max_length=16,
+            ),
+        ),
+    ]
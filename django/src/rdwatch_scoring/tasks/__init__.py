@@ -1,4 +1,3 @@
-import io
 import logging
 from datetime import date, datetime, timedelta
 from typing import Literal
@@ -6,30 +5,30 @@ from uuid import uuid4
 
 from celery import shared_task
 from celery.result import AsyncResult
-from PIL import Image
 from pydantic import UUID4
 
+from django.conf import settings
 from django.contrib.gis.geos import Polygon
-from django.core.files import File
+from django.core.files.base import ContentFile
 from django.db import transaction
 
 from rdwatch.celery import app
-from rdwatch.tasks import (
-    BaseTime,
-    BboxScaleDefault,
-    ToMeters,
-    get_worldview_processed_visual_bbox,
-    is_inside_range,
-    overrideImageSize,
+from rdwatch.tasks import BaseTime, BboxScaleDefault, ToMeters, overrideImageSize
+from rdwatch.utils.checkpoints import (
+    ChunkTimeExpired,
+    ImageCheckpoint,
+    clear_image_checkpoints,
 )
 from rdwatch.utils.images import (
+    IMAGE_FORMAT_EXTENSIONS,
+    ImageFormat,
     fetch_boundbox_image,
+    get_capture_image,
     get_max_bbox,
-    get_percent_black_pixels,
     get_range_captures,
     scale_bbox,
 )
-from rdwatch.utils.raster_tile import get_raster_bbox
+from rdwatch.utils.task_progress import TaskProgress, clear_task_progress
 from rdwatch_scoring.models import Observation, SatelliteFetching, Site, SiteImage
 
 logger = logging.getLogger(__name__)
@@ -46,20 +45,30 @@ def get_siteobservation_images_task(
     overrideDates: None | list[datetime, datetime] = None,
     scale: Literal['default', 'bits'] | list[int] = 'default',
     bboxScale: float = BboxScaleDefault,
+    imageFormat: ImageFormat | None = None,
 ) -> None:
     capture_count = 0
-    for constellation in baseConstellations:
-        capture_count += get_siteobservations_images(
-            self,
-            site_eval_id=site_eval_id,
-            baseConstellation=constellation,
-            force=force,
-            dayRange=dayRange,
-            no_data_limit=no_data_limit,
-            overrideDates=overrideDates,
-            scale=scale,
-            bboxScale=bboxScale,
-        )
+    try:
+        for constellation in baseConstellations:
+            capture_count += get_siteobservations_images(
+                self,
+                site_eval_id=site_eval_id,
+                baseConstellation=constellation,
+                force=force,
+                dayRange=dayRange,
+                no_data_limit=no_data_limit,
+                overrideDates=overrideDates,
+                scale=scale,
+                bboxScale=bboxScale,
+                imageFormat=imageFormat,
+            )
+    except ChunkTimeExpired:
+        # Constellations that are done return right away from their
+        # checkpoint when the task continues
+        raise self.replace(self.s(*self.request.args, **self.request.kwargs))
+    finally:
+        clear_task_progress(self.request.id)
+    clear_image_checkpoints(SiteImage, site_eval_id, baseConstellations)
     fetching_task = SatelliteFetching.objects.get(site=site_eval_id)
     fetching_task.status = SatelliteFetching.Status.COMPLETE
     if capture_count == 0:
@@ -78,7 +87,27 @@ def get_siteobservations_images(
     overrideDates: None | list[datetime, datetime] = None,
     scale: Literal['default', 'bits'] | list[int] = 'default',
     bboxScale: float = BboxScaleDefault,
-) -> None:
+    imageFormat: ImageFormat | None = None,
+) -> int:
+    progress = TaskProgress(self.request.id)
+    image_format = imageFormat or settings.SITE_IMAGE_FORMAT
+    extension = IMAGE_FORMAT_EXTENSIONS[image_format]
+    checkpoint = ImageCheckpoint(
+        SiteImage,
+        site_eval_id,
+        baseConstellation,
+        {
+            'force': force,
+            'dayRange': dayRange,
+            'no_data_limit': no_data_limit,
+            'overrideDates': overrideDates,
+            'scale': scale,
+            'bboxScale': bboxScale,
+            'imageFormat': image_format,
+        },
+    )
+    if checkpoint.complete:
+        return checkpoint.downloaded_count
     # Ensure we are using ints for the DayRange and no_data_limit
     dayRange = int(dayRange)
     no_data_limit = int(no_data_limit)
@@ -88,7 +117,7 @@ def get_siteobservations_images(
     site_obs_count = Observation.objects.filter(
         site_uuid=site_eval_id, sensor=baseConstellation
     ).count()
-    found_timestamps = {}
+    found_timestamps = checkpoint.found_timestamps
     max_bbox = [float('inf'), float('inf'), float('-inf'), float('-inf')]
     # Use the base SiteEvaluation extents as the max size
     baseSiteEval = Site.objects.get(pk=site_eval_id)
@@ -138,17 +167,15 @@ def get_siteobservations_images(
 
     # First we gather all images that match observations
     count = 0
-    downloaded_count = 0
     for observation in site_observations.iterator():
         break
-        self.update_state(
-            state='PROGRESS',
-            meta={
+        progress.update(
+            {
                 'current': count,
                 'total': site_obs_count,
                 'mode': 'Site Observations',
                 'siteEvalId': site_eval_id,
-            },
+            }
         )
         if observation.date is not None:
             obs__time = datetime.combine(observation.date, datetime.min.time())
@@ -180,46 +207,51 @@ def get_siteobservations_images(
             if (
                 baseConstellation in ('S2', 'L8')
                 and dayRange > -1
-                and is_inside_range(found_timestamps.keys(), observation.date, dayRange)
+                and found_timestamps.is_inside_range(observation.date, dayRange)
             ):
                 logger.warning(f'Skipping Timestamp: {timestamp}')
                 continue
             if found.exists() and not force:
-                found_timestamps[observation.date] = True
+                found_timestamps.add(observation.date)
                 continue
             results = fetch_boundbox_image(
-                bbox, timestamp, constellation.slug, baseConstellation == 'WV', scale
+                bbox,
+                timestamp,
+                constellation.slug,
+                baseConstellation == 'WV',
+                scale,
+                image_format,
             )
             if results is None:
                 logger.warning(f'COULD NOT FIND ANY IMAGE FOR TIMESTAMP: {timestamp}')
                 continue
             bytes = results['bytes']
-            percent_black = get_percent_black_pixels(bytes)
+            percent_black = results['percent_black']
             cloudcover = results['cloudcover']
             found_timestamp = results['timestamp']
             if bytes is None:
                 logger.warning(f'COULD NOT FIND ANY IMAGE FOR TIMESTAMP: {timestamp}')
                 continue
             if dayRange != -1 and percent_black < no_data_limit:
-                found_timestamps[found_timestamp] = True
+                found_timestamps.add(found_timestamp)
             elif dayRange == -1:
-                found_timestamps[found_timestamp] = True
+                found_timestamps.add(found_timestamp)
             # logger.warning(f'Retrieved Image with timestamp: {timestamp}')
-            output = f'tile_image_{observation.pk}.png'
-            image = File(io.BytesIO(bytes), name=output)
-            imageObj = Image.open(io.BytesIO(bytes))
+            output = f'tile_image_{observation.pk}.{extension}'
+            image = ContentFile(bytes, name=output)
             if image is None:  # No null/None images should be set
                 continue
-            downloaded_count += 1
+            checkpoint.downloaded_count += 1
             if found.exists():
                 existing = found.first()
                 existing.image.delete()  # remove previous image if new one found
                 existing.cloudcover = cloudcover
                 existing.image = image
+                existing.image_format = image_format
                 existing.percent_black = percent_black
                 existing.aws_location = results['uri']
                 existing.image_bbox = Polygon.from_bbox(max_bbox)
-                existing.image_dimensions = [imageObj.width, imageObj.height]
+                existing.image_dimensions = results['image_dimensions']
                 existing.save()
             else:
                 SiteImage.objects.create(
@@ -227,12 +259,13 @@ def get_siteobservations_images(
                     observation=observation,
                     timestamp=observation.date,
                     image=image,
+                    image_format=image_format,
                     aws_location=results['uri'],
                     cloudcover=cloudcover,
                     source=baseConstellation,
                     percent_black=percent_black,
                     image_bbox=Polygon.from_bbox(max_bbox),
-                    image_dimensions=[imageObj.width, imageObj.height],
+                    image_dimensions=results['image_dimensions'],
                 )
 
     # Now we need to go through and find all other images
@@ -255,14 +288,13 @@ def get_siteobservations_images(
     captures = get_range_captures(
         max_bbox, timestamp, baseConstellation, timebuffer, worldView
     )
-    self.update_state(
-        state='PROGRESS',
-        meta={
+    progress.update(
+        {
             'current': 0,
             'total': 0,
             'mode': 'Searching All Images',
             'siteEvalId': site_eval_id,
-        },
+        }
     )
     if (
         baseSiteEval is None
@@ -272,55 +304,56 @@ def get_siteobservations_images(
     num_of_captures = len(captures)
     logger.warning(f'Found {num_of_captures} captures')
     if num_of_captures == 0:
-        self.update_state(
-            state='PROGRESS',
-            meta={
+        progress.update(
+            {
                 'current': count,
                 'total': num_of_captures,
                 'mode': 'No Captures',
                 'siteEvalId': site_eval_id,
-            },
+            }
         )
 
     # Now we go through the list and add in a timestmap if it doesn't exist
     for capture in captures:
-        self.update_state(
-            state='PROGRESS',
-            meta={
+        progress.update(
+            {
                 'current': count,
                 'total': num_of_captures,
                 'mode': 'Image Captures',
                 'siteEvalId': site_eval_id,
-            },
+            }
         )
         capture_timestamp = capture.timestamp.replace(microsecond=0)
+        if capture_timestamp in checkpoint.captures:
+            count += 1
+            continue
+        if checkpoint.chunk_expired():
+            checkpoint.save()
+            raise ChunkTimeExpired()
+        checkpoint.captures.add(capture_timestamp)
         if (
             (baseConstellation == 'S2' or baseConstellation == 'L8')
             and dayRange > -1
-            and is_inside_range(found_timestamps.keys(), capture_timestamp, dayRange)
+            and found_timestamps.is_inside_range(capture_timestamp, dayRange)
         ):
             count += 1
             continue
 
-        if capture_timestamp not in found_timestamps.keys():
+        if capture_timestamp not in found_timestamps:
             # we need to add a new image into the structure
-            bytes = None
-            if worldView:
-                bytes = get_worldview_processed_visual_bbox(
-                    capture, max_bbox, 'PNG', scale
-                )
-            else:
-                bytes = get_raster_bbox(capture.uri, max_bbox, 'PNG', scale)
+            results = get_capture_image(
+                capture, max_bbox, worldView, scale, image_format
+            )
+            bytes = results['bytes']
             if bytes is None:
                 count += 1
                 logger.warning(f'COULD NOT FIND ANY IMAGE FOR TIMESTAMP: {timestamp}')
                 continue
-            percent_black = get_percent_black_pixels(bytes)
+            percent_black = results['percent_black']
             cloudcover = capture.cloudcover
             count += 1
-            output = f'tile_image_{baseSiteEval.pk}_nonobs_{uuid4()}.png'
-            image = File(io.BytesIO(bytes), name=output)
-            imageObj = Image.open(io.BytesIO(bytes))
+            output = f'tile_image_{baseSiteEval.pk}_nonobs_{uuid4()}.{extension}'
+            image = ContentFile(bytes, name=output)
             if image is None:  # No null/None images should be set
                 count += 1
                 continue
@@ -330,18 +363,19 @@ def get_siteobservations_images(
                 source=baseConstellation,
             )
             if dayRange != -1 and percent_black < no_data_limit:
-                found_timestamps[capture_timestamp] = True
+                found_timestamps.add(capture_timestamp)
             elif dayRange == -1:
-                found_timestamps[capture_timestamp] = True
-            downloaded_count += 1
+                found_timestamps.add(capture_timestamp)
+            checkpoint.downloaded_count += 1
             if found.exists():
                 existing = found.first()
                 existing.image.delete()
                 existing.cloudcover = cloudcover
                 existing.image = image
+                existing.image_format = image_format
                 existing.aws_location = capture.uri
                 existing.image_bbox = Polygon.from_bbox(max_bbox)
-                existing.image_dimensions = [imageObj.width, imageObj.height]
+                existing.image_dimensions = results['image_dimensions']
                 existing.save()
             else:
                 SiteImage.objects.create(
@@ -349,15 +383,19 @@ def get_siteobservations_images(
                     timestamp=capture_timestamp,
                     aws_location=capture.uri,
                     image=image,
+                    image_format=image_format,
                     cloudcover=cloudcover,
                     percent_black=percent_black,
                     source=baseConstellation,
                     image_bbox=Polygon.from_bbox(max_bbox),
-                    image_dimensions=[imageObj.width, imageObj.height],
+                    image_dimensions=results['image_dimensions'],
                 )
+            # Images are written right away, so the checkpoint can be too
+            checkpoint.save()
         else:
             count += 1
-    return downloaded_count
+    checkpoint.finish()
+    return checkpoint.downloaded_count
 
 
 @shared_task
@@ -379,6 +417,7 @@ def cancel_generate_images_task(model_run_id: UUID4) -> None:
                     if fetching_task.celery_id != '':
                         task = AsyncResult(fetching_task.celery_id)
                         task.revoke(terminate=True)
+                        clear_task_progress(fetching_task.celery_id)
                     fetching_task.status = SatelliteFetching.Status.COMPLETE
                     fetching_task.celery_id = ''
                     fetching_task.save()
@@ -394,6 +433,7 @@ def generate_site_images(
     overrideDates: None | list[datetime, datetime] = None,
     scale: Literal['default', 'bits'] | list[int] = 'default',
     bboxScale: float = BboxScaleDefault,
+    imageFormat: ImageFormat | None = None,
 ):
     siteeval = Site.objects.get(pk=evaluation_id)
     with transaction.atomic():
@@ -432,6 +472,7 @@ def generate_site_images(
             overrideDates,
             scale,
             bboxScale,
+            imageFormat,
         )
         fetching_task.celery_id = task_id.id
         fetching_task.save()
@@ -447,6 +488,7 @@ def generate_site_images_for_evaluation_run(
     overrideDates: None | list[datetime, datetime] = None,
     scale: Literal['default', 'bits'] | list[int] = 'default',
     bboxScale: float = BboxScaleDefault,
+    imageFormat: ImageFormat | None = None,
 ):
     sites = Site.objects.filter(evaluation_run_uuid=model_run_id)
     for eval in sites.iterator():
@@ -459,4 +501,5 @@ def generate_site_images_for_evaluation_run(
             overrideDates,
             scale,
             bboxScale,
+            imageFormat,
         )
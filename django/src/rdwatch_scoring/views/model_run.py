@@ -226,6 +226,7 @@ def generate_images(
         params.overrideDates,
         scalVal,
         params.bboxScale,
+        params.imageFormat,
     )
     return 202, True
 
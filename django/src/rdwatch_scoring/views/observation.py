@@ -17,6 +17,8 @@ from django.http import Http404, HttpRequest
 from django.shortcuts import get_object_or_404
 
 from rdwatch.db.functions import BoundingBox, ExtractEpoch
+from rdwatch.utils.images import ImageFormat
+from rdwatch.utils.task_progress import clear_task_progress, get_task_progress
 from rdwatch.views.site_observation import SiteObservationsListSchema
 from rdwatch_scoring.models import Observation, SatelliteFetching, Site, SiteImage
 from rdwatch_scoring.tasks import generate_site_images
@@ -35,6 +37,8 @@ class GenerateImagesSchema(Schema):
     scale: Literal['default', 'bits', 'custom'] = 'default'
     scaleNum: None | list[int] = None
     bboxScale: None | float = 1.2
+    # Defaults to the SITE_IMAGE_FORMAT setting
+    imageFormat: None | ImageFormat = None
 
 
 @router.get('/{evaluation_id}/', response={200: SiteObservationsListSchema})
@@ -140,12 +144,18 @@ def site_observations(request: HttpRequest, evaluation_id: UUID4):
         retrieved = SatelliteFetching.objects.filter(site=evaluation_id).first()
         celery_data = {}
         if retrieved.celery_id:
-            task = AsyncResult(retrieved.celery_id)
-            celery_data['state'] = task.state
-            celery_data['status'] = task.status
-            celery_data['info'] = (
-                str(task.info) if isinstance(task.info, RuntimeError) else task.info
-            )
+            progress = get_task_progress(retrieved.celery_id)
+            if progress is not None:
+                celery_data['state'] = 'PROGRESS'
+                celery_data['status'] = 'PROGRESS'
+                celery_data['info'] = progress
+            else:
+                task = AsyncResult(retrieved.celery_id)
+                celery_data['state'] = task.state
+                celery_data['status'] = task.status
+                celery_data['info'] = (
+                    str(task.info) if isinstance(task.info, RuntimeError) else task.info
+                )
 
         queryset['job'] = {
             'status': retrieved.status,
@@ -177,6 +187,7 @@ def get_site_observation_images(
         params.overrideDates,
         scalVal,
         params.bboxScale,
+        params.imageFormat,
     )
     return 202, True
 
@@ -201,6 +212,7 @@ def cancel_site_observation_images(request: HttpRequest, evaluation_id: UUID4):
                 if fetching_task.celery_id != '':
                     task = AsyncResult(fetching_task.celery_id)
                     task.revoke(terminate=True)
+                    clear_task_progress(fetching_task.celery_id)
                 fetching_task.status = SatelliteFetching.Status.COMPLETE
                 fetching_task.celery_id = ''
                 fetching_task.save()
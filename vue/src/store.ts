@@ -72,7 +72,7 @@ export interface EnabledSiteObservations {
 }
 
 export interface SiteObservationJob {
-  status: 'Running' | 'Complete' | 'Error';
+  status: 'Queued' | 'Running' | 'Complete' | 'Error';
   error?: string;
   timestamp: number;
   celery?: {